@@ -0,0 +1,5 @@
+"""
+Benchmark suite for the calculator's hot paths.
+
+Run it with ``python -m benchmarks``; see benchmarks.runner for the options.
+"""
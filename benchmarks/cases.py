@@ -0,0 +1,152 @@
+"""
+The benchmark cases.
+
+Each case is a function that takes a size (ignored by unsized cases) and a scratch directory
+for files, and returns a (setup, run, operations) tuple. setup runs untimed before every repetition, run is timed, and
+operations is the number of operations one run performs, used for per-operation figures.
+Inputs come from a seeded random generator, so every run measures the same work.
+"""
+
+import io
+import os
+import random
+from decimal import Decimal
+from calculator import analytics
+from calculator.batch_mode import run_batch
+from calculator.calculations import Calculations
+from calculator.commands import AddCommand, SubtractCommand, MultiplyCommand, DivideCommand, SumCommand
+from calculator.utils import get_operation_mappings
+
+SEED = 20241028
+
+# Executions per run of the command cases, so that a run lasts long enough to time reliably
+COMMAND_EXECUTIONS = 10_000
+
+CASES = {}
+
+def case(name: str, group: str, sized: bool = False):
+    """Register a benchmark case under a name and a group."""
+    def register(function):
+        CASES[name] = (group, sized, function)
+        return function
+    return register
+
+def random_commands(count: int, seed: int = SEED) -> list:
+    """Build count commands with random operations and operands (divisors are never zero)."""
+    rng = random.Random(seed)
+    command_classes = [AddCommand, SubtractCommand, MultiplyCommand, DivideCommand]
+    return [rng.choice(command_classes)(Decimal(rng.randint(-10**6, 10**6)) / 100, Decimal(rng.randint(1, 999)))
+            for _ in range(count)]
+
+def fill_history(size: int):
+    """Replace the history with size random commands."""
+    Calculations.clear_history()
+    for command in random_commands(size):
+        Calculations.add_calculation(command)
+
+def _command_case(command_class, **options):
+    """
+    Return a case executing COMMAND_EXECUTIONS commands of one class.
+
+    A command computes its result once (see memo.computed_once), so fresh commands are built
+    in the untimed setup of every repetition; otherwise later runs would only read cached results.
+    """
+    def command_case(_size, _directory):
+        rng = random.Random(SEED)
+        operands = [(Decimal(rng.randint(-10**6, 10**6)) / 100, Decimal(rng.randint(1, 999)))
+                    for _ in range(COMMAND_EXECUTIONS)]
+        commands = []
+
+        def setup():
+            commands[:] = [command_class(value1, value2, **options) for value1, value2 in operands]
+
+        def run():
+            for command in commands:
+                command.execute()
+        return setup, run, COMMAND_EXECUTIONS
+    return command_case
+
+case("command.add.execute", "command")(_command_case(AddCommand))
+case("command.subtract.execute", "command")(_command_case(SubtractCommand))
+case("command.multiply.execute", "command")(_command_case(MultiplyCommand))
+case("command.divide.execute", "command")(_command_case(DivideCommand))
+case("command.divide_integer.execute", "command")(
+    _command_case(DivideCommand, strategy=DivideCommand.integer_division))
+
+@case("command.sum.execute", "command")
+def sum_case(_size, _directory):
+    """Sum COMMAND_EXECUTIONS values with one fused SumCommand per run."""
+    rng = random.Random(SEED)
+    values = [Decimal(rng.randint(-10**6, 10**6)) / 100 for _ in range(COMMAND_EXECUTIONS)]
+    return None, lambda: SumCommand(values).execute(), COMMAND_EXECUTIONS
+
+@case("history.add_calculation", "history", sized=True)
+def add_calculation_case(size: int, _directory: str):
+    """Append size commands to an empty history."""
+    commands = random_commands(size)
+
+    def run():
+        for command in commands:
+            Calculations.add_calculation(command)
+    return Calculations.clear_history, run, size
+
+@case("history.get_history", "history", sized=True)
+def get_history_case(size: int, _directory: str):
+    """Take a history view and read every result."""
+    def run():
+        for entry in Calculations.get_history():
+            _ = entry.result
+    return lambda: fill_history(size), run, size
+
+@case("persistence.save_history", "persistence", sized=True)
+def save_history_case(size: int, directory: str):
+    """Save a history of size rows to a new CSV file."""
+    file_name = os.path.join(directory, f"save-{size}.csv")
+
+    def setup():
+        fill_history(size)
+        if os.path.exists(file_name):
+            os.remove(file_name)
+    return setup, lambda: Calculations.save_history(file_name), size
+
+@case("persistence.flush_history", "persistence", sized=True)
+def flush_history_case(size: int, directory: str):
+    """Append a history of size rows to a new CSV file."""
+    file_name = os.path.join(directory, f"flush-{size}.csv")
+
+    def setup():
+        fill_history(size)
+        if os.path.exists(file_name):
+            os.remove(file_name)
+    return setup, lambda: Calculations.flush_history(file_name), size
+
+@case("persistence.load_history", "persistence", sized=True)
+def load_history_case(size: int, directory: str):
+    """Load a CSV history file of size rows."""
+    file_name = os.path.join(directory, f"load-{size}.csv")
+    fill_history(size)
+    Calculations.save_history(file_name)
+    return Calculations.clear_history, lambda: Calculations.load_history(file_name), size
+
+@case("analytics.history_summary", "analytics", sized=True)
+def history_summary_case(size: int, _directory: str):
+    """Summarize a history of size rows by operation."""
+    return lambda: fill_history(size), lambda: analytics.summarize(analytics.history_frame()), size
+
+@case("analytics.file_summary", "analytics", sized=True)
+def file_summary_case(size: int, directory: str):
+    """Summarize a CSV history file of size rows by operation, without loading it."""
+    file_name = os.path.join(directory, f"analytics-{size}.csv")
+    fill_history(size)
+    Calculations.save_history(file_name)
+    return Calculations.clear_history, lambda: analytics.summarize(analytics.file_frame(file_name)), size
+
+@case("repl.batch", "repl", sized=True)
+def batch_case(size: int, _directory: str):
+    """Evaluate size operation lines with the batch mode and discard the output."""
+    rng = random.Random(SEED)
+    operations = ['add', 'subtract', 'multiply', 'divide']
+    text = ''.join(f"{rng.choice(operations)},{rng.randint(-10**6, 10**6) / 100},{rng.randint(1, 999)}\n"
+                   for _ in range(size))
+    mappings = get_operation_mappings()
+    return Calculations.clear_history, lambda: run_batch(io.StringIO(text), io.StringIO(), mappings), size
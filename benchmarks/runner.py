@@ -0,0 +1,152 @@
+"""
+Run the benchmark cases, write the results as JSON and compare them against a baseline.
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --baseline results.json --threshold 0.25
+    python -m benchmarks --filter persistence --sizes 1000,10000,100000,1000000,10000000
+
+Every case runs --repeat times, and the median run time is the figure that is compared: it is
+less sensitive to a single slow run than the mean. With --baseline, each case's median time
+per operation is compared with the baseline's. The exit status is 1 if any case is slower
+by more than --threshold, so the suite can gate a CI job.
+"""
+
+import os
+import json
+import time
+import fnmatch
+import logging
+import argparse
+import platform
+import statistics
+import tempfile
+from calculator.calculations import Calculations
+from benchmarks.cases import CASES, SEED
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+FULL_SIZES = [10 ** exponent for exponent in range(3, 8)]
+
+def measure(setup, run, repeat: int) -> list:
+    """Return the run times in seconds of `repeat` runs, each preceded by an untimed setup."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+def summarize(group: str, size, operations: int, times: list) -> dict:
+    """Summarize the run times of one case."""
+    median = statistics.median(times)
+    return {
+        'group': group, 'size': size, 'operations': operations, 'repeat': len(times),
+        'min': min(times), 'median': median, 'mean': statistics.fmean(times),
+        'per_operation': median / operations,
+        'operations_per_second': operations / median if median else None,
+    }
+
+def describe_run(sizes: list, repeat: int) -> dict:
+    """Describe the machine and settings of a run, so that reports can be told apart."""
+    return {
+        'python': platform.python_version(), 'implementation': platform.python_implementation(),
+        'platform': platform.platform(), 'cpus': os.cpu_count(), 'seed': SEED,
+        'repeat': repeat, 'sizes': sizes, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+def run_suite(pattern: str = '*', sizes=None, repeat: int = 5) -> dict:
+    """
+    Run the cases whose names match a shell-style pattern.
+
+    :param pattern: Only run cases whose name matches this pattern, e.g. "history.*".
+    :param sizes: The history sizes for sized cases (default: DEFAULT_SIZES).
+    :param repeat: The number of timed runs per case.
+    :return: The report: "meta" describing the machine and settings, and "results" mapping
+             each case name (with "[size]" for sized cases) to its timings.
+    """
+    sizes = sizes or DEFAULT_SIZES
+    cache_size = Calculations.result_cache.maxsize
+    Calculations.result_cache.configure(0)  # Memoized results would hide the cost being measured
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for name, (group, sized, function) in CASES.items():
+                if not fnmatch.fnmatchcase(name, pattern):
+                    continue
+                for size in (sizes if sized else [None]):
+                    key = f"{name}[{size}]" if sized else name
+                    setup, run, operations = function(size, directory)
+                    results[key] = summarize(group, size, operations, measure(setup, run, repeat))
+                    logging.info("%s: %.3g s per operation", key, results[key]['per_operation'])
+    finally:
+        Calculations.result_cache.configure(cache_size)
+        Calculations.clear_history()
+    return {'meta': describe_run(sizes, repeat), 'results': results}
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2) -> list:
+    """
+    Compare per-operation median times with a baseline report's results.
+
+    :return: (name, baseline, current, ratio, status) rows, where status is "regression" if
+             the case is slower by more than threshold, "improvement" if it is faster by more
+             than threshold, "ok" otherwise, and "new" or "missing" for unmatched cases.
+    """
+    rows = []
+    for name in list(results) + [name for name in baseline if name not in results]:
+        current = results.get(name, {}).get('per_operation')
+        previous = baseline.get(name, {}).get('per_operation')
+        if current is None or previous is None:
+            rows.append((name, previous, current, None, 'new' if previous is None else 'missing'))
+            continue
+        ratio = current / previous if previous else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 - threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, previous, current, ratio, status))
+    return rows
+
+def format_report(results: dict, comparison=None) -> str:
+    """Format the results, and the comparison if given, as a plain text table."""
+    if comparison is None:
+        lines = [f"{'benchmark':<44} {'median s':>12} {'per op s':>12} {'ops/s':>14}"]
+        for name, result in results.items():
+            lines.append(f"{name:<44} {result['median']:>12.6f} {result['per_operation']:>12.3g} "
+                         f"{result['operations_per_second'] or 0:>14,.0f}")
+        return '\n'.join(lines)
+    lines = [f"{'benchmark':<44} {'baseline':>12} {'current':>12} {'ratio':>7}  status"]
+    for name, previous, current, ratio, status in comparison:
+        lines.append(f"{name:<44} {previous or 0:>12.3g} {current or 0:>12.3g} "
+                     f"{ratio if ratio is not None else 0:>7.2f}  {status}")
+    return '\n'.join(lines)
+
+def main(argv=None) -> int:
+    """Run the suite from the command line; the exit status is 1 if a regression was found."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Calculator benchmark suite.")
+    parser.add_argument("--output", metavar="FILE", help="write the JSON report to FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="compare against the JSON report in FILE")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression (default: %(default)s)")
+    parser.add_argument("--filter", default='*', help="only run cases matching this shell pattern")
+    parser.add_argument("--sizes", type=lambda text: [int(size) for size in text.split(',')],
+                        help=f"comma-separated history sizes (default: {','.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument("--full", action="store_true", help="use history sizes from 10^3 to 10^7")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.filter, args.sizes or (FULL_SIZES if args.full else None), args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2)
+    if not args.baseline:
+        print(format_report(report['results']))
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    comparison = compare(report['results'], baseline['results'], args.threshold)
+    print(format_report(report['results'], comparison))
+    return 1 if any(row[4] == 'regression' for row in comparison) else 0
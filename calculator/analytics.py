@@ -0,0 +1,184 @@
+"""
+Vectorized analytics over the calculation history.
+
+Reports are computed with pandas over two compact columns: the operation of each row as a
+categorical, and its result as float64. The columns are built straight from the columns of
+a HistoryStore (see history_frame), or read from a history file one chunk at a time (see
+file_frame). No Calculation, Command or HistoryEntry object is created, so a report over
+tens of millions of rows takes seconds.
+
+Results are aggregated as float64, so sums and means are exact to about 15 significant
+digits. Rows without a result, such as divisions by zero, hold NaN and are not counted.
+"""
+
+from __future__ import annotations
+
+import os
+from calculator.lazy import LazyModule
+from calculator.numeric import parse_stored_number
+from calculator.history_formats import history_format, read_frame
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+
+# Percentiles reported by summarize unless others are given
+DEFAULT_PERCENTILES = (0.5, 0.9, 0.99)
+
+# Statistics reported by rolling unless others are given
+DEFAULT_ROLLING_STATS = ('mean', 'min', 'max', 'std')
+
+# Rows read from a history file at a time by file_frame
+FILE_CHUNKSIZE = 1_000_000
+
+def _float(result) -> float:
+    """Convert one result to a float, parsing text that float() does not accept, such as '1/3'."""
+    if isinstance(result, str):
+        return float(parse_stored_number(result))
+    return float(result)
+
+def _float_or_nan(result) -> float:
+    """Convert one result to a float, or to NaN for a calculation that failed."""
+    return np.nan if result is None else _float(result)
+
+def _as_floats(results, missing_ok: bool = False) -> np.ndarray:
+    """
+    Convert a results column (numbers or numeric text) to a float64 array.
+
+    :param missing_ok: Convert None to NaN; otherwise None raises TypeError.
+    """
+    try:
+        return np.fromiter(map(float, results), dtype=np.float64, count=len(results))
+    except (TypeError, ValueError):
+        return np.fromiter(map(_float_or_nan if missing_ok else _float, results), dtype=np.float64, count=len(results))
+
+def _parsed_float(text) -> float:
+    """Convert one stored result to a float, or to NaN if it is not a number."""
+    try:
+        return _float(text)
+    except (ArithmeticError, TypeError, ValueError):
+        return np.nan
+
+def _file_results(results: pd.Series) -> np.ndarray:
+    """
+    Convert a result column read from a history file to a float64 array.
+
+    Most results are converted column-wise; text that to_numeric rejects, such as the
+    Fraction result '1/3', is parsed with parse_stored_number, as history_frame does.
+    """
+    numbers = pd.to_numeric(results, errors='coerce').to_numpy(dtype=np.float64)
+    rejected = np.flatnonzero(np.isnan(numbers) & results.notna().to_numpy())
+    if rejected.size:
+        numbers[rejected] = results.iloc[rejected].map(_parsed_float).to_numpy(dtype=np.float64)
+    return numbers
+
+def _frame(operations, results) -> pd.DataFrame:
+    """Return the analytics frame for a categorical operation column and a float64 result column."""
+    return pd.DataFrame({'op': operations, 'result': results})
+
+def history_frame(history=None) -> pd.DataFrame:
+    """
+    Return the op (categorical) and result (float64) columns of a history store, in history order.
+
+    :param history: A HistoryStore (default: Calculations.history of the current session).
+    """
+    if history is None:
+        from calculator.calculations import Calculations  # pylint: disable=import-outside-toplevel
+        history = Calculations.history
+    try:
+        parts = [(codes, _as_floats(results)) for codes, results in history.result_columns()]
+    except TypeError:
+        # Some results were never computed: compute them, leaving failed calculations as NaN
+        parts = [(codes, _as_floats(results, missing_ok=True)) for codes, results in history.result_columns(compute=True)]
+    codes = np.concatenate([np.frombuffer(codes, dtype=np.uint16) if codes else np.empty(0, dtype=np.uint16)
+                            for codes, _ in parts])
+    # Kinds with the same operation name, e.g. divisions with different strategies, share a category
+    names = history.operation_names
+    categories = list(dict.fromkeys(names))
+    lookup = np.array([categories.index(name) for name in names] or [0], dtype=np.int32)
+    operations = pd.Categorical.from_codes(lookup[codes], categories=categories)
+    return _frame(operations, np.concatenate([results for _, results in parts]))
+
+def file_frame(file_name: str, chunksize: int = FILE_CHUNKSIZE) -> pd.DataFrame:
+    """
+    Return the op (categorical) and result (float64) columns of a history file, in file order.
+
+    Only the operation and result columns are read, chunk by chunk for CSV and SQLite files,
+    and each chunk is reduced to the compact columns before the next one is read.
+
+    :raises FileNotFoundError: If the file does not exist.
+    """
+    if not os.path.exists(file_name):
+        raise FileNotFoundError(f"No history file found with name '{file_name}'")
+    if history_format(file_name) == 'csv':
+        chunks = read_frame(file_name, columns=['operation', 'result'], chunksize=chunksize)
+    else:
+        chunks = read_frame(file_name, columns=['op', 'result'], chunksize=chunksize)
+        if isinstance(chunks, pd.DataFrame):
+            chunks = [chunks]
+    operation_parts, result_parts = [], []
+    for chunk in chunks:
+        if 'op' in chunk.columns:
+            names = chunk['op']
+        else:
+            # The name is the middle word of "value1 name value2"; a regex extract is vectorized, unlike split
+            names = chunk['operation'].str.extract(r'^\S* (\S+)', expand=False)
+        operation_parts.append(names.str.lower().astype('category'))
+        result_parts.append(_file_results(chunk['result']))
+    if not operation_parts:
+        return _frame(pd.Categorical([]), np.empty(0, dtype=np.float64))
+    operations = pd.api.types.union_categoricals(operation_parts)
+    return _frame(operations, np.concatenate(result_parts))
+
+def _percentile_label(percentile: float) -> str:
+    """Return the column name of a percentile, e.g. 'p50' for 0.5 and 'p99.9' for 0.999."""
+    return f"p{percentile * 100:g}"
+
+def summarize(frame: pd.DataFrame, percentiles=DEFAULT_PERCENTILES) -> pd.DataFrame:
+    """
+    Return the count, sum, mean, min, max and percentiles of the results of each operation.
+
+    :param frame: A frame from history_frame or file_frame.
+    :param percentiles: The percentiles to report, as fractions between 0 and 1.
+    :return: One row per operation, sorted by name, and a last row 'all' over every operation.
+    """
+    percentiles = list(percentiles)
+    results = frame['result']
+    grouped = results.groupby(frame['op'], observed=True, sort=True)
+    summary = grouped.agg(['count', 'sum', 'mean', 'min', 'max'])
+    overall = results.agg(['count', 'sum', 'mean', 'min', 'max'])
+    if percentiles:
+        labels = [_percentile_label(percentile) for percentile in percentiles]
+        if not summary.empty:
+            quantiles = grouped.quantile(percentiles).unstack()
+            quantiles.columns = labels
+            summary = summary.join(quantiles)
+        else:
+            summary = summary.reindex(columns=[*summary.columns, *labels])
+        overall = pd.concat([overall, pd.Series(results.quantile(percentiles).to_numpy(), index=labels)])
+    summary.index = summary.index.astype(str)
+    summary = summary.sort_index()
+    summary.loc['all'] = overall
+    summary.index.name = 'op'
+    summary['count'] = summary['count'].astype(np.int64)
+    return summary
+
+def rolling(frame: pd.DataFrame, window: int, stats=DEFAULT_ROLLING_STATS, operation: str = None) -> pd.DataFrame:
+    """
+    Return statistics of the results over a sliding window of rows, in history order.
+
+    :param frame: A frame from history_frame or file_frame.
+    :param window: The number of rows in the window; the first rows use the rows so far.
+    :param stats: The pandas rolling aggregations to report, e.g. 'mean', 'sum' or 'median'.
+    :param operation: Only include the rows of this operation, e.g. 'add'.
+    :raises ValueError: If window is less than 1.
+    """
+    if window < 1:
+        raise ValueError(f"Rolling window must be at least 1, not {window}")
+    results = frame['result']
+    if operation is not None:
+        results = results[frame['op'] == operation]
+    return results.rolling(window, min_periods=1).agg(list(stats))
+
+def format_summary(summary: pd.DataFrame) -> str:
+    """Format a summary from summarize as a text table."""
+    return summary.to_string(float_format=lambda value: f"{value:.6g}")
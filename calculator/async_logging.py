@@ -0,0 +1,58 @@
+"""
+Queue-based asynchronous logging.
+
+In queued mode the root logger has a single handler that only puts records on an in-memory
+queue. A background QueueListener thread takes them off and passes them to the real file and
+console handlers. Logging calls on the calculation path therefore never wait for disk or
+terminal I/O.
+
+Records are put on the queue as they are, and their messages are formatted by the writer
+thread. Record arguments must therefore not be mutated after they are logged. That holds for
+this package, which logs Decimals, strings and commands whose operands never change.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+
+# The running QueueListener, if any; at most one
+_LISTENERS = []
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that leaves message formatting to the writer thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Enqueue the record unchanged; the listener formats it."""
+        return record
+
+def start_queue_logging(handlers: list, level: int = logging.NOTSET) -> logging.handlers.QueueListener:
+    """
+    Route the root logger through a queue to the given handlers, served by a writer thread.
+
+    Any previous queue listener is stopped first, and the listener is stopped at exit so that
+    queued records are written out.
+
+    :param handlers: The handlers that do the I/O, e.g. a FileHandler and a StreamHandler.
+    :param level: The root logger level.
+    :return: The running QueueListener.
+    """
+    stop_queue_logging()
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(records)]
+    root.setLevel(level)
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    _LISTENERS.append(listener)
+    return listener
+
+def stop_queue_logging():
+    """Write out the queued records and stop the writer thread, if queued logging is running."""
+    while _LISTENERS:
+        listener = _LISTENERS.pop()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+atexit.register(stop_queue_logging)
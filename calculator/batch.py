@@ -0,0 +1,122 @@
+"""
+Vectorized batch evaluation of arithmetic operations using NumPy.
+
+Instead of creating and executing one Command object per calculation, the operands and
+operation codes are passed in as arrays and each operation is evaluated column-wise over
+all of the rows that use it.
+"""
+
+from __future__ import annotations
+
+import logging
+from decimal import Decimal
+from calculator.lazy import LazyModule
+from calculator.commands import DivideCommand
+
+# Operation codes used by the batch engine; the code of an operation is its position in this tuple
+OPERATIONS = ('add', 'subtract', 'multiply', 'divide')
+OPERATION_CODES = {name: code for code, name in enumerate(OPERATIONS)}
+
+np = LazyModule('numpy')
+
+# Names of the element-wise NumPy functions for the operations that can never fail
+_UFUNCS = {
+    OPERATION_CODES['add']: 'add',
+    OPERATION_CODES['subtract']: 'subtract',
+    OPERATION_CODES['multiply']: 'multiply',
+}
+
+def encode_operations(operations) -> np.ndarray:
+    """
+    Convert a sequence of operation names or operation codes into an array of operation codes.
+
+    :param operations: Operation names such as 'add', or integer codes from OPERATION_CODES.
+    :return: An int8 array with one operation code per row.
+    """
+    operations = np.asarray(operations)
+    if operations.dtype.kind in 'iu':
+        codes = operations.astype(np.int8)
+        if codes.size and (codes.min() < 0 or codes.max() >= len(OPERATIONS)):
+            raise ValueError(f"Unknown operation code in batch: {codes.min()}..{codes.max()}")
+        return codes
+
+    # Look up each distinct name once and broadcast the codes back to the rows
+    names, inverse = np.unique(operations.astype(str), return_inverse=True)
+    lookup = np.empty(len(names), dtype=np.int8)
+    for position, name in enumerate(names):
+        code = OPERATION_CODES.get(name.lower())
+        if code is None:
+            raise ValueError(f"Unknown operation: {name}")
+        lookup[position] = code
+    return lookup[inverse.reshape(-1)]
+
+def _as_operands(values, exact: bool) -> np.ndarray:
+    """Convert operands to a float64 array, or to an object array of Decimals for exact evaluation."""
+    if not exact:
+        return np.asarray(values, dtype=np.float64)
+    values = np.asarray(values, dtype=object).reshape(-1)
+    return np.fromiter(
+        (value if isinstance(value, Decimal) else Decimal(str(value)) for value in values),
+        dtype=object, count=len(values)
+    )
+
+# The DivideCommand strategies the batch engine evaluates column-wise
+DIVISION_STRATEGIES = (None, DivideCommand.default_division, DivideCommand.integer_division)
+
+def _truncating_divide(dividends: np.ndarray, divisors: np.ndarray) -> np.ndarray:
+    """
+    Return the quotients truncated toward zero, as Decimal's // and DivideCommand.integer_division do.
+
+    For Decimal (object) columns that is floor_divide itself; float floor_divide rounds a
+    negative inexact quotient down, so those quotients are moved up by one.
+    """
+    quotients = np.floor_divide(dividends, divisors)
+    if quotients.dtype != object:
+        quotients += (quotients < 0) & (np.remainder(dividends, divisors) != 0)
+    return quotients
+
+def _divide_rows(rows, operands1, operands2, results, strategy) -> np.ndarray:
+    """Evaluate the division rows into results and return a mask of the rows that divide by zero."""
+    mask = np.zeros(len(results), dtype=bool)
+    if rows.size:
+        divisors = operands2[rows]
+        by_zero = divisors == 0
+        # Divide by one where the divisor is zero; those rows are masked out by the caller
+        safe_divisors = np.where(by_zero, 1, divisors)
+        divide = _truncating_divide if strategy is DivideCommand.integer_division else np.true_divide
+        results[rows] = divide(operands1[rows], safe_divisors)
+        mask[rows[by_zero]] = True
+    return mask
+
+def evaluate_batch(operations, values1, values2, exact: bool = False, strategy=None) -> np.ma.MaskedArray:
+    """
+    Evaluate many binary operations at once.
+
+    :param operations: Operation names or codes, one per row.
+    :param values1: The first operands.
+    :param values2: The second operands.
+    :param exact: Evaluate with Decimal objects instead of float64 to keep results exact.
+    :param strategy: The DivideCommand strategy to use for division rows: one of DIVISION_STRATEGIES.
+    :return: A masked array of results in which rows that divide by zero are masked.
+    :raises ValueError: For an unknown operation or a strategy that is not in DIVISION_STRATEGIES.
+    """
+    if strategy not in DIVISION_STRATEGIES:
+        raise ValueError(f"Unsupported division strategy for batch evaluation: {getattr(strategy, '__name__', strategy)}")
+    codes = encode_operations(operations)
+    operands1, operands2 = _as_operands(values1, exact), _as_operands(values2, exact)
+    if not len(codes) == len(operands1) == len(operands2):
+        raise ValueError("Operations and operands must have the same length.")
+
+    results = np.empty(len(codes), dtype=object if exact else np.float64)
+    for code, ufunc in _UFUNCS.items():
+        rows = codes == code
+        if rows.any():
+            results[rows] = getattr(np, ufunc)(operands1[rows], operands2[rows])
+
+    mask = _divide_rows(np.flatnonzero(codes == OPERATION_CODES['divide']), operands1, operands2, results, strategy)
+    if mask.any():
+        results[mask] = None if exact else np.nan
+        logging.error("Attempted to divide by zero in %d batch rows.", int(mask.sum()))
+
+    logging.debug("Evaluated a batch of %d operations.", len(codes))
+    return np.ma.MaskedArray(results, mask=mask)
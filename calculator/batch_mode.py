@@ -0,0 +1,115 @@
+"""
+Non-interactive batch evaluation of operations read from a file or stdin.
+
+Each input line holds one operation, either as CSV fields ``operation,value1,value2``
+(e.g. ``add,4,4``) or in the history format ``value1 operation value2`` (e.g. ``4 add 4``).
+Blank lines and a leading ``operation,...`` header line are skipped. Results are written as
+CSV rows ``operation,value1,value2,result`` in blocks; lines that fail are written with an
+``error: ...`` result instead of stopping the batch. Operands are parsed and evaluated with a
+numeric backend (see calculator.numeric), Decimal unless another one is chosen.
+"""
+
+import csv
+import logging
+from decimal import InvalidOperation
+from calculator.calculations import Calculations
+from calculator.numeric import DEFAULT_BACKEND, NumericBackend
+
+# Number of result rows buffered before they are written out
+BLOCK_SIZE = 10_000
+
+OUTPUT_COLUMNS = ['operation', 'value1', 'value2', 'result']
+
+def parse_operation_line(fields: list) -> tuple:
+    """
+    Parse the CSV fields of one input line into (operation_name, value1, value2) strings.
+
+    :raises ValueError: If the line has neither three fields nor a "value1 operation value2" field.
+    """
+    if len(fields) == 1:
+        words = fields[0].split()
+        if len(words) == 3:
+            return words[1].lower(), words[0], words[2]
+    elif len(fields) == 3:
+        return fields[0].strip().lower(), fields[1].strip(), fields[2].strip()
+    raise ValueError(f"Malformed line: {','.join(fields)}")
+
+def read_operations(stream, skip_header: bool = True):
+    """
+    Yield (operation_name, value1, value2) tuples, or a ValueError for malformed lines, from a text stream.
+
+    :param stream: A text stream, or any iterable of lines.
+    :param skip_header: Skip a leading ``operation,...`` header line.
+    """
+    for line_number, fields in enumerate(csv.reader(stream), 1):
+        if not fields or not ''.join(fields).strip():
+            continue
+        if skip_header and line_number == 1 and fields[0].strip().lower() == 'operation':
+            continue
+        try:
+            yield parse_operation_line(fields)
+        except ValueError as e:
+            yield e
+
+def evaluate_operation(operation_mappings: dict, operation_name: str, value1: str, value2: str,
+                       backend: NumericBackend = DEFAULT_BACKEND):
+    """
+    Evaluate one operation with the command classes in operation_mappings and a numeric backend.
+
+    :return: A (command, result) tuple.
+    :raises ValueError: For unknown operations and division by zero.
+    :raises InvalidOperation: For operands that are not valid numbers.
+    """
+    command_class = operation_mappings.get(operation_name)
+    if command_class is None:
+        raise ValueError(f"Unknown operation: {operation_name}")
+    command = command_class(backend.parse(value1), backend.parse(value2))
+    return command, backend.execute(command)
+
+def evaluate_line(operation_mappings: dict, operation, backend: NumericBackend = DEFAULT_BACKEND) -> tuple:
+    """
+    Evaluate one item yielded by read_operations.
+
+    :return: An (output row, command) tuple; command is None if the line failed.
+    """
+    if isinstance(operation, ValueError):
+        return ['', '', '', f"error: {operation}"], None
+    operation_name, value1, value2 = operation
+    try:
+        command, result = evaluate_operation(operation_mappings, operation_name, value1, value2, backend)
+    except InvalidOperation:
+        return [operation_name, value1, value2, "error: Invalid number input"], None
+    except ValueError as e:
+        return [operation_name, value1, value2, f"error: {e}"], None
+    return [operation_name, value1, value2, result], command
+
+def run_batch(source, output, operation_mappings: dict, backend: NumericBackend = DEFAULT_BACKEND) -> tuple:
+    """
+    Evaluate every operation in source, record them in the history and write the results to output.
+
+    The history is not saved here; callers flush it once the whole batch has run.
+
+    :param source: A text stream of operations.
+    :param output: A text stream receiving the CSV results.
+    :param operation_mappings: Operation names mapped to command classes.
+    :param backend: The numeric backend operands are parsed and evaluated with.
+    :return: A (succeeded, failed) tuple of line counts.
+    """
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(OUTPUT_COLUMNS)
+    block = []
+    succeeded = failed = 0
+    for operation in read_operations(source):
+        row, command = evaluate_line(operation_mappings, operation, backend)
+        block.append(row)
+        if command is None:
+            failed += 1
+        else:
+            Calculations.add_calculation(command)
+            succeeded += 1
+        if len(block) >= BLOCK_SIZE:
+            writer.writerows(block)
+            block = []
+    writer.writerows(block)
+    logging.info("Batch finished: %d operations succeeded, %d failed.", succeeded, failed)
+    return succeeded, failed
@@ -5,9 +5,10 @@ Module for Calculation class which represents basic calculations for the calcula
 from decimal import Decimal
 from typing import Callable
 from calculator.operations import add, subtract, multiply, divide
+from calculator.memo import CachedResult, computed_once, memoized
 
 # Definition of the Calculation class with type annotations for improved readability and safety
-class Calculation:
+class Calculation(CachedResult):
     """Represents a calculation consisting of two operands and an operation."""
     def __init__(self, value1: Decimal, value2: Decimal, operation: Callable[[Decimal, Decimal], Decimal]):
         """
@@ -28,6 +29,8 @@ class Calculation:
         """Description of what this method does."""
         return Calculation(value1, value2, operation)
 
+    @computed_once
+    @memoized(lambda calculation: calculation.operation)
     def perform(self) -> Decimal:
         """
         Executes the calculation using the specified operation.
@@ -36,6 +39,11 @@ class Calculation:
         """
         return self.operation(self.value1, self.value2)
 
+    @property
+    def result(self) -> Decimal:
+        """The result of the calculation, computed on first access and then cached."""
+        return self.perform()
+
     def __repr__(self):
         """Return a simplified string representation of the calculation."""
         return f"Calculation({self.value1}, {self.value2}, {self.operation.__name__})"
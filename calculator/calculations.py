@@ -3,39 +3,82 @@ Module for managing a history of calculations and performing operations using Pa
 """
 
 import os
+import csv
 import logging
-from decimal import Decimal
-from typing import List
-import pandas as pd
+import itertools
+import threading
+from typing import Dict, List, Tuple
+from calculator import history_sqlite
+from calculator.lazy import LazyModule
 from calculator.calculation import Calculation
+from calculator.batch import evaluate_batch
+from calculator.commands import FUSED_COMMANDS
+from calculator.memo import result_cache
+from calculator.numeric import STORED_NUMBER_PATTERN, parse_stored_number, parse_stored_row
+from calculator.history_store import HistoryStore, HistoryEntry, HistoryView, command_kind
+from calculator.history_formats import (
+    CSV_COLUMNS, is_binary, read_frame, rows_to_frame, split_operations, to_rows, write_frame
+)
+from calculator.history_index import COMPACTION_THRESHOLD, RowHashIndex, row_hashes
+from calculator.session import SessionAttribute, current_session
 from calculator.utils import get_operation_mappings  # Import operation mappings from utils
 
+pd = LazyModule('pandas')
+
 class Calculations:
-    """Manages a history of calculations and supports history storage and retrieval."""
+    """
+    Manages a history of calculations and supports history storage and retrieval.
+
+    The history belongs to the current session (see calculator.session), so threads working
+    in different sessions record their calculations independently.
+    """
+
+    # Columnar store holding the calculation history of the current session
+    history: HistoryStore = SessionAttribute('history')
+
+    # Number of history rows of the current session already written to each history file (the
+    # persisted-row watermark), with the generation of the history it counts rows of
+    _persisted_rows: Dict[str, Tuple[int, int]] = SessionAttribute('persisted_rows')
 
-    # Class-level attribute for storing calculation history as a list of Calculation objects
-    history: List[Calculation] = []
+    # Row hash indexes of the history files saved to, loaded once from their sidecar files
+    _row_indexes: Dict[str, RowHashIndex] = {}
+
+    # One lock per history file, so that saves, flushes and compactions of a file do not interleave
+    _file_locks: Dict[str, threading.RLock] = {}
+    _file_locks_lock = threading.Lock()
+
+    # Memoized results shared with every Calculator
+    result_cache = result_cache
 
     @classmethod
     def add_calculation(cls, calculation: Calculation):
-        """Add a new calculation to the history."""
-        logging.debug("Adding calculation to history: %s", calculation)
+        """Add a new calculation (a Calculation or a Command) to the history."""
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Adding calculation to history: %s", calculation)
         cls.history.append(calculation)
 
     @classmethod
-    def get_history(cls) -> List[Calculation]:
-        """Retrieve the entire calculation history."""
+    def add_results(cls, command_classes: list, values1: list, values2: list, results: list):
+        """Add many executed commands at once, given as columns of command classes, operands and results."""
+        codes = [cls.history.code_for(command_kind(command_class)) for command_class in command_classes]
+        cls.history.extend_rows(codes, values1, values2, results)
+        logging.debug("Added %d calculations to history.", len(codes))
+
+    @classmethod
+    def get_history(cls) -> HistoryView:
+        """Retrieve the entire calculation history as a read-only view; the history is not copied."""
         logging.info("Retrieving the entire calculation history.")
-        return cls.history.copy()
+        return cls.history.view()
 
     @classmethod
     def clear_history(cls):
         """Completely clear the stored history of calculations."""
         logging.info("Clearing the calculation history.")
         cls.history.clear()
+        cls._persisted_rows.clear()
 
     @classmethod
-    def get_latest(cls) -> Calculation:
+    def get_latest(cls) -> HistoryEntry:
         """Get the latest calculation. Returns None if no history exists."""
         if cls.history:
             logging.info("Retrieving the latest calculation.")
@@ -44,79 +87,332 @@ class Calculations:
         return None
 
     @classmethod
-    def find_by_operation(cls, operation_name: str) -> List[Calculation]:
-        """Find and return a list of calculations by operation name."""
+    def find_by_operation(cls, operation_name: str) -> List[HistoryEntry]:
+        """Find and return a list of calculations by operation name, using the operation index."""
         logging.info("Finding calculations with operation '%s'.", operation_name)
-        return [calc for calc in cls.history if calc.operation.__name__ == operation_name]
+        return cls.history.entries(cls.history.rows_for_operation(operation_name))
+
+    @classmethod
+    def find_by_result_range(cls, low, high) -> List[HistoryEntry]:
+        """Find the calculations whose result lies between low and high (inclusive), ordered by result."""
+        logging.info("Finding calculations with results between %s and %s.", low, high)
+        return cls.history.entries(cls.history.rows_in_result_range(low, high))
+
+    @classmethod
+    def find_by_time_range(cls, start: float, end: float) -> List[HistoryEntry]:
+        """Find the calculations added between the time.time() values start (inclusive) and end (exclusive)."""
+        logging.info("Finding calculations added between %s and %s.", start, end)
+        return cls.history.entries(cls.history.rows_in_time_range(start, end))
+
+    @classmethod
+    def delete_calculation(cls, index: int):
+        """Delete the calculation at the given history position and keep the indexes consistent."""
+        if index < 0:
+            index += len(cls.history)
+        cls.history.delete(index)
+        for file_name, (generation, persisted) in cls._persisted_rows.items():
+            if index < persisted:
+                cls._persisted_rows[file_name] = (generation, persisted - 1)
+        logging.info("Deleted calculation %d from the history.", index)
+
+    @classmethod
+    def _persisted_start(cls, file_name: str, generation: int, length: int) -> int:
+        """
+        Return the number of rows of the history already written to a history file.
+
+        A watermark set before the history was cleared or reloaded counts rows of another
+        generation of the history, so then every row is new again.
+
+        :param generation: The generation of the history (see HistoryStore.generation).
+        :param length: The number of rows in the history.
+        """
+        persisted_generation, persisted = cls._persisted_rows.get(file_name, (None, 0))
+        return persisted if persisted_generation == generation and persisted <= length else 0
+
+    @classmethod
+    def _file_lock(cls, file_name: str) -> threading.RLock:
+        """Return the lock serializing writes to a history file; writes to different files run concurrently."""
+        path = os.path.abspath(file_name)
+        lock = cls._file_locks.get(path)
+        if lock is None:
+            with cls._file_locks_lock:
+                lock = cls._file_locks.setdefault(path, threading.RLock())
+        return lock
+
+    @staticmethod
+    def evaluate_batch(operations, values1, values2, exact=False, strategy=None):
+        """
+        Evaluate arrays of operations and operands column-wise with NumPy.
+
+        The float64 path is the fast one; pass exact=True to evaluate with Decimals instead.
+        Rows that divide by zero are masked in the returned array.
+        """
+        return evaluate_batch(operations, values1, values2, exact=exact, strategy=strategy)
 
     @classmethod
     def save_history(cls, file_name='data/calculation_history.csv'):
-        """Save the history of calculations to a CSV file."""
-        try:
-            # Ensure that the 'data' directory exists
-            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        """
+        Save the history of calculations to a file, adding only the rows the file does not hold yet.
 
-            # Load any existing history from the file (if it exists)
-            if os.path.exists(file_name):
-                existing_data = pd.read_csv(file_name)
-            else:
-                existing_data = pd.DataFrame(columns=['operation', 'result'])
-
-            # Prepare the new history data to be appended
-            new_history_data = []
-            for calc in cls.history:
-                # Format the operation name and result
-                if hasattr(calc, 'execute'):
-                    operation_name = f"{calc.value1} {calc.__class__.__name__.replace('Command', '').lower()} {calc.value2}"
-                    result = calc.execute()  # Store only the numeric result
-                else:
-                    operation_name = f"{calc.value1} {calc.operation.__name__} {calc.value2}"
-                    result = calc.perform()  # Store only the numeric result
+        The format is chosen from the extension: CSV by default, or the typed columnar
+        Parquet (.parquet) and Feather (.feather) formats. Rows already in the file are
+        recognized by the persisted-row watermark and by their content hash (see
+        history_index), so a save costs O(new rows): a CSV file is appended to, and a Parquet
+        or Feather file is only rewritten when there are new rows. A file whose duplicate rows
+        exceed COMPACTION_THRESHOLD is then compacted.
+
+        A SQLite database (.db, .sqlite) is not rewritten either: only the calculations it does
+        not hold yet are appended, as by flush_history.
+        """
+        with cls._file_lock(file_name):
+            if history_sqlite.is_sqlite(file_name):
+                cls.flush_history(file_name)
+                return
+            try:
+                # Ensure that the 'data' directory exists
+                os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+                binary = is_binary(file_name)
+                # Rows up to the persisted-row watermark are already in the file; rows added
+                # by other threads while saving are left for the next save
+                generation = cls.history.generation
+                history = cls.history.view()
+                rows = to_rows(history[cls._persisted_start(file_name, generation, len(history)):], binary)
+                hashes = row_hashes(rows)
 
-                # Append the operation and result to new history data
-                new_history_data.append({
-                    'operation': operation_name,
-                    'result': result  # Save only the numeric result
-                })
+                # Keep only the rows that are neither in the file nor repeated in the history
+                index = cls._row_index(file_name)
+                new_positions = index.unseen(hashes)
+                if new_positions:
+                    cls._write_rows(file_name, [rows[position] for position in new_positions], binary)
+                    index.add([hashes[position] for position in new_positions])
+                index.save()
+                cls._persisted_rows[file_name] = (generation, len(history))
+                logging.info("Calculation history saved to %s (%d new rows)", file_name, len(new_positions))
+                if index.fragmentation() > COMPACTION_THRESHOLD:
+                    cls.compact_history(file_name)
+            except (FileNotFoundError, IOError, ImportError, pd.errors.EmptyDataError) as e:
+                logging.error("Error saving calculation history to %s: %s", file_name, e)
 
-            # Convert the new history to a DataFrame and concatenate with existing data
-            new_df = pd.DataFrame(new_history_data)
-            full_history = pd.concat([existing_data, new_df], ignore_index=True)
+    @classmethod
+    def _row_index(cls, file_name: str, rebuild: bool = True) -> RowHashIndex:
+        """
+        Return the up-to-date row hash index of a history file.
+
+        The index is kept in memory once loaded. It is reloaded from the sidecar file if the
+        history file has changed since, and rebuilt from the history file if the sidecar is
+        missing or stale.
 
-            # Remove duplicates by keeping only the last occurrence of each operation
-            full_history.drop_duplicates(inplace=True)
+        :param rebuild: Return None instead of reading the history file when there is no usable sidecar.
+        """
+        index = cls._row_indexes.get(file_name)
+        if index is None or not index.is_current():
+            index = RowHashIndex(file_name)
+            if not index.load():
+                if not rebuild:
+                    return None
+                frame_rows = read_frame(file_name).itertuples(index=False, name=None) if os.path.exists(file_name) else []
+                index.rebuild(row_hashes(frame_rows))
+                logging.info("Rebuilt the row index of %s (%d rows).", file_name, index.rows)
+            cls._row_indexes[file_name] = index
+        return index
 
-            # Write the full history (existing + new) back to the CSV
-            full_history.to_csv(file_name, index=False)
-            logging.info("Calculation history saved to %s", file_name)
-        except (FileNotFoundError, IOError, pd.errors.EmptyDataError) as e:
-            logging.error("Error saving calculation history to %s: %s", file_name, e)
+    @staticmethod
+    def _write_rows(file_name: str, rows: list, binary: bool):
+        """
+        Append rows from to_rows to a history file.
+
+        A CSV file is appended to in place; a Parquet or Feather file is rewritten with the rows added.
+        """
+        if binary:
+            frame = rows_to_frame(rows, binary=True)
+            if os.path.exists(file_name):
+                frame = pd.concat([read_frame(file_name), frame], ignore_index=True)
+            write_frame(frame, file_name)
+            return
+        write_header = not os.path.exists(file_name) or os.path.getsize(file_name) == 0
+        with open(file_name, 'a', newline='', encoding='utf-8') as history_file:
+            writer = csv.writer(history_file, lineterminator='\n')
+            if write_header:
+                writer.writerow(CSV_COLUMNS)
+            writer.writerows(rows)
 
     @classmethod
-    def load_history(cls, file_name='data/calculation_history.csv'):
-        """Load the history of calculations from a CSV file."""
-        operation_mappings = get_operation_mappings()
+    def load_history(cls, file_name='data/calculation_history.csv', chunksize=100_000, progress=None, lazy=False):
+        """
+        Load the history of calculations from a file, streaming it in fixed-size chunks.
+
+        Each chunk's operations are mapped to operation codes column-wise, and the rows are
+        appended to the columnar history in bulk.
 
+        :param file_name: The CSV, Parquet, Feather or SQLite file to load.
+        :param chunksize: The number of rows parsed per chunk.
+        :param progress: An optional callable receiving the number of rows loaded so far after each chunk.
+        :param lazy: Keep operands and results as text and convert them to numbers only when a row is accessed.
+        """
         if not os.path.exists(file_name):
             logging.warning("No history file found with name '%s'.", file_name)
             return
 
         try:
-            data = pd.read_csv(file_name)
-            logging.info("Loaded data from CSV: %s", data)
+            codes_by_name = {
+                name: cls.history.code_for(command_kind(command_class))
+                for name, command_class in itertools.chain(get_operation_mappings().items(), FUSED_COMMANDS.items())
+            }
+            if is_binary(file_name):
+                frame = read_frame(file_name)
+                chunks = (frame.iloc[start:start + chunksize] for start in range(0, len(frame), chunksize))
+            else:
+                chunks = read_frame(file_name, chunksize=chunksize)
+            # Clearing starts a new generation, so the watermarks of every other file are reset too
             cls.history.clear()
-            for _, row in data.iterrows():
-                operation_split = row['operation'].split(' ')
-                value1, operation, value2 = Decimal(operation_split[0]), operation_split[1], Decimal(operation_split[2])
-
-                # Retrieve the operation function from the mappings
-                operation_func = operation_mappings.get(operation.lower())
-
-                if operation_func:
-                    # Create a Calculation object and set the result directly from the CSV
-                    calculation = Calculation(value1, value2, operation_func)
-                    calculation.result = Decimal(row['result'])
-                    cls.history.append(calculation)  # Add to history with the saved result
-            logging.info("Calculation history loaded from %s", file_name)
-        except (FileNotFoundError, IOError, pd.errors.EmptyDataError) as e:
+            loaded = 0
+            for chunk in chunks:
+                loaded += cls._append_chunk(chunk, codes_by_name, lazy)
+                logging.debug("Loaded %d rows from %s so far.", loaded, file_name)
+                if progress:
+                    progress(loaded)
+            cls._persisted_rows[file_name] = (cls.history.generation, len(cls.history))
+            logging.info("Calculation history loaded from %s (%d rows).", file_name, loaded)
+        except (FileNotFoundError, IOError, ImportError, ValueError, pd.errors.EmptyDataError,
+                history_sqlite.sqlite3.Error) as e:
             logging.error("Error loading calculation history from %s: %s", file_name, e)
+
+    @classmethod
+    def _append_chunk(cls, chunk, codes_by_name: Dict[str, int], lazy: bool) -> int:
+        """Append one chunk of a history file to the history and return its row count."""
+        names, values1, values2, results = split_operations(chunk)
+        codes = names.str.lower().map(codes_by_name)
+
+        # Skip rows with an unknown operation or a missing operand
+        valid = codes.notna() & values2.notna()
+        if lazy:
+            # Lazy text is only parsed when its row is read, so check it against the number grammar now
+            numbers = (values1.str.fullmatch(STORED_NUMBER_PATTERN, na=False)
+                       & values2.str.fullmatch(STORED_NUMBER_PATTERN, na=False)
+                       & results.str.fullmatch(STORED_NUMBER_PATTERN, na=False))
+            for row in (valid & ~numbers).to_numpy().nonzero()[0]:
+                logging.warning("Skipping a history row with a malformed number: %s, %s = %s",
+                                values1.iloc[row], values2.iloc[row], results.iloc[row])
+            valid &= numbers
+        columns = (codes[valid].astype(int).tolist(), values1[valid].tolist(), values2[valid].tolist(),
+                   results[valid].tolist())
+        if not lazy:
+            # Rows holding a Fraction are parsed row by row, so that all of their numbers become Fractions
+            fractions = (values1.str.contains('/', regex=False, na=False)
+                         | values2.str.contains('/', regex=False, na=False)
+                         | results.str.contains('/', regex=False, na=False))
+            if fractions[valid].any():
+                columns = cls._parse_rows(*columns)
+            else:
+                try:
+                    columns = (columns[0], *(list(map(parse_stored_number, column)) for column in columns[1:]))
+                except (ArithmeticError, TypeError, ValueError):
+                    columns = cls._parse_rows(*columns)
+        cls.history.extend_rows(*columns)
+        return len(columns[0])
+
+    @staticmethod
+    def _parse_rows(codes: list, values1: list, values2: list, results: list) -> tuple:
+        """Parse the operands and results of a chunk row by row, skipping the rows that are not numbers."""
+        parsed = []
+        for row in zip(codes, values1, values2, results):
+            try:
+                parsed.append((row[0], *parse_stored_row(*row[1:])))
+            except (ArithmeticError, TypeError, ValueError):
+                logging.warning("Skipping a history row with a malformed number: %s, %s = %s", *row[1:])
+        return tuple(map(list, zip(*parsed))) if parsed else ([], [], [], [])
+
+    @staticmethod
+    def read_history_columns(file_name='data/calculation_history.csv', columns=None):
+        """
+        Read only the given columns of a history file as strings, without touching the in-memory history.
+
+        Parquet, Feather and SQLite files have op, value1, value2 and result columns; CSV files
+        have operation and result columns.
+        """
+        return read_frame(file_name, columns=columns)
+
+    @classmethod
+    def flush_history(cls, file_name='data/calculation_history.csv'):
+        """
+        Append only the calculations added since the last flush to a history file.
+
+        Unlike save_history, an existing CSV file is neither read nor rewritten, so the cost of
+        a flush depends only on the number of new rows. Duplicates are left in place until
+        compact_history is called, or until save_history finds too many of them. New rows are
+        inserted into a SQLite database in one transaction, with the time each was added.
+        Parquet and Feather files cannot be appended to, so for those the new rows are
+        concatenated with the file's contents and the file is rewritten.
+
+        :param file_name: The file to append to.
+        :return: The number of rows written.
+        """
+        with cls._file_lock(file_name):
+            generation = cls.history.generation
+            history = cls.history.view()
+            start = cls._persisted_start(file_name, generation, len(history))
+            new_entries = history[start:]
+            if not new_entries:
+                return 0
+
+            try:
+                os.makedirs(os.path.dirname(file_name) or '.', exist_ok=True)
+                if history_sqlite.is_sqlite(file_name):
+                    history_sqlite.write_rows(
+                        file_name,
+                        ((entry.operation_name, entry.value1, entry.value2, entry.result) for entry in new_entries),
+                        [cls.history.timestamp(row) for row in range(start, start + len(new_entries))],
+                        session_id=current_session().session_id,
+                    )
+                else:
+                    binary = is_binary(file_name)
+                    rows = to_rows(new_entries, binary)
+                    # Keep an existing row index in step, without building one
+                    index = cls._row_index(file_name, rebuild=False)
+                    cls._write_rows(file_name, rows, binary)
+                    if index is not None:
+                        index.add(row_hashes(rows))
+                        index.save()
+                cls._persisted_rows[file_name] = (generation, len(history))
+                logging.info("Appended %d calculations to %s", len(new_entries), file_name)
+                return len(new_entries)
+            except (FileNotFoundError, IOError, ImportError, history_sqlite.sqlite3.Error) as e:
+                logging.error("Error flushing calculation history to %s: %s", file_name, e)
+                return 0
+
+    @classmethod
+    def compact_history(cls, file_name='data/calculation_history.csv'):
+        """
+        Remove duplicate rows from a history file written by flush_history.
+
+        Rows are compared by their content hash and the first of each is kept. The file's row
+        index is rebuilt from the compacted rows, so the next save does not read the file.
+
+        :param file_name: The file to compact.
+        :return: The number of duplicate rows removed.
+        """
+        if not os.path.exists(file_name):
+            logging.warning("No history file found with name '%s'.", file_name)
+            return 0
+
+        with cls._file_lock(file_name):
+            try:
+                if history_sqlite.is_sqlite(file_name):
+                    removed = history_sqlite.compact(file_name)
+                    logging.info("Compacted %s: removed %d duplicate rows.", file_name, removed)
+                    return removed
+                data = read_frame(file_name)
+                hashes = row_hashes(data.itertuples(index=False, name=None))
+                index = RowHashIndex(file_name)
+                first_positions = index.unseen(hashes)
+                index.add([hashes[position] for position in first_positions])
+                removed = len(data) - len(first_positions)
+                if removed:
+                    write_frame(data.iloc[first_positions], file_name)
+                index.save()
+                cls._row_indexes[file_name] = index
+                logging.info("Compacted %s: removed %d duplicate rows.", file_name, removed)
+                return removed
+            except (FileNotFoundError, IOError, ImportError, pd.errors.EmptyDataError, history_sqlite.sqlite3.Error) as e:
+                logging.error("Error compacting calculation history in %s: %s", file_name, e)
+                return 0
@@ -2,35 +2,50 @@
 Calculator module to perform operations using a dynamic plugin system and maintain a history of calculations.
 """
 import os
-import importlib
 import logging
 from calculator.commands import Command, DivideCommand
+from calculator.history_store import HistoryStore
+from calculator.memo import result_cache
+from calculator.plugin_registry import plugin_registry
+from calculator.session import current_session
 
 class Calculator:
     """
     The Calculator class handles the execution of arithmetic operations and manages plugins
-    for dynamically adding new commands. It also maintains a history of executed commands.
+    for dynamically adding new commands. It also maintains a history of executed commands,
+    kept in a columnar HistoryStore like the Calculations history.
+
+    There is one Calculator per session (see calculator.session): Calculator() returns the
+    current session's, so threads in different sessions do not share a history.
     """
-    _instance = None
+    result_cache = result_cache  # Memoized results shared with Calculations
 
     def __new__(cls, *args, **kwargs):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+        session = current_session()
+        if session.calculator is None:
+            with session.calculator_lock:
+                if session.calculator is None:
+                    session.calculator = super().__new__(cls)
+        return session.calculator
 
     def __init__(self):
-        if not hasattr(self, 'history'):
-            self.history = []  # Maintain a history of executed commands
+        session = current_session()
+        with session.calculator_lock:
+            if hasattr(self, 'history'):
+                return
+            # Maintain a history of executed commands; the store has its own lock
+            self.history = HistoryStore(session.window, session.spill_dir)
             self.plugins = {}  # Dictionary to store loaded plugins
-            environment = os.getenv("ENVIRONMENT", "development").lower()
-            logging.info("Calculator initialized with empty history and plugins in %s environment.", environment)
+        environment = os.getenv("ENVIRONMENT", "development").lower()
+        logging.info("Calculator initialized with empty history and plugins in %s environment.", environment)
 
     def compute(self, command: Command):
         """Execute a command and store it in the history."""
         try:
             result = command.execute()  # Execute the provided command
             self.add_to_history(command)  # Store the command in history
-            logging.info("Executed command: %s with result: %s", command, result)
+            if logging.root.isEnabledFor(logging.INFO):
+                logging.info("Executed command: %s with result: %s", command, result)
             return result  # Return the result of the command
         except Exception as e:
             logging.error("Failed to execute command: %s due to error: %s", command, e)
@@ -39,12 +54,13 @@ class Calculator:
     def add_to_history(self, command: Command):
         """Add a command to the history and log at DEBUG level."""
         self.history.append(command)
-        logging.debug("Added command %s to history.", command)
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Added command %s to history.", command)
 
     def load_plugin(self, plugin_name: str):
-        """Dynamically load a plugin by its name from the plugins folder."""
+        """Dynamically load a plugin by its module name from the plugins folder."""
         try:
-            plugin_module = importlib.import_module(f"calculator.plugins.{plugin_name}")
+            plugin_module = plugin_registry.load_module(plugin_name)
             command_class = plugin_module.register()
             self.plugins[plugin_name] = command_class
             logging.debug("Successfully loaded plugin: %s", plugin_name)
@@ -59,6 +75,10 @@ class Calculator:
             logging.debug("Created DivideCommand with strategy %s and arguments %s", strategy, args)
             return command
 
+        if plugin_name not in self.plugins and plugin_name in plugin_registry:
+            # A discovered plugin operation is imported on first use
+            self.plugins[plugin_name] = plugin_registry.command_class(plugin_name)
+
         if plugin_name in self.plugins:
             try:
                 command = self.plugins[plugin_name](*args)  # Create command with the provided arguments
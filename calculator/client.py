@@ -0,0 +1,51 @@
+"""
+Thin command-line client for the calculator daemon (see calculator.daemon).
+
+This module deliberately imports only small standard library modules, so that a call costs
+little more than starting the interpreter:
+
+    python -m calculator.client add 4 4
+    python -m calculator.client "(3 + 4) * 2 / 7"
+"""
+
+import os
+import sys
+import json
+import socket
+
+# Must match calculator.daemon.DEFAULT_SOCKET_PATH, which this module does not import
+DEFAULT_SOCKET_PATH = os.getenv("CALCULATOR_SOCKET") or os.path.join(
+    os.getenv("XDG_RUNTIME_DIR") or os.getenv("TMPDIR") or "/tmp", f"calculator-{os.getuid()}.sock")
+
+def send_request(request: dict, socket_path: str = DEFAULT_SOCKET_PATH) -> dict:
+    """Send one request to the daemon and return its decoded response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as responses:
+            return json.loads(responses.readline())
+
+def main(argv=None, socket_path: str = DEFAULT_SOCKET_PATH) -> int:
+    """Send the operation or expression given on the command line and print the result."""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 3:
+        request = {'operation': argv[0], 'value1': argv[1], 'value2': argv[2]}
+    elif len(argv) == 1:
+        request = {'expression': argv[0]}
+    else:
+        print("Usage: python -m calculator.client <operation> <value1> <value2> | <expression>", file=sys.stderr)
+        return 2
+
+    try:
+        response = send_request(request, socket_path)
+    except OSError as e:
+        print(f"Cannot reach the calculator daemon at {socket_path}: {e}", file=sys.stderr)
+        return 2
+    if 'error' in response:
+        print(f"An error occurred: {response['error']}", file=sys.stderr)
+        return 1
+    print(response['result'])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
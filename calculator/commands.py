@@ -2,17 +2,43 @@
 This module defines command classes for arithmetic operations, including addition,
 subtraction, multiplication, and division. Each command encapsulates a specific
 operation and follows the Command design pattern.
+
+Besides the binary commands there are fused commands over many operands: SumCommand,
+ProductCommand and PipelineCommand (a chain of operations applied to a running value).
+Each evaluates all of its operands in a single pass and is recorded as one history entry,
+instead of creating, logging and recording one binary command per step. Their operands are
+held in an Operands tuple as value1 (value2 for a pipeline).
 """
 
+import math
+import decimal
+import itertools
 import logging
+import operator
+from calculator.memo import CachedResult, computed_once, memoized
+from calculator.numeric import Operands
+from calculator.operations import divide
+
+def _command_name(command):
+    """Return the class name of a command, used to key memoized results."""
+    return type(command).__name__
 
-class Command:
+class Command(CachedResult):
     """Abstract base class for all commands with an execute method."""
 
     def execute(self):
         """Execute the command operation. Subclasses must implement this method."""
         raise NotImplementedError("Subclasses must implement the 'execute' method.")
 
+    @property
+    def result(self):
+        """The result of the command, computed on first access and then cached on the command."""
+        try:
+            return self.__dict__['_result']
+        except KeyError:
+            result = self.__dict__['_result'] = self.execute()
+            return result
+
 class AddCommand(Command):
     """Command to add two values."""
 
@@ -21,14 +47,17 @@ class AddCommand(Command):
         self.value1 = value1
         self.value2 = value2
 
+    @computed_once
+    @memoized(_command_name)
     def execute(self):
         """Execute addition and return the result."""
         result = self.value1 + self.value2
-        logging.debug("Executing AddCommand: %s + %s = %s", self.value1, self.value2, result)
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Executing AddCommand: %s + %s = %s", self.value1, self.value2, result)
         return result
 
     def __repr__(self):
-        return f"Add {self.value1} and {self.value2} = {self.execute()}"
+        return f"Add {self.value1} and {self.value2} = {self.result}"
 
 class SubtractCommand(Command):
     """Command to subtract the second value from the first."""
@@ -37,14 +66,17 @@ class SubtractCommand(Command):
         self.value1 = value1
         self.value2 = value2
 
+    @computed_once
+    @memoized(_command_name)
     def execute(self):
         """Execute subtraction and return the result."""
         result = self.value1 - self.value2
-        logging.debug("Executing SubtractCommand: %s - %s = %s", self.value1, self.value2, result)
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Executing SubtractCommand: %s - %s = %s", self.value1, self.value2, result)
         return result
 
     def __repr__(self):
-        return f"Subtract {self.value1} and {self.value2} = {self.execute()}"
+        return f"Subtract {self.value1} and {self.value2} = {self.result}"
 
 class MultiplyCommand(Command):
     """Command to multiply two values."""
@@ -53,14 +85,17 @@ class MultiplyCommand(Command):
         self.value1 = value1
         self.value2 = value2
 
+    @computed_once
+    @memoized(_command_name)
     def execute(self):
         """Execute multiplication and return the result."""
         result = self.value1 * self.value2
-        logging.debug("Executing MultiplyCommand: %s * %s = %s", self.value1, self.value2, result)
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Executing MultiplyCommand: %s * %s = %s", self.value1, self.value2, result)
         return result
 
     def __repr__(self):
-        return f"Multiply {self.value1} and {self.value2} = {self.execute()}"
+        return f"Multiply {self.value1} and {self.value2} = {self.result}"
 
 class DivideCommand(Command):
     """Command to divide the first value by the second using a specified strategy."""
@@ -70,16 +105,19 @@ class DivideCommand(Command):
         self.value2 = value2
         self.strategy = strategy if strategy else self.default_division
 
+    @computed_once
+    @memoized(_command_name)
     def execute(self):
         """Execute division using the specified strategy."""
         if self.value2 == 0:
             logging.error("Attempted to divide by zero: %s / %s", self.value1, self.value2)
             raise ValueError("Cannot divide by zero.")
         result = self.strategy(self.value1, self.value2)
-        logging.debug(
-            "Executing DivideCommand with strategy %s: %s / %s = %s",
-            self.strategy.__name__, self.value1, self.value2, result
-        )
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug(
+                "Executing DivideCommand with strategy %s: %s / %s = %s",
+                self.strategy.__name__, self.value1, self.value2, result
+            )
         return result
 
     @staticmethod
@@ -89,12 +127,177 @@ class DivideCommand(Command):
 
     @staticmethod
     def integer_division(value1, value2):
-        """Alternative division strategy, performing integer division."""
-        return value1 // value2
+        """
+        Alternative division strategy, performing integer division truncated toward zero.
+
+        Decimal's // truncates (-7 // 2 is -3), but float and Fraction floor (-4), so for those
+        a negative inexact quotient is moved up by one to give the same result with every backend.
+        """
+        quotient = value1 // value2
+        if not isinstance(quotient, decimal.Decimal) and quotient < 0 and value1 % value2:
+            quotient += 1
+        return quotient
 
     def __repr__(self):
         try:
-            result = self.execute()
-            return f"Divide {self.value1} by {self.value2} = {result}"
+            return f"Divide {self.value1} by {self.value2} = {self.result}"
         except ValueError:
             return f"Divide {self.value1} by {self.value2} = Cannot divide by zero"
+
+class SumCommand(Command):
+    """
+    Command to add many values in one pass, starting from start.
+
+    The summation strategy is a function of (values, start):
+
+    - exact_sum (default): the exact sum, rounded once to the decimal context, so the result
+      does not depend on the order or number of values. Floats are summed with math.fsum.
+    - pairwise_sum: adds pairs of partial sums in the active context, so rounding errors grow
+      with log n rather than n.
+    - float_sum: converts the values to float and sums them with math.fsum. It is the fast
+      path for values that already are floats (e.g. with the float numeric backend).
+    """
+
+    def __init__(self, values, start=0, strategy=None):
+        self.value1 = Operands(values)
+        self.value2 = start
+        self.strategy = strategy  # None for exact_sum
+
+    @computed_once
+    def execute(self):
+        """Execute the summation with the command's strategy and return the result."""
+        result = (self.strategy or self.exact_sum)(self.value1, self.value2)
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Executing SumCommand over %d values = %s", len(self.value1), result)
+        return result
+
+    @staticmethod
+    def exact_sum(values, start):
+        """Sum the values exactly and round the total once."""
+        if isinstance(start, float) or (values and isinstance(values[0], float)):
+            return math.fsum(itertools.chain((start,), values))
+        with decimal.localcontext() as context:
+            # Decimal additions are exact as long as the precision and exponent range suffice
+            context.prec, context.Emax, context.Emin = decimal.MAX_PREC, decimal.MAX_EMAX, decimal.MIN_EMIN
+            total = sum(values, start)
+        return +total if isinstance(total, decimal.Decimal) else total
+
+    @staticmethod
+    def pairwise_sum(values, start):
+        """Sum the values in the active context by adding pairs of partial sums."""
+        partials = list(values)
+        while len(partials) > 1:
+            paired = list(map(operator.add, partials[::2], partials[1::2]))
+            if len(partials) % 2:
+                paired.append(partials[-1])
+            partials = paired
+        return start + partials[0] if partials else start
+
+    @staticmethod
+    def float_sum(values, start):
+        """Sum the values as floats with math.fsum."""
+        return math.fsum(map(float, itertools.chain((start,), values)))
+
+    def __repr__(self):
+        return f"Sum of {len(self.value1)} values = {self.result}"
+
+class ProductCommand(Command):
+    """
+    Command to multiply many values in one pass, starting from start.
+
+    The multiplication strategy is a function of (values, start):
+
+    - sequential_product (default): multiplies the values in order in the active context, so
+      the result is the same as that of a chain of MultiplyCommands.
+    - pairwise_product: multiplies pairs of partial products, which keeps the operands of
+      large exact products (integers and Fractions) balanced and is faster for them.
+    - float_product: converts the values to float and multiplies them with math.prod.
+    """
+
+    def __init__(self, values, start=1, strategy=None):
+        self.value1 = Operands(values)
+        self.value2 = start
+        self.strategy = strategy  # None for sequential_product
+
+    @computed_once
+    def execute(self):
+        """Execute the multiplication with the command's strategy and return the result."""
+        result = (self.strategy or self.sequential_product)(self.value1, self.value2)
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Executing ProductCommand over %d values = %s", len(self.value1), result)
+        return result
+
+    @staticmethod
+    def sequential_product(values, start):
+        """Multiply the values in order in the active context."""
+        return math.prod(values, start=start)
+
+    @staticmethod
+    def pairwise_product(values, start):
+        """Multiply the values by multiplying pairs of partial products."""
+        partials = list(values)
+        while len(partials) > 1:
+            paired = list(map(operator.mul, partials[::2], partials[1::2]))
+            if len(partials) % 2:
+                paired.append(partials[-1])
+            partials = paired
+        return start * partials[0] if partials else start
+
+    @staticmethod
+    def float_product(values, start):
+        """Multiply the values as floats."""
+        return math.prod(map(float, values), start=float(start))
+
+    def __repr__(self):
+        return f"Product of {len(self.value1)} values = {self.result}"
+
+# The functions applied by each pipeline step, by operation name
+PIPELINE_OPERATIONS = {
+    'add': operator.add,
+    'subtract': operator.sub,
+    'multiply': operator.mul,
+    'divide': divide,
+}
+
+class PipelineCommand(Command):
+    """
+    Command to apply a sequence of operations to a running value in one pass.
+
+    PipelineCommand(2, [('add', 3), ('multiply', 4)]) computes (2 + 3) * 4 like an AddCommand
+    followed by a MultiplyCommand, but without creating or recording the intermediate commands.
+    """
+
+    def __init__(self, value, steps):
+        """
+        :param value: The starting value.
+        :param steps: (operation name, operand) pairs, with the names in PIPELINE_OPERATIONS.
+        :raises ValueError: If a step names an unknown operation.
+        """
+        steps = Operands((name, operand) for name, operand in steps)
+        for name, _ in steps:
+            if name not in PIPELINE_OPERATIONS:
+                raise ValueError(f"Unknown pipeline operation: {name}")
+        self.value1 = value
+        self.value2 = steps
+
+    @computed_once
+    def execute(self):
+        """Apply each step to the running value and return the final value."""
+        result = self.value1
+        operations = PIPELINE_OPERATIONS
+        for name, operand in self.value2:
+            result = operations[name](result, operand)
+        if logging.root.isEnabledFor(logging.DEBUG):
+            logging.debug("Executing PipelineCommand: %s through %d steps = %s", self.value1, len(self.value2), result)
+        return result
+
+    def __repr__(self):
+        steps = ' '.join(f"{name} {operand}" for name, operand in self.value2)
+        return f"Pipeline {self.value1} {steps} = {self.result}"
+
+# The fused commands by operation name, as recorded in the history
+FUSED_COMMANDS = {
+    'sum': SumCommand,
+    'product': ProductCommand,
+    'pipeline': PipelineCommand,
+}
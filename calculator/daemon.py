@@ -0,0 +1,155 @@
+"""
+Daemon mode: serve calculations from a warm process over a Unix domain socket.
+
+Starting the calculator imports pandas, numpy and dotenv and configures logging, which costs
+far more than a single calculation. The daemon pays that once and then answers requests from
+calculator.client, whose only imports are from the standard library.
+
+The protocol is one JSON object per line in each direction. A request is either
+``{"operation": "add", "value1": "1", "value2": "2"}`` or ``{"expression": "(1 + 2) * 3"}``;
+the response is ``{"result": "..."}`` or ``{"error": "..."}``.
+"""
+
+import os
+import stat
+import json
+import socket
+import signal
+import logging
+import threading
+import socketserver
+from decimal import Decimal, InvalidOperation
+from calculator.calculator import Calculator
+from calculator.calculations import Calculations
+from calculator.expression import compile_expression
+from calculator.commands import Command
+from calculator.utils import get_operation_mappings
+
+# A per-user socket, so that one user's client never talks to another user's daemon
+DEFAULT_SOCKET_PATH = os.getenv("CALCULATOR_SOCKET") or os.path.join(
+    os.getenv("XDG_RUNTIME_DIR") or os.getenv("TMPDIR") or "/tmp", f"calculator-{os.getuid()}.sock")
+
+# Errors raised by evaluate_request for requests that cannot be evaluated, e.g. decimal.Overflow
+REQUEST_ERRORS = (ArithmeticError, KeyError, TypeError, ValueError)
+
+def build_command(request: dict):
+    """
+    Build the command described by a request without executing it.
+
+    :return: A Command, or a Decimal for an expression that is a plain number.
+    :raises ValueError: For unknown operations, malformed expressions and malformed requests.
+    :raises InvalidOperation: For operands that are not valid numbers.
+    """
+    if 'expression' in request:
+        return compile_expression(str(request['expression']))()
+    operation_name = str(request.get('operation', '')).lower()
+    command_class = get_operation_mappings().get(operation_name)
+    if command_class is None:
+        raise ValueError(f"Unknown operation: {operation_name}")
+    return command_class(Decimal(str(request['value1'])), Decimal(str(request['value2'])))
+
+def evaluate_request(request: dict) -> tuple:
+    """
+    Evaluate a request without recording it; safe to run in worker threads and processes.
+
+    :return: A (command, result) tuple; command is None for an expression that is a plain number.
+    """
+    command = build_command(request)
+    if not isinstance(command, Command):
+        return None, command
+    return command, command.execute()
+
+def error_response(error: Exception) -> dict:
+    """Return the response object reporting an error raised while evaluating a request."""
+    if isinstance(error, InvalidOperation):
+        return {'error': "Invalid number input"}
+    if isinstance(error, (KeyError, TypeError)):
+        return {'error': "Malformed request"}
+    if isinstance(error, ArithmeticError):
+        return {'error': f"Arithmetic error: {type(error).__name__}"}
+    return {'error': str(error)}
+
+def record_result(command, result) -> dict:
+    """Store an executed command in the current session's Calculator history and in Calculations, and return the response."""
+    if command is not None:
+        Calculator().add_to_history(command)
+        Calculations.add_calculation(command)
+    return {'result': str(result)}
+
+def handle_request(request: dict) -> dict:
+    """Evaluate one request, record it in the history and return the response object."""
+    try:
+        command, result = evaluate_request(request)
+    except REQUEST_ERRORS as e:
+        return error_response(e)
+    return record_result(command, result)
+
+def handle_line(line: bytes) -> bytes:
+    """Decode one request line, evaluate it and encode the response line."""
+    try:
+        request = json.loads(line)
+    except ValueError:
+        response = {'error': "Malformed request"}
+    else:
+        response = handle_request(request) if isinstance(request, dict) else {'error': "Malformed request"}
+    return json.dumps(response).encode('utf-8') + b'\n'
+
+class CalculatorRequestHandler(socketserver.StreamRequestHandler):
+    """Answer each JSON line received on a connection until the client disconnects."""
+
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write(handle_line(line))
+                self.wfile.flush()
+
+def remove_stale_socket(socket_path: str):
+    """
+    Remove the socket file left at socket_path by a daemon that is no longer running.
+
+    :raises FileExistsError: If socket_path is not a socket, or a daemon is still listening on it.
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(socket_path)
+            return
+    raise FileExistsError(f"A server is already listening on {socket_path}")
+
+def create_server(socket_path: str = DEFAULT_SOCKET_PATH) -> socketserver.UnixStreamServer:
+    """Bind a server to socket_path, readable and writable by the current user only."""
+    remove_stale_socket(socket_path)
+    Calculator()  # Create the default session's Calculator before the first request arrives
+    server = socketserver.UnixStreamServer(socket_path, CalculatorRequestHandler)
+    os.chmod(socket_path, 0o600)
+    return server
+
+def _interrupt(signum, _frame):
+    """Turn SIGTERM into KeyboardInterrupt so that the daemon shuts down cleanly."""
+    raise KeyboardInterrupt(f"Received signal {signum}")
+
+def serve(socket_path: str = DEFAULT_SOCKET_PATH, history_file='data/calculation_history.csv'):
+    """Serve requests until interrupted (SIGINT or SIGTERM), then append the history to history_file."""
+    server = create_server(socket_path)
+    in_main_thread = threading.current_thread() is threading.main_thread()
+    previous_handler = signal.signal(signal.SIGTERM, _interrupt) if in_main_thread else None
+    logging.info("Calculator daemon listening on %s.", socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Calculator daemon interrupted.")
+    finally:
+        server.server_close()
+        if in_main_thread:
+            signal.signal(signal.SIGTERM, previous_handler)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        Calculations.flush_history(file_name=history_file)
+        logging.info("Calculator daemon on %s stopped.", socket_path)
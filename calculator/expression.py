@@ -0,0 +1,199 @@
+"""
+This module implements a small arithmetic expression language for the calculator.
+
+Expressions such as "(3 + 4) * 2 / 7" are parsed into a tree whose inner nodes are the
+Command classes from calculator.commands and whose leaves are Decimal numbers. The tree is
+then compiled into nested closures, which convert the numbers to the type of a numeric
+backend when one is given. Both steps are cached by expression text, so evaluating
+an expression that was seen before skips tokenizing and parsing entirely.
+"""
+
+import re
+from decimal import Decimal
+from functools import lru_cache
+from calculator.commands import AddCommand, SubtractCommand, MultiplyCommand, DivideCommand, Command
+
+# Maximum number of parsed and compiled expressions kept in each LRU cache
+EXPRESSION_CACHE_SIZE = 256
+
+# Limits that keep parsing, compiling and evaluating within Python's recursion limit: the
+# nesting of parentheses and signs, and the depth of the command tree (e.g. "1 + 1 + ... + 1"
+# is a chain of as many commands as there are operators)
+MAX_NESTING = 100
+MAX_DEPTH = 256
+
+BINARY_OPERATORS = {
+    '+': AddCommand,
+    '-': SubtractCommand,
+    '*': MultiplyCommand,
+    '/': DivideCommand,
+}
+
+_TOKEN_PATTERN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|(\S))")
+_EXPRESSION_PATTERN = re.compile(r"^[\d\s.eE+\-*/()]*\d[\d\s.eE+\-*/()]*$")
+
+def is_expression(text: str) -> bool:
+    """Return True if the text only contains numbers, operators and parentheses."""
+    return bool(_EXPRESSION_PATTERN.match(text))
+
+def _tokenize(text: str):
+    """Split an expression into a list of Decimal numbers and operator/parenthesis characters."""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        number, symbol = match.groups()
+        if number is not None:
+            tokens.append(Decimal(number))
+        elif symbol in BINARY_OPERATORS or symbol in '()':
+            tokens.append(symbol)
+        else:
+            raise ValueError(f"Invalid expression: unexpected '{symbol}' in {text!r}")
+        position = match.end()
+    return tokens
+
+class _Parser:
+    """Recursive descent parser producing (command_class, left, right) tuples and Decimal leaves."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.position = 0
+        self.nesting = 0
+
+    def peek(self):
+        """Return the current token without consuming it, or None at the end of the input."""
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self):
+        """Consume and return the current token."""
+        token = self.peek()
+        if token is None:
+            raise ValueError(f"Invalid expression: unexpected end of {self.text!r}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        """Parse the whole input as a single expression."""
+        node = self.expression()
+        if self.peek() is not None:
+            raise ValueError(f"Invalid expression: unexpected '{self.peek()}' in {self.text!r}")
+        if _depth(node) > MAX_DEPTH:
+            raise ValueError(f"Invalid expression: more than {MAX_DEPTH} nested operations in {self.text!r}")
+        return node
+
+    def nested(self, parse):
+        """Parse a parenthesized or signed operand with parse, counting its nesting."""
+        self.nesting += 1
+        if self.nesting > MAX_NESTING:
+            raise ValueError(f"Invalid expression: nested more than {MAX_NESTING} levels deep in {self.text!r}")
+        node = parse()
+        self.nesting -= 1
+        return node
+
+    def expression(self):
+        """expression := term (('+' | '-') term)*"""
+        node = self.term()
+        while self.peek() in ('+', '-'):
+            command_class = BINARY_OPERATORS[self.take()]
+            node = (command_class, node, self.term())
+        return node
+
+    def term(self):
+        """term := factor (('*' | '/') factor)*"""
+        node = self.factor()
+        while self.peek() in ('*', '/'):
+            command_class = BINARY_OPERATORS[self.take()]
+            node = (command_class, node, self.factor())
+        return node
+
+    def factor(self):
+        """factor := ('+' | '-') factor | number | '(' expression ')'"""
+        token = self.take()
+        if isinstance(token, Decimal):
+            return token
+        if token == '-':
+            operand = self.nested(self.factor)
+            return -operand if isinstance(operand, Decimal) else (SubtractCommand, Decimal(0), operand)
+        if token == '+':
+            return self.nested(self.factor)
+        if token == '(':
+            node = self.nested(self.expression)
+            if self.take() != ')':
+                raise ValueError(f"Invalid expression: missing ')' in {self.text!r}")
+            return node
+        raise ValueError(f"Invalid expression: unexpected '{token}' in {self.text!r}")
+
+def _depth(node) -> int:
+    """Return the number of commands on the longest path from the root of a tree to a leaf."""
+    depth, stack = 0, [(node, 1)]
+    while stack:
+        node, level = stack.pop()
+        if isinstance(node, tuple):
+            depth = max(depth, level)
+            stack.extend(((node[1], level + 1), (node[2], level + 1)))
+    return depth
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def parse_expression(text: str):
+    """
+    Parse an expression into a tree of Command classes.
+
+    :param text: The expression, e.g. "(3 + 4) * 2 / 7".
+    :return: A Decimal for a plain number, otherwise a (command_class, left, right) tuple.
+    :raises ValueError: If the expression is malformed or nested too deeply.
+    """
+    return _Parser(text).parse()
+
+def _number(leaf: Decimal, backend):
+    """Return a parsed number as the backend's number type (as the Decimal itself without a backend)."""
+    return leaf if backend is None else backend.parse(str(leaf))
+
+def _compile_operand(node, backend):
+    """Compile a subtree into a function returning its value."""
+    if isinstance(node, Decimal):
+        value = _number(node, backend)
+        return lambda: value
+    build = _compile_node(node, backend)
+    return lambda: build().execute()
+
+def _compile_node(node, backend):
+    """Compile a (command_class, left, right) tuple into a function building the Command."""
+    command_class, left, right = node
+    left_value, right_value = _compile_operand(left, backend), _compile_operand(right, backend)
+    return lambda: command_class(left_value(), right_value())
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(text: str, backend=None):
+    """
+    Compile an expression into a function that evaluates its operands.
+
+    The returned function builds the outermost Command with fully evaluated operands, so the
+    caller can execute it and store it in the history like any other command. For a plain
+    number the function returns the number itself.
+
+    :param text: The expression to compile.
+    :param backend: A NumericBackend: numbers are parsed into its type and inner commands run
+                    under its context (default: Decimals and the current decimal context).
+    :raises ValueError: If the expression is malformed.
+    """
+    node = parse_expression(text)
+    if isinstance(node, Decimal):
+        value = _number(node, backend)
+        return lambda: value
+    build = _compile_node(node, backend)
+    if backend is None:
+        return build
+
+    def evaluate():
+        with backend.context():
+            return build()
+    return evaluate
+
+def evaluate_expression(text: str, backend=None):
+    """Evaluate an expression, optionally with a NumericBackend (see compile_expression), and return its result."""
+    root = compile_expression(text, backend)()
+    if isinstance(root, Command):
+        return root.execute() if backend is None else backend.execute(root)
+    return root
@@ -0,0 +1,93 @@
+"""
+File formats for persisting the calculation history with Pandas.
+
+The format is chosen from the file extension:
+
+- ``.csv`` (default): two columns, ``operation`` holding text such as "4 add 4" and ``result``.
+- ``.parquet`` and ``.feather``: typed columnar files with separate ``op``, ``value1``,
+  ``value2`` and ``result`` columns. Numbers are stored as their exact Decimal text, and
+  readers can load only the columns they need. These formats require pyarrow.
+- ``.db``, ``.sqlite`` and ``.sqlite3``: SQLite databases with the same columns, read and
+  written by calculator.history_sqlite.
+
+All readers return string columns, so Decimal values round-trip exactly.
+"""
+
+from __future__ import annotations
+
+import os
+from calculator import history_sqlite
+from calculator.lazy import LazyModule
+
+pd = LazyModule('pandas')
+
+CSV_COLUMNS = ['operation', 'result']
+BINARY_COLUMNS = ['op', 'value1', 'value2', 'result']
+BINARY_FORMATS = {'.parquet': 'parquet', '.feather': 'feather'}
+
+def history_format(file_name: str) -> str:
+    """Return 'parquet', 'feather', 'sqlite' or 'csv' depending on the file extension."""
+    if history_sqlite.is_sqlite(file_name):
+        return 'sqlite'
+    return BINARY_FORMATS.get(os.path.splitext(file_name)[1].lower(), 'csv')
+
+def is_binary(file_name: str) -> bool:
+    """Return True if the file uses one of the typed columnar formats."""
+    return history_format(file_name) in BINARY_FORMATS.values()
+
+def to_rows(entries, binary: bool) -> list:
+    """
+    Convert history entries to tuples of strings in the CSV or the binary layout.
+
+    :param entries: HistoryEntry rows (or any objects with value1, value2, operation_name and result).
+    :param binary: Produce the op/value1/value2/result layout instead of operation/result.
+    """
+    if binary:
+        return [(entry.operation_name, str(entry.value1), str(entry.value2), str(entry.result)) for entry in entries]
+    return [(f"{entry.value1} {entry.operation_name} {entry.value2}", str(entry.result)) for entry in entries]
+
+def to_frame(entries, binary: bool) -> pd.DataFrame:
+    """Convert history entries to a DataFrame of strings in the CSV or the binary layout (see to_rows)."""
+    return rows_to_frame(to_rows(entries, binary), binary)
+
+def rows_to_frame(rows: list, binary: bool) -> pd.DataFrame:
+    """Convert tuples from to_rows to a DataFrame of strings."""
+    return pd.DataFrame(rows, columns=BINARY_COLUMNS if binary else CSV_COLUMNS, dtype=str)
+
+def read_frame(file_name: str, columns=None, chunksize=None):
+    """
+    Read a history file as string columns.
+
+    :param file_name: The file to read; the format is chosen from its extension.
+    :param columns: Only read these columns (column projection).
+    :param chunksize: For CSV and SQLite files, return an iterator of DataFrames of this many rows.
+    """
+    file_format = history_format(file_name)
+    if file_format == 'sqlite':
+        return history_sqlite.read_frame(file_name, columns=columns, chunksize=chunksize)
+    if file_format == 'parquet':
+        return pd.read_parquet(file_name, columns=columns)
+    if file_format == 'feather':
+        return pd.read_feather(file_name, columns=columns)
+    return pd.read_csv(file_name, usecols=columns, chunksize=chunksize, dtype=str, keep_default_na=False)
+
+def write_frame(frame: pd.DataFrame, file_name: str):
+    """Write a history DataFrame in the format chosen by the file extension."""
+    file_format = history_format(file_name)
+    if file_format == 'parquet':
+        frame.to_parquet(file_name, index=False)
+    elif file_format == 'feather':
+        frame.reset_index(drop=True).to_feather(file_name)
+    else:
+        frame.to_csv(file_name, index=False)
+
+def split_operations(frame: pd.DataFrame) -> tuple:
+    """
+    Return the (operation names, value1, value2, result) columns of a history DataFrame.
+
+    CSV operation strings are split column-wise; missing operands come back as NaN.
+    """
+    if 'op' in frame.columns:
+        return frame['op'], frame['value1'], frame['value2'], frame['result']
+    parts = frame['operation'].str.split(' ', n=2, expand=True).reindex(columns=[0, 1, 2])
+    return parts[1], parts[0], parts[2], frame['result']
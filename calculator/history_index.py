@@ -0,0 +1,139 @@
+"""
+Content-hash index of the rows in a history file, kept in a sidecar file.
+
+Each row of a history file is identified by a 64-bit BLAKE2b hash of its text fields, i.e.
+of its operation, operands and result. The hashes of the distinct rows in a file are stored
+next to it in "<file>.hashes". The sidecar also records the number of rows and the file's
+size and modification time when the index was last brought up to date. A process loads the
+sidecar once, and the index is rebuilt from the history file only if the file was changed
+without it.
+
+save_history uses the index to skip the rows a file already holds in O(new rows), instead of
+reading the whole file into a DataFrame and calling drop_duplicates on every save.
+flush_history appends without checking for duplicates, and the index counts the duplicate
+rows that leaves behind. Once they make up more than COMPACTION_THRESHOLD of the file,
+save_history compacts it.
+"""
+
+import os
+import struct
+import logging
+from array import array
+
+SIDECAR_SUFFIX = '.hashes'
+SIDECAR_MAGIC = b'CALCHIX1'
+# Magic, history file size, history file mtime_ns, rows in the history file, stored hashes
+SIDECAR_HEADER = struct.Struct('<8sqqQQ')
+
+# Fraction of duplicate rows above which save_history rewrites the file without them
+COMPACTION_THRESHOLD = 0.25
+
+def row_hashes(rows) -> list:
+    """Return the 64-bit content hash of each row, given as a tuple of text fields."""
+    from hashlib import blake2b  # pylint: disable=import-outside-toplevel
+    return [int.from_bytes(blake2b('\x1f'.join(row).encode(), digest_size=8).digest(), 'little') for row in rows]
+
+def file_stat(file_name: str) -> tuple:
+    """Return the (size, mtime_ns) of a file, or (-1, -1) if it does not exist."""
+    try:
+        stat = os.stat(file_name)
+    except FileNotFoundError:
+        return (-1, -1)
+    return (stat.st_size, stat.st_mtime_ns)
+
+class RowHashIndex:
+    """The distinct row hashes of one history file and its row count."""
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.sidecar_path = file_name + SIDECAR_SUFFIX
+        self.hashes = array('Q')  # Distinct row hashes, in the order they were first seen
+        self.known = set()
+        self.rows = 0  # Rows in the history file, duplicates included
+        self.synced_stat = None  # file_stat of the history file when the index was last saved
+        self.stored = 0  # Number of hashes already written to the sidecar
+
+    @property
+    def duplicates(self) -> int:
+        """The number of rows in the history file that repeat an earlier row."""
+        return self.rows - len(self.hashes)
+
+    def fragmentation(self) -> float:
+        """Return the fraction of rows in the history file that are duplicates."""
+        return self.duplicates / self.rows if self.rows else 0.0
+
+    def is_current(self) -> bool:
+        """Return True if the history file has not changed since the index was last saved."""
+        return self.synced_stat == file_stat(self.file_name)
+
+    def unseen(self, hashes: list) -> list:
+        """Return the positions of the hashes that are neither indexed nor repeated earlier in hashes."""
+        known = self.known
+        seen = set()
+        positions = []
+        for position, row_hash in enumerate(hashes):
+            if row_hash not in known and row_hash not in seen:
+                seen.add(row_hash)
+                positions.append(position)
+        return positions
+
+    def add(self, hashes: list):
+        """Record rows appended to the history file, duplicates included."""
+        known = self.known
+        for row_hash in hashes:
+            if row_hash not in known:
+                known.add(row_hash)
+                self.hashes.append(row_hash)
+        self.rows += len(hashes)
+
+    def rebuild(self, hashes: list):
+        """Replace the index with the hashes of every row of the history file."""
+        self.hashes = array('Q')
+        self.known = set()
+        self.rows = 0
+        self.stored = 0
+        self.add(hashes)
+
+    def load(self) -> bool:
+        """Load the sidecar; return False if it is missing, damaged or older than the history file."""
+        try:
+            with open(self.sidecar_path, 'rb') as sidecar:
+                header = sidecar.read(SIDECAR_HEADER.size)
+                magic, size, mtime_ns, rows, count = SIDECAR_HEADER.unpack(header)
+                hashes = array('Q')
+                hashes.frombytes(sidecar.read(count * hashes.itemsize))
+        except (OSError, struct.error, ValueError):
+            return False
+        if magic != SIDECAR_MAGIC or len(hashes) != count or (size, mtime_ns) != file_stat(self.file_name):
+            return False
+        self.hashes, self.known, self.rows, self.stored = hashes, set(hashes), rows, count
+        self.synced_stat = (size, mtime_ns)
+        return True
+
+    def save(self):
+        """
+        Bring the sidecar up to date with the index and the current state of the history file.
+
+        Hashes added since the last save are appended to the sidecar, and only its header is
+        rewritten; the whole sidecar is written only when there is none yet.
+        """
+        self.synced_stat = file_stat(self.file_name)
+        header = SIDECAR_HEADER.pack(SIDECAR_MAGIC, *self.synced_stat, self.rows, len(self.hashes))
+        try:
+            if self.stored and os.path.exists(self.sidecar_path):
+                with open(self.sidecar_path, 'r+b') as sidecar:
+                    sidecar.seek(SIDECAR_HEADER.size + self.stored * self.hashes.itemsize)
+                    sidecar.write(self.hashes[self.stored:].tobytes())
+                    sidecar.truncate()
+                    sidecar.seek(0)
+                    sidecar.write(header)
+            else:
+                temporary_path = f"{self.sidecar_path}.{os.getpid()}.tmp"
+                with open(temporary_path, 'wb') as sidecar:
+                    sidecar.write(header)
+                    sidecar.write(self.hashes.tobytes())
+                os.replace(temporary_path, self.sidecar_path)
+            self.stored = len(self.hashes)
+        except OSError as e:
+            # Without a sidecar the index is rebuilt from the history file next time
+            logging.warning("Cannot write history index %s: %s", self.sidecar_path, e)
@@ -0,0 +1,170 @@
+"""
+Embedded SQLite storage for the calculation history.
+
+History files ending in .db, .sqlite or .sqlite3 are SQLite databases with a normalized schema:
+
+    operations(id, name)
+    calculations(id, operation_id, value1, value2, result, created_at, session_id)
+
+Numbers are stored as their exact text, as in the other formats, so Decimals and Fractions
+round-trip exactly. calculations is indexed on operation_id and created_at, so queries by
+operation or time range read only the matching rows.
+
+Databases are opened in WAL mode: readers in other threads or processes do not block a
+writer, and a writer does not block them. Each write appends its rows in a single
+transaction, so flushing new calculations never rewrites the file.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from calculator.lazy import LazyModule
+
+pd = LazyModule('pandas')
+sqlite3 = LazyModule('sqlite3')
+
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+# Identifies the rows written by this process unless the caller gives a session id
+SESSION_ID = f"{os.getpid()}-{time.time_ns()}"
+
+# Seconds a writer waits for another writer's transaction before giving up
+BUSY_TIMEOUT = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS calculations (
+    id INTEGER PRIMARY KEY,
+    operation_id INTEGER NOT NULL REFERENCES operations(id),
+    value1 TEXT NOT NULL,
+    value2 TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    session_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calculations_operation ON calculations(operation_id);
+CREATE INDEX IF NOT EXISTS calculations_created_at ON calculations(created_at);
+"""
+
+# Query expressions of the columns returned by read_frame, in the layout of the binary formats
+COLUMN_EXPRESSIONS = {
+    'op': 'operations.name',
+    'value1': 'calculations.value1',
+    'value2': 'calculations.value2',
+    'result': 'calculations.result',
+}
+
+def is_sqlite(file_name: str) -> bool:
+    """Return True if the file name has one of the SQLite extensions."""
+    return os.path.splitext(file_name)[1].lower() in SQLITE_EXTENSIONS
+
+def connect(file_name: str):
+    """Open a history database in WAL mode, creating its tables and indexes if needed."""
+    connection = sqlite3.connect(file_name, timeout=BUSY_TIMEOUT)
+    try:
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')  # WAL stays consistent; only a power loss can drop the last commits
+        connection.executescript(SCHEMA)
+    except sqlite3.Error:
+        connection.close()
+        raise
+    return connection
+
+def write_rows(file_name: str, rows, timestamps=None, session_id: str = SESSION_ID) -> int:
+    """
+    Append history rows to a database in one transaction.
+
+    :param rows: (operation name, value1, value2, result) tuples; the numbers are stored as text.
+    :param timestamps: The time.time() each row was added (default: now).
+    :param session_id: The session the rows belong to.
+    :return: The number of rows written.
+    """
+    rows = list(rows)
+    if timestamps is None:
+        timestamps = [time.time()] * len(rows)
+    connection = connect(file_name)
+    try:
+        with connection:  # Commits the whole batch at once, or rolls it back on error
+            connection.executemany(
+                'INSERT OR IGNORE INTO operations(name) VALUES (?)', ((name,) for name in {row[0] for row in rows})
+            )
+            operation_ids = dict(connection.execute('SELECT name, id FROM operations'))
+            connection.executemany(
+                'INSERT INTO calculations(operation_id, value1, value2, result, created_at, session_id) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                ((operation_ids[name], str(value1), str(value2), str(result), timestamp, session_id)
+                 for (name, value1, value2, result), timestamp in zip(rows, timestamps))
+            )
+    finally:
+        connection.close()
+    return len(rows)
+
+def query(columns=None, operation: str = None, start: float = None, end: float = None,
+          session_id: str = None) -> tuple:
+    """
+    Build the (sql, parameters) selecting history rows in insertion order.
+
+    The operation and time-range filters are served by the operation_id and created_at indexes.
+
+    :raises ValueError: For a column other than op, value1, value2 and result.
+    """
+    columns = list(columns or COLUMN_EXPRESSIONS)
+    unknown = set(columns) - set(COLUMN_EXPRESSIONS)
+    if unknown:
+        raise ValueError(f"Unknown history columns: {', '.join(sorted(unknown))}")
+    conditions, parameters = [], []
+    for condition, value in (('operations.name = ?', operation), ('calculations.created_at >= ?', start),
+                             ('calculations.created_at < ?', end), ('calculations.session_id = ?', session_id)):
+        if value is not None:
+            conditions.append(condition)
+            parameters.append(value)
+    selected = ', '.join(f"{COLUMN_EXPRESSIONS[column]} AS {column}" for column in columns)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    sql = (f"SELECT {selected} FROM calculations JOIN operations ON operations.id = calculations.operation_id"
+           f"{where} ORDER BY calculations.id")
+    return sql, parameters
+
+def read_frame(file_name: str, columns=None, chunksize: int = None, **filters):
+    """
+    Read history rows as a DataFrame of strings, like history_formats.read_frame.
+
+    :param columns: Only read these of the op, value1, value2 and result columns.
+    :param chunksize: Return an iterator of DataFrames of this many rows instead.
+    :param filters: operation, start, end and session_id filters (see query).
+    """
+    sql, parameters = query(columns, **filters)
+    connection = connect(file_name)
+    if chunksize is None:
+        try:
+            return pd.read_sql_query(sql, connection, params=parameters, dtype=str)
+        finally:
+            connection.close()
+    return _read_chunks(connection, sql, parameters, chunksize)
+
+def _read_chunks(connection, sql: str, parameters: list, chunksize: int):
+    """Yield DataFrames of chunksize rows and close the connection once they are exhausted."""
+    try:
+        yield from pd.read_sql_query(sql, connection, params=parameters, chunksize=chunksize, dtype=str)
+    finally:
+        connection.close()
+
+def compact(file_name: str) -> int:
+    """
+    Delete rows that repeat an earlier row's operation, operands and result.
+
+    :return: The number of rows deleted.
+    """
+    connection = connect(file_name)
+    try:
+        with connection:
+            deleted = connection.execute(
+                'DELETE FROM calculations WHERE id NOT IN '
+                '(SELECT MIN(id) FROM calculations GROUP BY operation_id, value1, value2, result)'
+            ).rowcount
+    finally:
+        connection.close()
+    return deleted
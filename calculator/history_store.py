@@ -0,0 +1,617 @@
+"""
+Columnar in-memory storage for the calculation history.
+
+Instead of keeping one Calculation or Command object per entry, the store keeps parallel
+columns: a compact array of operation codes, the two operand columns and a result column
+that is filled in the first time a result is needed. Operation codes index a small table
+of operation kinds, so the function or command class of an entry is stored only once.
+
+Entries are handed out as lightweight HistoryEntry row views, and whole ranges of the
+history as read-only HistoryView sequences; neither copies the columns. Operands and results
+may also be stored as text (see Calculations.load_history(lazy=True)); they are converted to
+numbers with numeric.parse_stored_row the first time their row is accessed.
+
+Alongside the columns, the store maintains secondary indexes used by the history queries:
+the rows of each operation code, an insertion-time column searched with bisect, and a
+result index sorted by value that is brought up to date when a result-range query runs.
+
+A store can be given a window (see set_window), which bounds the rows it keeps in memory.
+Once the window is full, the oldest rows are spilled in fixed-size runs to append-only
+segment files. Indexing, iteration, views and queries page segments back in transparently,
+and at most PAGED_SEGMENTS of them are kept in memory at a time. Segment files are deleted
+once neither the store nor a view refers to them.
+
+A store may be appended to and queried from several threads: its lock guards every change
+and query. Views only read rows that existed when they were created, so iterating over a
+view does not hold the lock.
+"""
+
+import os
+import time
+import pickle
+import shutil
+import weakref
+import tempfile
+import itertools
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Sequence
+from operator import itemgetter
+from calculator.calculation import Calculation
+from calculator.memo import cached_result
+from calculator.numeric import parse_stored_row
+
+# Spilled segments each store keeps paged in, least recently used first out
+PAGED_SEGMENTS = 2
+
+def kind_of(calculation) -> tuple:
+    """
+    Return the (operation_name, factory, operation) kind of a Calculation or Command.
+
+    For a Calculation the factory is Calculation and the operation is its function; for a
+    Command the factory is the command class and the operation is its division strategy,
+    or None when the command uses its default behaviour.
+    """
+    if hasattr(calculation, 'execute'):
+        command_class = type(calculation)
+        strategy = getattr(calculation, 'strategy', None)
+        if strategy is getattr(command_class, 'default_division', None):
+            strategy = None
+        return command_kind(command_class, strategy)
+    return (calculation.operation.__name__, Calculation, calculation.operation)
+
+def command_kind(command_class, strategy=None) -> tuple:
+    """Return the kind of the commands created from command_class with the given strategy."""
+    return (command_class.__name__.replace('Command', '').lower(), command_class, strategy)
+
+def describe(calculation) -> tuple:
+    """Return the (operation_name, result) of a history entry, Calculation or Command."""
+    if isinstance(calculation, HistoryEntry):
+        return calculation.operation_name, calculation.result
+    return kind_of(calculation)[0], calculation.result
+
+class _Columns:
+    """The column data and indexes of a history store; replaced as a whole when the store is cleared."""
+    __slots__ = ('kinds', 'codes', 'values1', 'values2', 'results',
+                 'timestamps', 'rows_by_code', 'result_index', 'results_indexed')
+
+    def __init__(self, kinds: list):
+        self.kinds = kinds
+        self.codes = array('H')
+        self.values1 = []
+        self.values2 = []
+        self.results = []
+        self.timestamps = array('d')  # Insertion time of each row, in non-decreasing order
+        self.rows_by_code = {}  # Operation code -> rows with that code, in insertion order
+        self.result_index = []  # (result, row) pairs sorted by result
+        self.results_indexed = 0  # Rows before this one are in result_index
+
+    def index_rows(self, start: int):
+        """Add the rows from start onwards to the operation and insertion-time indexes."""
+        now = time.time()
+        if self.timestamps:
+            now = max(now, self.timestamps[-1])
+        self.timestamps.extend([now] * (len(self.codes) - start))
+        self.index_codes(start)
+
+    def index_codes(self, start: int):
+        """Add the rows from start onwards to the operation index."""
+        rows_by_code = self.rows_by_code
+        for row in range(start, len(self.codes)):
+            code = self.codes[row]
+            rows = rows_by_code.get(code)
+            if rows is None:
+                rows = rows_by_code[code] = []
+            rows.append(row)
+
+    def subset(self, start: int, stop: int, skip: int = None):
+        """Return new columns holding the rows from start to stop, leaving out the row skip."""
+        columns = _Columns(self.kinds)
+        skipped = (skip, skip + 1) if skip is not None else (stop, stop)
+        for name in ('codes', 'values1', 'values2', 'results', 'timestamps'):
+            column = getattr(self, name)
+            getattr(columns, name).extend(column[start:skipped[0]] + column[skipped[1]:stop])
+        columns.index_codes(0)
+        return columns
+
+    def rows_with_codes(self, codes) -> list:
+        """Return the rows having any of the given operation codes, in insertion order."""
+        code_rows = [self.rows_by_code[code] for code in codes if code in self.rows_by_code]
+        if len(code_rows) == 1:
+            return list(code_rows[0])
+        return sorted(row for rows in code_rows for row in rows)
+
+    def rows_in_result_range(self, low, high) -> list:
+        """Return (result, row) pairs with low <= result <= high, ordered by result."""
+        self.index_results()
+        result_index = self.result_index
+        start = bisect_left(result_index, low, key=itemgetter(0))
+        stop = bisect_right(result_index, high, key=itemgetter(0))
+        return result_index[start:stop]
+
+    def entry(self, row: int):
+        """Return a HistoryEntry for a row."""
+        return HistoryEntry(self, row)
+
+    def computed_results(self) -> list:
+        """Return the results column after computing the results not known yet; rows whose calculation fails hold None."""
+        results = self.results
+        if None in results:
+            for row, result in enumerate(results):
+                if result is None:
+                    try:
+                        self.result(row)
+                    except (ArithmeticError, ValueError):
+                        pass
+        return results
+
+    def index_results(self):
+        """Add the rows appended since the last call to the sorted result index."""
+        new_pairs = []
+        for row in range(self.results_indexed, len(self.codes)):
+            try:
+                result = self.result(row)
+            except (ArithmeticError, ValueError):
+                continue  # Rows without a result, such as divisions by zero, are not indexed
+            if result == result:  # pylint: disable=comparison-with-itself
+                new_pairs.append((result, row))
+        self.results_indexed = len(self.codes)
+        if new_pairs:
+            new_pairs.sort(key=itemgetter(0))
+            # Both runs are sorted, so this sort merges them in linear time
+            self.result_index.extend(new_pairs)
+            self.result_index.sort(key=itemgetter(0))
+
+    def decoded(self, column: list, index: int):
+        """Return column[index], converting the lazily loaded text values of its row to numbers in place."""
+        value = column[index]
+        if isinstance(value, str):
+            # The whole row is parsed at once, so that its numbers are all Fractions or none are
+            text_columns = [cells for cells in (self.values1, self.values2, self.results)
+                            if isinstance(cells[index], str)]
+            for cells, number in zip(text_columns, parse_stored_row(*(cells[index] for cells in text_columns))):
+                cells[index] = number
+            value = column[index]
+        return value
+
+    def materialize(self, index: int):
+        """Rebuild the Calculation or Command object stored at index."""
+        _, factory, operation = self.kinds[self.codes[index]]
+        value1, value2 = self.decoded(self.values1, index), self.decoded(self.values2, index)
+        if factory is Calculation:
+            return Calculation(value1, value2, operation)
+        if operation is not None:
+            return factory(value1, value2, strategy=operation)
+        return factory(value1, value2)
+
+    def result(self, index: int):
+        """Return the result at index, computing and caching it on first access."""
+        result = self.decoded(self.results, index)
+        if result is None:
+            calculation = self.materialize(index)
+            result = calculation.execute() if hasattr(calculation, 'execute') else calculation.perform()
+            self.results[index] = result
+        return result
+
+class HistoryEntry:
+    """A read-only view of one row of a HistoryStore."""
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, columns: _Columns, index: int):
+        self._columns = columns
+        self._index = index
+
+    @property
+    def value1(self):
+        """The first operand."""
+        return self._columns.decoded(self._columns.values1, self._index)
+
+    @property
+    def value2(self):
+        """The second operand."""
+        return self._columns.decoded(self._columns.values2, self._index)
+
+    @property
+    def kind(self) -> tuple:
+        """The (operation_name, factory, operation) kind of the entry."""
+        return self._columns.kinds[self._columns.codes[self._index]]
+
+    @property
+    def operation_name(self) -> str:
+        """The operation name, e.g. 'add'."""
+        return self.kind[0]
+
+    @property
+    def result(self):
+        """The result of the calculation, computed at most once."""
+        return self._columns.result(self._index)
+
+    def materialize(self):
+        """Return a new Calculation or Command object equivalent to this entry."""
+        return self._columns.materialize(self._index)
+
+    def __eq__(self, other):
+        if isinstance(other, HistoryEntry):
+            return (self.operation_name, self.value1, self.value2) == (other.operation_name, other.value1, other.value2)
+        if hasattr(other, 'value1') and hasattr(other, 'value2'):
+            return (self.operation_name, self.value1, self.value2) == (kind_of(other)[0], other.value1, other.value2)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.operation_name, self.value1, self.value2))
+
+    def __repr__(self):
+        return f"HistoryEntry({self.value1} {self.operation_name} {self.value2})"
+
+def _remove_file(path: str):
+    """Delete a segment file that is no longer referred to."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class _Segment:
+    """An append-only file holding a run of spilled rows, with enough metadata to skip it in queries."""
+    __slots__ = ('path', 'rows', 'codes', 'first_time', 'last_time', '__weakref__')
+
+    def __init__(self, path: str, columns: _Columns):
+        """Write the rows of columns to path; the file is deleted when the segment is garbage collected."""
+        with open(path, 'wb') as segment_file:
+            pickle.dump((columns.codes.tobytes(), columns.values1, columns.values2, columns.results,
+                         columns.timestamps.tobytes()), segment_file, pickle.HIGHEST_PROTOCOL)
+        weakref.finalize(self, _remove_file, path)
+        self.path = path
+        self.rows = len(columns.codes)
+        self.codes = frozenset(columns.codes)
+        self.first_time = columns.timestamps[0]
+        self.last_time = columns.timestamps[-1]
+
+    def load(self, kinds: list) -> _Columns:
+        """Read the segment back into columns sharing the store's kinds table."""
+        with open(self.path, 'rb') as segment_file:
+            codes, values1, values2, results, timestamps = pickle.load(segment_file)
+        columns = _Columns(kinds)
+        columns.codes.frombytes(codes)
+        columns.timestamps.frombytes(timestamps)
+        columns.values1, columns.values2, columns.results = values1, values2, results
+        columns.index_codes(0)
+        return columns
+
+class _SegmentFolder:
+    """A store's private folder of segment files, created on first use and removed with its owner."""
+    __slots__ = ('parent', 'path', 'numbers')
+
+    def __init__(self, parent: str = None):
+        self.parent = parent  # The folder the private folder is created in (default: the system temporary folder)
+        self.path = None
+        self.numbers = itertools.count()
+
+    def new_file(self, owner) -> str:
+        """Return the path of a new segment file."""
+        if self.path is None:
+            if self.parent:
+                os.makedirs(self.parent, exist_ok=True)
+            self.path = tempfile.mkdtemp(prefix='calculator-history-', dir=self.parent)
+            weakref.finalize(owner, shutil.rmtree, self.path, True)
+        return os.path.join(self.path, f"segment-{next(self.numbers)}.pickle")
+
+class _PagedRows:
+    """
+    A snapshot of the rows of a store that has spilled segments: the segments, then the in-memory columns.
+
+    Segments are paged in through the store's LRU cache, so a snapshot holds no segment data itself.
+    """
+    __slots__ = ('segments', 'starts', 'spilled', 'columns', 'page')
+
+    def __init__(self, segments: tuple, starts: tuple, columns: _Columns, page):
+        self.segments = segments
+        self.starts = starts  # Row number of the first row of each segment
+        self.spilled = starts[-1] + segments[-1].rows if segments else 0
+        self.columns = columns
+        self.page = page  # Function returning the columns of a segment
+
+    def locate(self, row: int) -> tuple:
+        """Return the (columns, row within them) holding a row of the snapshot."""
+        if row >= self.spilled:
+            return self.columns, row - self.spilled
+        position = bisect_right(self.starts, row) - 1
+        return self.page(self.segments[position]), row - self.starts[position]
+
+    def entry(self, row: int):
+        """Return a HistoryEntry for a row, paging its segment in if needed."""
+        columns, index = self.locate(row)
+        return HistoryEntry(columns, index)
+
+class HistoryView(Sequence):
+    """
+    A read-only sequence over a range of history entries that shares the store's columns.
+
+    Spilled rows are read through a _PagedRows snapshot of the store instead of its columns.
+    """
+    __slots__ = ('_columns', '_start', '_stop')
+
+    def __init__(self, columns, start: int, stop: int):
+        self._columns = columns
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[position] for position in range(start, stop, step)]
+            return HistoryView(self._columns, self._start + start, self._start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self._columns.entry(self._start + index)
+
+    def __iter__(self):
+        entry = self._columns.entry
+        for index in range(self._start, self._stop):
+            yield entry(index)
+
+    def __repr__(self):
+        return f"HistoryView({list(self)!r})"
+
+class HistoryStore:  # pylint: disable=too-many-instance-attributes
+    """Columnar storage for a history of calculations, optionally bounded by an in-memory window."""
+
+    def __init__(self, window: int = None, spill_dir: str = None):
+        """
+        :param window: The number of most recent rows kept in memory (default: unbounded).
+        :param spill_dir: The folder in which segment files are kept (default: the system temporary folder).
+        """
+        self._kinds = []
+        self._kind_codes = {}
+        self._columns = _Columns(self._kinds)
+        self._segments = ()  # Spilled segments, oldest first
+        self._starts = ()  # Row number of the first row of each segment
+        self._spilled = 0  # Number of rows in segments
+        self._paged = OrderedDict()  # Segment -> its columns, least recently used first
+        self._folder = _SegmentFolder()
+        self._lock = threading.RLock()  # Guards the columns, segments and indexes
+        self.generation = 0  # Incremented by clear, so that row counts taken before it can be told apart
+        self.window = None
+        self.set_window(window, spill_dir)
+
+    @property
+    def segment_rows(self) -> int:
+        """The number of rows spilled to each segment file: a quarter of the window, or 0 without one."""
+        return max(1, self.window // 4) if self.window else 0
+
+    def set_window(self, window: int = None, spill_dir: str = None):
+        """
+        Bound the number of rows kept in memory, spilling the oldest rows to segment files.
+
+        Rows are spilled in segments of a quarter of the window, so at most window * 1.25
+        rows, plus PAGED_SEGMENTS paged-in segments, are in memory at a time.
+
+        :param window: The number of most recent rows kept in memory, or None for no bound.
+        :param spill_dir: The folder in which segment files are kept (default: the system temporary
+                          folder). Each store writes to its own subfolder, removed with the store.
+        :raises ValueError: If window is less than 1.
+        """
+        if window is not None and window < 1:
+            raise ValueError(f"History window must be at least 1, not {window}")
+        with self._lock:
+            self.window = window
+            if spill_dir and spill_dir != self._folder.parent:
+                self._folder = _SegmentFolder(spill_dir)
+            if window:
+                self._spill()
+
+    def _spill(self):
+        """Move the rows beyond the window, in whole segments, from memory to segment files."""
+        columns = self._columns
+        excess = len(columns.codes) - self.window
+        if excess < self.segment_rows:
+            return
+        spilled = excess - excess % self.segment_rows
+        segments, starts = list(self._segments), list(self._starts)
+        for start in range(0, spilled, self.segment_rows):
+            segments.append(_Segment(self._folder.new_file(self), columns.subset(start, start + self.segment_rows)))
+            starts.append(self._spilled + start)
+        self._segments, self._starts = tuple(segments), tuple(starts)
+        self._spilled += spilled
+        self._columns = columns.subset(spilled, len(columns.codes))
+
+    def _page(self, segment: _Segment) -> _Columns:
+        """Return the columns of a segment, reading it back in if it is not paged in."""
+        with self._lock:
+            columns = self._paged.get(segment)
+            if columns is None:
+                columns = self._paged[segment] = segment.load(self._kinds)
+                if len(self._paged) > PAGED_SEGMENTS:
+                    self._paged.popitem(last=False)
+            else:
+                self._paged.move_to_end(segment)
+            return columns
+
+    def _rows(self):
+        """Return the rows of the store: its columns, or a _PagedRows snapshot once it has spilled."""
+        if not self._segments:
+            return self._columns
+        return _PagedRows(self._segments, self._starts, self._columns, self._page)
+
+    def _parts(self, keep=None):
+        """Yield (first row, columns) for the segments for which keep(segment) is true, then the in-memory rows."""
+        for segment, start in zip(self._segments, self._starts):
+            if keep is None or keep(segment):
+                yield start, self._page(segment)
+        yield self._spilled, self._columns
+
+    def code_for(self, kind: tuple) -> int:
+        """Return the operation code of a kind, registering it on first use."""
+        code = self._kind_codes.get(kind)
+        if code is None:
+            with self._lock:
+                code = self._kind_codes.get(kind)
+                if code is None:
+                    code = len(self._kinds)
+                    self._kinds.append(kind)
+                    self._kind_codes[kind] = code
+        return code
+
+    def append(self, calculation):
+        """Append a Calculation or Command; its result is computed lazily unless it is already cached on it."""
+        self.append_row(kind_of(calculation), calculation.value1, calculation.value2, cached_result(calculation))
+
+    def append_row(self, kind: tuple, value1, value2, result=None):
+        """Append a row given its kind, operands and (optionally) its known result."""
+        self.extend_rows([self.code_for(kind)], [value1], [value2], [result])
+
+    def extend_rows(self, codes: list, values1: list, values2: list, results: list):
+        """
+        Append many rows at once given their operation codes (see code_for), operands and results.
+
+        With a window, the rows are added a segment at a time, so memory stays bounded
+        however many rows are added.
+        """
+        with self._lock:
+            step = self.segment_rows or len(codes) or 1
+            for offset in range(0, len(codes), step):
+                columns = self._columns
+                start = len(columns.codes)
+                columns.codes.extend(codes[offset:offset + step])
+                columns.values1.extend(values1[offset:offset + step])
+                columns.values2.extend(values2[offset:offset + step])
+                columns.results.extend(results[offset:offset + step])
+                columns.index_rows(start)
+                if self.window:
+                    self._spill()
+
+    def delete(self, index: int):
+        """
+        Delete the row at index and rebuild the indexes.
+
+        The remaining rows are copied into new columns, or a new segment file, so existing
+        views are not affected.
+        """
+        with self._lock:
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError("history index out of range")
+            if index >= self._spilled:
+                old = self._columns
+                self._columns = old.subset(0, len(old.codes), skip=index - self._spilled)
+                return
+            position = bisect_right(self._starts, index) - 1
+            segment = self._segments[position]
+            remaining = self._page(segment).subset(0, segment.rows, skip=index - self._starts[position])
+            replacement = (_Segment(self._folder.new_file(self), remaining),) if remaining.codes else ()
+            segments = self._segments[:position] + replacement + self._segments[position + 1:]
+            self._segments = segments
+            self._starts = tuple(itertools.accumulate((segment.rows for segment in segments), initial=0))[:-1]
+            self._spilled -= 1
+            self._paged.pop(segment, None)
+
+    def rows_for_operation(self, operation_name: str) -> list:
+        """Return the rows of an operation, in insertion order, using the operation index."""
+        with self._lock:
+            codes = [code for code, kind in enumerate(self._kinds) if kind[0] == operation_name]
+            if not self._segments:
+                return self._columns.rows_with_codes(codes)
+            rows = []
+            for start, columns in self._parts(lambda segment: not segment.codes.isdisjoint(codes)):
+                rows.extend(start + row for row in columns.rows_with_codes(codes))
+            return rows
+
+    def rows_in_result_range(self, low, high) -> list:
+        """Return the rows with low <= result <= high, ordered by result."""
+        with self._lock:
+            if not self._segments:
+                return [row for _, row in self._columns.rows_in_result_range(low, high)]
+            pairs = []
+            for start, columns in self._parts():
+                pairs.extend((result, start + row) for result, row in columns.rows_in_result_range(low, high))
+            pairs.sort(key=itemgetter(0))
+            return [row for _, row in pairs]
+
+    def rows_in_time_range(self, start: float, end: float) -> list:
+        """Return the rows added at or after start and before end (time.time() values)."""
+        with self._lock:
+            rows = []
+            for first, columns in self._parts(lambda segment: segment.last_time >= start and segment.first_time < end):
+                timestamps = columns.timestamps
+                rows.extend(range(first + bisect_left(timestamps, start), first + bisect_left(timestamps, end)))
+            return rows
+
+    def timestamp(self, index: int) -> float:
+        """Return the time at which the row at index was added."""
+        with self._lock:
+            if index < 0:
+                index += len(self)
+            if index >= self._spilled:
+                return self._columns.timestamps[index - self._spilled]
+            columns, row = self._rows().locate(index)
+            return columns.timestamps[row]
+
+    def result_columns(self, compute: bool = False):
+        """
+        Yield (operation codes, results) column pairs covering every row, oldest first.
+
+        The columns come straight from the store, and from each spilled segment in turn, without
+        creating HistoryEntry objects. Codes index operation_names. Results loaded lazily are
+        still text, and results not known yet are None.
+
+        :param compute: Compute the results not known yet first; rows whose calculation fails
+                        (e.g. a division by zero) still hold None.
+        """
+        with self._lock:
+            segments, columns, count = self._segments, self._columns, len(self._columns.codes)
+        for segment in segments:
+            part = self._page(segment)
+            yield part.codes, part.computed_results() if compute else part.results
+        with self._lock:
+            # Rows added since the iteration started are left out
+            codes = columns.codes[:count]
+            results = (columns.computed_results() if compute else columns.results)[:count]
+        yield codes, results
+
+    @property
+    def operation_names(self) -> list:
+        """The operation name of each operation code."""
+        return [kind[0] for kind in self._kinds]
+
+    def entries(self, rows) -> list:
+        """Return HistoryEntry views for the given rows."""
+        with self._lock:
+            entry = self._rows().entry
+            return [entry(row) for row in rows]
+
+    def clear(self):
+        """Remove all rows; existing views keep seeing the rows they were created over."""
+        with self._lock:
+            self._columns = _Columns(self._kinds)
+            self._segments = ()
+            self._starts = ()
+            self._spilled = 0
+            self._paged.clear()
+            self.generation += 1
+
+    def view(self) -> HistoryView:
+        """Return a read-only view of all rows currently in the store."""
+        with self._lock:
+            return HistoryView(self._rows(), 0, len(self))
+
+    @property
+    def spilled(self) -> int:
+        """The number of rows held in segment files rather than in memory."""
+        return self._spilled
+
+    def __len__(self):
+        return self._spilled + len(self._columns.codes)
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def __iter__(self):
+        return iter(self.view())
@@ -0,0 +1,36 @@
+"""
+Deferred imports for heavy optional dependencies.
+
+pandas and numpy take hundreds of milliseconds to import, but most sessions never persist
+or analyse the history. Modules that need them bind a LazyModule instead of importing them:
+
+    pd = LazyModule('pandas')
+
+The real module is imported the first time an attribute is read (pd.read_csv), so the cost
+is paid only by the features that use it.
+"""
+
+import importlib
+
+class LazyModule:
+    """A stand-in for a module that imports it on first attribute access."""
+
+    __slots__ = ('_name', '_module')
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    @property
+    def loaded(self) -> bool:
+        """Return True once the real module has been imported."""
+        return self._module is not None
+
+    def __getattr__(self, attribute):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{' (loaded)' if self.loaded else ''}>"
@@ -0,0 +1,150 @@
+"""
+This module provides result caching for arithmetic operations at two levels.
+
+Every Command and Calculation computes its result once and keeps it on the instance (see
+computed_once), so displaying, logging, saving or re-executing the same object never
+recomputes it. Its operands are frozen once the result is cached, so the cached result
+cannot go stale.
+
+Across instances there is an opt-in, bounded LRU cache keyed on the operation, the division
+strategy function and both operands. A single cache instance, result_cache, is shared by every Command
+and Calculation, and therefore by every session's Calculator and Calculations history
+alike. The cache is disabled by default; enable it with result_cache.configure(maxsize).
+"""
+
+import decimal
+import logging
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+class ResultCache:
+    """A bounded LRU mapping from (operation, strategy, value1, value2) to a result."""
+
+    def __init__(self, maxsize: int = 0):
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Return True when results are being memoized."""
+        return self.maxsize > 0
+
+    def configure(self, maxsize: int):
+        """
+        Set the maximum number of cached results; 0 disables memoization.
+
+        :param maxsize: The new cache size.
+        """
+        with self._lock:
+            self.maxsize = max(0, int(maxsize))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        logging.info("Result cache configured with maxsize %d.", self.maxsize)
+
+    def clear(self):
+        """Remove all cached results and reset the hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @staticmethod
+    def make_key(operation, strategy, value1, value2) -> tuple:
+        """
+        Build a cache key.
+
+        The operation (a name or function) and the strategy are keyed on the objects
+        themselves, not their names, so two lambdas never share a result. Operands are keyed
+        on their type and string form as well as their value, so equal Decimals with a
+        different exponent (2 and 2.0) do not share a result, and neither do equal floats,
+        Decimals and Fractions. Decimal results also depend on the precision and rounding of
+        the current decimal context, so those are part of the key too.
+        """
+        context = decimal.getcontext()
+        return (operation, strategy, type(value1), str(value1), type(value2), str(value2),
+                context.prec, context.rounding)
+
+    def get(self, key):
+        """Return (True, result) for a cached key and mark it as recently used, otherwise (False, None)."""
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, self._entries[key]
+
+    def put(self, key, result):
+        """Store a result, evicting the least recently used one if the cache is full."""
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Return the cache size and hit/miss counters."""
+        return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+    def __len__(self):
+        return len(self._entries)
+
+# The process-wide cache shared by the Calculator and Calculations
+result_cache = ResultCache()
+
+def memoized(operation_name_of):
+    """
+    Decorate an execute/perform method so its result is looked up in result_cache first.
+
+    :param operation_name_of: A function returning the operation name, or function, of the instance.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self):
+            if not result_cache.enabled:
+                return method(self)
+            key = result_cache.make_key(
+                operation_name_of(self), getattr(self, 'strategy', None), self.value1, self.value2
+            )
+            try:
+                found, result = result_cache.get(key)
+            except TypeError:
+                return method(self)  # An unhashable strategy or operation cannot be cached
+            if found:
+                return result
+            result = method(self)
+            result_cache.put(key, result)
+            return result
+        return wrapper
+    return decorator
+
+# Attributes that determine a result and so cannot change once it is cached
+RESULT_INPUTS = frozenset(('value1', 'value2', 'strategy', 'operation'))
+
+def computed_once(method):
+    """Decorate an execute/perform method so each instance computes its result once and caches it."""
+    @wraps(method)
+    def wrapper(self):
+        try:
+            return self.__dict__['_result']
+        except KeyError:
+            result = self.__dict__['_result'] = method(self)
+            return result
+    return wrapper
+
+def cached_result(calculation):
+    """Return the result cached on a Command or Calculation, or None if it has not been computed yet."""
+    return getattr(calculation, '__dict__', {}).get('_result')
+
+class CachedResult:
+    """Mixin that freezes the inputs of a Command or Calculation once its result is cached."""
+
+    def __setattr__(self, name, value):
+        if name in RESULT_INPUTS and '_result' in self.__dict__:
+            raise AttributeError(f"Cannot change {name} after the result has been computed")
+        super().__setattr__(name, value)
@@ -0,0 +1,193 @@
+"""
+This module provides opt-in latency histograms, call counts and error counts for the hot paths.
+
+When metrics are enabled, the instrumented methods (every core command's execute, the history
+appends and the history persistence methods) are replaced by timing wrappers. Disabling them
+puts the original methods back, so disabled metrics cost nothing on the hot path, not even a
+flag check. A single Metrics instance, metrics, is shared process-wide.
+
+Latencies go into HDR-style histograms. Each bucket keeps the top SIGNIFICANT_BITS bits of a
+nanosecond latency, which bounds the relative error of any reported percentile to about 3%
+whatever the magnitude, with a few dozen buckets per operation.
+"""
+
+import json
+import logging
+from decimal import InvalidOperation
+from functools import wraps
+from threading import Lock
+from time import perf_counter_ns
+
+SIGNIFICANT_BITS = 5
+PERCENTILES = (50, 90, 99, 99.9)
+
+def bucket_of(nanoseconds: int) -> int:
+    """Return the lower bound of the histogram bucket holding a latency in nanoseconds."""
+    shift = max(nanoseconds.bit_length() - SIGNIFICANT_BITS, 0)
+    return (nanoseconds >> shift) << shift
+
+def error_kind(error: Exception) -> str:
+    """Classify an error for the error counters."""
+    if isinstance(error, InvalidOperation):
+        return 'invalid_input'
+    if isinstance(error, (ZeroDivisionError, ValueError)) and 'divide by zero' in str(error).lower():
+        return 'divide_by_zero'
+    return type(error).__name__
+
+class LatencyHistogram:
+    """Call and error counts and a log-linear latency histogram for one operation."""
+
+    __slots__ = ('count', 'total', 'minimum', 'maximum', 'buckets', 'errors')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = 0
+        self.buckets = {}
+        self.errors = {}
+
+    def record(self, nanoseconds: int):
+        """Add one latency in nanoseconds."""
+        self.count += 1
+        self.total += nanoseconds
+        if self.minimum is None or nanoseconds < self.minimum:
+            self.minimum = nanoseconds
+        self.maximum = max(self.maximum, nanoseconds)
+        bucket = bucket_of(nanoseconds)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, percent: float) -> int:
+        """Return the lower bound of the bucket holding the given percentile, in nanoseconds."""
+        rank = percent / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return bucket
+        return self.maximum
+
+    def summary(self) -> dict:
+        """Return the counts, latency statistics in seconds and the raw buckets."""
+        summary = {'count': self.count, 'errors': dict(self.errors), 'total_seconds': self.total / 1e9}
+        if self.count:
+            summary.update({
+                'min_seconds': self.minimum / 1e9, 'max_seconds': self.maximum / 1e9,
+                'mean_seconds': self.total / self.count / 1e9,
+            })
+            summary.update({f"p{percent:g}_seconds": self.percentile(percent) / 1e9 for percent in PERCENTILES})
+        summary['buckets_ns'] = {str(bucket): count for bucket, count in sorted(self.buckets.items())}
+        return summary
+
+class Metrics:
+    """Process-wide latency histograms keyed by metric name, e.g. "execute.add"."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = Lock()
+        self._originals = []  # (owner, attribute, original) of the installed wrappers
+        self.enabled = False
+
+    def configure(self, enabled: bool):
+        """
+        Enable or disable the metrics, installing or removing the timing wrappers.
+
+        :param enabled: True to start recording.
+        """
+        with self._lock:
+            if enabled and not self.enabled:
+                for owner, attribute, name in instrumented_methods():
+                    original = owner.__dict__[attribute]
+                    self._originals.append((owner, attribute, original))
+                    setattr(owner, attribute, self._wrap(original, name))
+            elif not enabled and self.enabled:
+                for owner, attribute, original in reversed(self._originals):
+                    setattr(owner, attribute, original)
+                self._originals.clear()
+            self.enabled = bool(enabled)
+        logging.info("Metrics %s.", "enabled" if self.enabled else "disabled")
+
+    def _wrap(self, original, name: str):
+        """Return a timing wrapper for a function, classmethod or staticmethod."""
+        if isinstance(original, (classmethod, staticmethod)):
+            return type(original)(self._wrap(original.__func__, name))
+
+        @wraps(original)
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return original(*args, **kwargs)
+            except Exception as e:
+                self.count_error(name, error_kind(e))
+                raise
+            finally:
+                self.record(name, perf_counter_ns() - start)
+        return timed
+
+    def _histogram(self, name: str) -> LatencyHistogram:
+        """Return the histogram of a metric, creating it on first use; call with the lock held."""
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = LatencyHistogram()
+        return histogram
+
+    def record(self, name: str, nanoseconds: int):
+        """Record one call of a metric and its latency in nanoseconds."""
+        with self._lock:
+            self._histogram(name).record(nanoseconds)
+
+    def count_error(self, name: str, kind: str):
+        """Count an error of the given kind (e.g. "divide_by_zero") against a metric."""
+        with self._lock:
+            errors = self._histogram(name).errors
+            errors[kind] = errors.get(kind, 0) + 1
+
+    def reset(self):
+        """Forget every recorded latency and error."""
+        with self._lock:
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """Return every metric's summary, keyed by metric name."""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self._histograms.items())}
+
+    def dump(self, file_name: str):
+        """Write the snapshot to a JSON file."""
+        with open(file_name, 'w', encoding='utf-8') as metrics_file:
+            json.dump({'enabled': self.enabled, 'metrics': self.snapshot()}, metrics_file, indent=2)
+        logging.info("Metrics written to %s.", file_name)
+
+    def format_report(self) -> str:
+        """Format the counts and latency percentiles as a plain text table."""
+        lines = [f"{'metric':<32} {'count':>8} {'errors':>7} {'mean us':>10} {'p50 us':>10} "
+                 f"{'p99 us':>10} {'max us':>10}"]
+        for name, summary in self.snapshot().items():
+            if not summary['count']:
+                lines.append(f"{name:<32} {0:>8} {sum(summary['errors'].values()):>7}")
+                continue
+            lines.append(
+                f"{name:<32} {summary['count']:>8} {sum(summary['errors'].values()):>7} "
+                f"{summary['mean_seconds'] * 1e6:>10.1f} {summary['p50_seconds'] * 1e6:>10.1f} "
+                f"{summary['p99_seconds'] * 1e6:>10.1f} {summary['max_seconds'] * 1e6:>10.1f}"
+            )
+        return '\n'.join(lines)
+
+def instrumented_methods() -> list:
+    """Return the (owner, attribute, metric name) of every method timed while metrics are enabled."""
+    # Imported here so that importing this module stays cheap and cannot create import cycles
+    from calculator.calculations import Calculations  # pylint: disable=import-outside-toplevel
+    from calculator.calculator import Calculator  # pylint: disable=import-outside-toplevel
+    from calculator.utils import CORE_OPERATIONS  # pylint: disable=import-outside-toplevel
+    methods = [(command_class, 'execute', f"execute.{name}") for name, command_class in CORE_OPERATIONS.items()]
+    methods += [
+        (Calculator, 'add_to_history', 'history.add_to_history'),
+        (Calculations, 'add_calculation', 'history.add_calculation'),
+        (Calculations, 'save_history', 'persistence.save_history'),
+        (Calculations, 'flush_history', 'persistence.flush_history'),
+        (Calculations, 'load_history', 'persistence.load_history'),
+    ]
+    return methods
+
+# The process-wide metrics shared by every instrumented method
+metrics = Metrics()
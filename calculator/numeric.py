@@ -0,0 +1,187 @@
+"""
+Numeric backends: the number type operands are parsed into and results are computed in.
+
+- ``decimal`` (default): exact decimal arithmetic. It uses the global decimal context, or its
+  own precision and rounding when they are given. Results are rounded to that precision.
+- ``float``: native binary floating point. It is the fastest backend but inexact, e.g.
+  0.1 + 0.2 is 0.30000000000000004.
+- ``fraction``: exact rational arithmetic with fractions.Fraction, so 1 / 3 stays 1/3.
+
+The Command classes are written against the arithmetic operators, so they work unchanged with
+any backend; DivideCommand.integer_division truncates toward zero with all of them, as
+Decimal's // does. Each backend parses operands into its type (parse) and runs commands under its
+arithmetic context (execute). A session or batch picks a backend once and uses it for every
+command it creates.
+"""
+
+import decimal
+from contextlib import nullcontext
+from decimal import Decimal, InvalidOperation
+from fractions import Fraction
+
+class NumericBackend:
+    """Base class for the numeric backends."""
+
+    name = None
+
+    def convert(self, text: str):
+        """Convert text to this backend's number type; may raise ValueError or ArithmeticError."""
+        raise NotImplementedError("Subclasses must implement the 'convert' method.")
+
+    def parse(self, text):
+        """
+        Parse an operand.
+
+        :raises InvalidOperation: If text is not a valid number, whatever the backend.
+        """
+        try:
+            return self.convert(text)
+        except (TypeError, ValueError, ArithmeticError) as e:
+            raise InvalidOperation(f"Invalid number input: {text}") from e
+
+    def context(self):
+        """Return the context manager under which this backend's arithmetic runs."""
+        return nullcontext()
+
+    def execute(self, command):
+        """Execute a command under this backend's arithmetic context and return its result."""
+        with self.context():
+            return command.execute()
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+class DecimalBackend(NumericBackend):
+    """Exact decimal arithmetic with the global decimal context or a session's own context."""
+
+    name = 'decimal'
+
+    def __init__(self, precision: int = None, rounding: str = None):
+        """
+        :param precision: Significant digits of results (default: the global context's).
+        :param rounding: A decimal rounding mode such as "ROUND_HALF_UP" or "half_up".
+        :raises ValueError: For an unknown rounding mode or a precision below 1.
+        """
+        self.precision = precision
+        self.rounding = rounding_mode(rounding) if rounding else None
+        if precision is not None and precision < 1:
+            raise ValueError(f"Precision must be at least 1, not {precision}")
+        self.decimal_context = None
+        if precision is not None or rounding:
+            self.decimal_context = decimal.getcontext().copy()
+            if precision is not None:
+                self.decimal_context.prec = precision
+            if self.rounding:
+                self.decimal_context.rounding = self.rounding
+
+    def convert(self, text):
+        return Decimal(text)
+
+    def context(self):
+        if self.decimal_context is None:
+            return nullcontext()
+        return decimal.localcontext(self.decimal_context)
+
+    def __repr__(self):
+        return f"DecimalBackend(precision={self.precision}, rounding={self.rounding})"
+
+class FloatBackend(NumericBackend):
+    """Native binary floating point, trading exactness for speed."""
+
+    name = 'float'
+
+    def convert(self, text):
+        return float(text)
+
+class FractionBackend(NumericBackend):
+    """Exact rational arithmetic; accepts operands such as "1/3", "0.25" and "2e-3"."""
+
+    name = 'fraction'
+
+    def convert(self, text):
+        return Fraction(text)
+
+BACKENDS = {backend.name: backend for backend in (DecimalBackend, FloatBackend, FractionBackend)}
+
+# The backend used when none is chosen, matching the calculator's historical behaviour
+DEFAULT_BACKEND = DecimalBackend()
+
+def rounding_mode(name: str) -> str:
+    """
+    Return the decimal rounding constant for a name such as "half_up" or "ROUND_HALF_UP".
+
+    :raises ValueError: For an unknown rounding mode.
+    """
+    mode = name.strip().upper()
+    if not mode.startswith('ROUND_'):
+        mode = f"ROUND_{mode}"
+    if not mode.isidentifier() or not isinstance(getattr(decimal, mode, None), str):
+        raise ValueError(f"Unknown rounding mode: {name}")
+    return getattr(decimal, mode)
+
+def get_backend(name: str = 'decimal', precision: int = None, rounding: str = None) -> NumericBackend:
+    """
+    Create a numeric backend by name.
+
+    :param name: "decimal", "float" or "fraction".
+    :param precision: Decimal precision; only valid with the decimal backend.
+    :param rounding: Decimal rounding mode; only valid with the decimal backend.
+    :raises ValueError: For unknown backends, or a precision or rounding mode given for a non-decimal backend.
+    """
+    backend_class = BACKENDS.get((name or 'decimal').lower())
+    if backend_class is None:
+        raise ValueError(f"Unknown numeric backend: {name} (choose from {', '.join(BACKENDS)})")
+    if backend_class is DecimalBackend:
+        return DecimalBackend(precision, rounding)
+    if precision is not None or rounding:
+        raise ValueError("Precision and rounding only apply to the decimal backend")
+    return backend_class()
+
+class Operands(tuple):
+    """
+    The operands of a fused command (see commands.SumCommand), kept in one history column.
+
+    Its text form lists each operand followed by ';', e.g. "1;2;3;", and an (operation name,
+    operand) step as "add:3;", so that parse_stored_number can read it back. The text of an
+    empty Operands is ";".
+    """
+
+    def __str__(self):
+        return ''.join(f"{item[0]}:{item[1]};" if isinstance(item, tuple) else f"{item};" for item in self) or ';'
+
+# The grammar of the text parse_stored_number accepts, for checking stored numbers without parsing them:
+# a Decimal (including infinities and NaNs), a Fraction "a/b", or the text of an Operands
+_DECIMAL_PATTERN = r"[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|(?i:inf(?:inity)?|s?nan))"
+_FRACTION_PATTERN = r"[+-]?\d+/0*[1-9]\d*"
+_ITEM_PATTERN = rf"(?:[^:;]+:)?(?:{_DECIMAL_PATTERN}|{_FRACTION_PATTERN})"
+STORED_NUMBER_PATTERN = rf"{_DECIMAL_PATTERN}|{_FRACTION_PATTERN}|(?:{_ITEM_PATTERN};)+|;"
+
+def _parse_operand(text: str, number_type=None):
+    """Parse one item of an Operands text: a number, or a "name:number" step."""
+    name, separator, number = text.rpartition(':')
+    return (name, parse_stored_number(number, number_type)) if separator else parse_stored_number(text, number_type)
+
+def parse_stored_number(text: str, number_type=None):
+    """
+    Parse a number read back from a history file: "a/b" as a Fraction, anything else as a Decimal.
+
+    Text containing ';' is the operands of a fused command and is parsed into an Operands.
+
+    :param number_type: Fraction or Decimal, to parse every number as that type instead.
+    """
+    if ';' in text:
+        return Operands(_parse_operand(item, number_type) for item in text.split(';') if item)
+    if number_type is None:
+        number_type = Fraction if '/' in text else Decimal
+    return number_type(text)
+
+def parse_stored_row(*texts) -> tuple:
+    """
+    Parse the numbers of one history row with parse_stored_number.
+
+    A row written by the fraction backend may hold both "1/3" and "2", which would read back as
+    a Fraction and a Decimal that cannot be combined; if any number of the row is a Fraction,
+    all of them are parsed as Fractions.
+    """
+    number_type = Fraction if any('/' in text for text in texts) else None
+    return tuple(parse_stored_number(text, number_type) for text in texts)
@@ -0,0 +1,198 @@
+"""
+Discovery of calculator plugins without importing them.
+
+A plugin is a module in calculator/plugins/ with a register() function that returns a Command
+class. The registry lists the folder once and reads each module's source with ast, which gives
+the plugin's operation name, command class and description without importing it. The results
+are cached in a JSON manifest keyed on each file's mtime and size. A SHA-256 of the contents
+catches files that were touched but not changed, so only new or edited plugins are parsed
+again, and the manifest is only rewritten when something changed.
+
+Plugin modules are imported on first use, and even ast and hashlib are only imported when a
+file has to be inspected. Startup therefore costs one directory listing and one small JSON
+read, however many plugins are installed.
+"""
+
+import os
+import json
+import logging
+import importlib
+from collections.abc import Mapping
+from typing import NamedTuple
+
+PLUGINS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugins')
+MANIFEST_NAME = '.manifest.json'
+MANIFEST_VERSION = 1
+
+class PluginInfo(NamedTuple):
+    """What the manifest records about one plugin module."""
+    module: str
+    operation: str
+    command: str
+    description: str
+
+def inspect_plugin_source(module: str, source: bytes) -> dict:
+    """
+    Describe a plugin from its source code without importing it.
+
+    The operation name is derived from the class returned by register(), in the same way as
+    history_store.command_kind: "PowerCommand" becomes "power". If register() does not
+    simply return a class, the module name without its "_plugin" suffix is used instead.
+
+    :return: A dict with operation, command and description; operation is None for modules
+             without a register() function.
+    """
+    import ast  # pylint: disable=import-outside-toplevel
+    tree = ast.parse(source, filename=f"{module}.py")
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    register = next((node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == 'register'), None)
+    if register is None:
+        return {'operation': None, 'command': None, 'description': None}
+
+    returned = [node.value for node in ast.walk(register) if isinstance(node, ast.Return)]
+    command = returned[0].id if len(returned) == 1 and isinstance(returned[0], ast.Name) else None
+    if command:
+        operation = command.replace('Command', '').lower()
+    else:
+        operation = module[:-len('_plugin')] if module.endswith('_plugin') else module
+    docstring = ast.get_docstring(classes[command]) if command in classes else ast.get_docstring(tree)
+    description = docstring.strip().splitlines()[0] if docstring else operation
+    return {'operation': operation, 'command': command, 'description': description}
+
+class PluginRegistry:
+    """Discover plugins once through a cached manifest and import each one on first use."""
+
+    def __init__(self, plugins_dir: str = PLUGINS_DIR, package: str = 'calculator.plugins', manifest_path: str = None):
+        """
+        :param plugins_dir: The folder holding the plugin modules.
+        :param package: The package name the plugin modules are imported from.
+        :param manifest_path: The manifest cache file (default: .manifest.json in plugins_dir).
+        """
+        self.plugins_dir = plugins_dir
+        self.package = package
+        self.manifest_path = manifest_path or os.path.join(plugins_dir, MANIFEST_NAME)
+        self._plugins = None  # Operation names mapped to PluginInfo, filled by discover()
+        self._commands = {}  # Command classes of the plugins imported so far
+
+    def discover(self, refresh: bool = False) -> dict:
+        """Return the discovered plugins as operation names mapped to PluginInfo, scanning only once."""
+        if self._plugins is None or refresh:
+            self._plugins = self._scan()
+        return self._plugins
+
+    def _scan(self) -> dict:
+        """List the plugin folder, re-inspecting only files whose manifest entry is stale."""
+        cached = self._read_manifest()
+        entries = {}
+        try:
+            file_names = sorted(os.listdir(self.plugins_dir))
+        except OSError as e:
+            logging.error("Cannot list plugins in %s: %s", self.plugins_dir, e)
+            file_names = []
+        for file_name in file_names:
+            if not file_name.endswith('.py') or file_name.startswith('_'):
+                continue
+            module = file_name[:-3]
+            stat = os.stat(os.path.join(self.plugins_dir, file_name))
+            entry = cached.get(module)
+            if entry is None or entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                entry = self._inspect(module, stat, entry)
+            entries[module] = entry
+
+        if entries != cached:
+            self._write_manifest(entries)
+        plugins = {}
+        for module, entry in entries.items():
+            if entry['operation'] and entry['operation'] not in plugins:
+                plugins[entry['operation']] = PluginInfo(module, entry['operation'], entry['command'], entry['description'])
+        logging.debug("Discovered %d plugins in %s.", len(plugins), self.plugins_dir)
+        return plugins
+
+    def _inspect(self, module: str, stat: os.stat_result, entry: dict) -> dict:
+        """Return a fresh manifest entry for a module, parsing it only if its contents changed."""
+        with open(os.path.join(self.plugins_dir, f"{module}.py"), 'rb') as source_file:
+            source = source_file.read()
+        import hashlib  # pylint: disable=import-outside-toplevel
+        digest = hashlib.sha256(source).hexdigest()
+        if entry is None or entry['sha256'] != digest:
+            try:
+                entry = inspect_plugin_source(module, source)
+            except SyntaxError as e:
+                logging.warning("Skipping plugin %s: %s", module, e)
+                entry = {'operation': None, 'command': None, 'description': None}
+            logging.debug("Inspected plugin module %s.", module)
+        return dict(entry, mtime_ns=stat.st_mtime_ns, size=stat.st_size, sha256=digest)
+
+    def _read_manifest(self) -> dict:
+        """Return the cached manifest entries, or an empty dict if there is no usable manifest."""
+        try:
+            with open(self.manifest_path, encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest.get('plugins', {})
+
+    def _write_manifest(self, entries: dict):
+        """Replace the manifest atomically; a read-only plugin folder only costs a rescan next time."""
+        temporary_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary_path, 'w', encoding='utf-8') as manifest_file:
+                json.dump({'version': MANIFEST_VERSION, 'plugins': entries}, manifest_file, indent=1, sort_keys=True)
+            os.replace(temporary_path, self.manifest_path)
+            logging.debug("Plugin manifest written to %s.", self.manifest_path)
+        except OSError as e:
+            logging.warning("Cannot write plugin manifest %s: %s", self.manifest_path, e)
+
+    def load_module(self, module: str):
+        """Import a plugin module by its module name, e.g. "add_plugin"."""
+        return importlib.import_module(f"{self.package}.{module}")
+
+    def command_class(self, operation: str):
+        """
+        Return the command class of a plugin operation, importing the plugin on first use.
+
+        :raises KeyError: If no plugin provides the operation.
+        """
+        command_class = self._commands.get(operation)
+        if command_class is None:
+            plugin = self.discover()[operation]
+            command_class = self._commands[operation] = self.load_module(plugin.module).register()
+            logging.debug("Imported plugin %s for operation %s.", plugin.module, operation)
+        return command_class
+
+    def __contains__(self, operation) -> bool:
+        return operation in self.discover()
+
+class CommandMappings(Mapping):
+    """
+    Operation names mapped to command classes: the core commands, then any other discovered plugins.
+
+    Plugin operations are listed from the manifest, and a plugin is imported only when its
+    command class is looked up.
+    """
+
+    def __init__(self, core: dict, registry: PluginRegistry):
+        self.core = core
+        self.registry = registry
+
+    def plugin_operations(self) -> dict:
+        """Return the plugins that add operations beyond the core commands, as names mapped to PluginInfo."""
+        return {name: plugin for name, plugin in self.registry.discover().items() if name not in self.core}
+
+    def __getitem__(self, operation_name):
+        if operation_name in self.core:
+            return self.core[operation_name]
+        if operation_name in self.registry:
+            return self.registry.command_class(operation_name)
+        raise KeyError(operation_name)
+
+    def __iter__(self):
+        yield from self.core
+        yield from self.plugin_operations()
+
+    def __len__(self) -> int:
+        return len(self.core) + len(self.plugin_operations())
+
+plugin_registry = PluginRegistry()
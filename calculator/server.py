@@ -0,0 +1,121 @@
+"""
+An asyncio calculation server for many concurrent local clients.
+
+The server speaks the JSON-lines protocol of calculator.daemon over TCP on localhost or a
+Unix domain socket. Each connection is pipelined: requests are read and dispatched to a
+worker pool while earlier ones are still running, and responses are written back in
+request order. Evaluation, including heavy Decimal arithmetic, runs in a thread or process
+pool, and only the history bookkeeping happens on the event loop thread.
+
+Backpressure comes from two bounds. Each connection has at most max_pending requests in
+flight, so the server stops reading from a client that sends faster than it is served.
+Responses are written with drain(), so a client that does not read its responses stalls
+only its own connection.
+"""
+
+import os
+import json
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from calculator.daemon import REQUEST_ERRORS, error_response, evaluate_request, record_result, remove_stale_socket
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+class CalculationServer:
+    """Serve JSON-lines calculation requests with a worker pool and per-connection pipelining."""
+
+    def __init__(self, workers: int = 4, use_processes: bool = False, max_pending: int = 64):
+        """
+        :param workers: The number of worker threads or processes.
+        :param use_processes: Evaluate in a process pool instead of a thread pool.
+        :param max_pending: The maximum number of requests in flight per connection.
+        """
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self.executor = executor_class(max_workers=workers)
+        self.max_pending = max_pending
+        self.server = None
+
+    async def evaluate(self, line: bytes) -> dict:
+        """Evaluate one request line in the worker pool and record it in the history."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise TypeError("Request must be a JSON object")
+        except (TypeError, ValueError):
+            return {'error': "Malformed request"}
+
+        future = asyncio.get_running_loop().run_in_executor(self.executor, evaluate_request, request)
+        try:
+            command, result = await future
+            # History bookkeeping stays on the event loop thread
+            return record_result(command, result)
+        except REQUEST_ERRORS as e:
+            return error_response(e)
+        except Exception:  # pylint: disable=broad-exception-caught
+            # E.g. a broken process pool: answer this request and keep serving the connection
+            logging.exception("Unexpected error evaluating request %r", line)
+            return {'error': "Internal error"}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Read requests from a connection and write their responses in order."""
+        pending = asyncio.Queue(maxsize=self.max_pending)
+
+        async def respond():
+            connected = True
+            while (task := await pending.get()) is not None:
+                try:
+                    response = await task
+                except Exception:  # pylint: disable=broad-exception-caught
+                    logging.exception("Request task failed")
+                    response = {'error': "Internal error"}
+                if not connected:
+                    continue  # Keep taking tasks, so that the reader never blocks on a full queue
+                try:
+                    writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                    await writer.drain()
+                except ConnectionError as e:
+                    logging.warning("Connection lost while writing responses: %s", e)
+                    connected = False
+
+        responder = asyncio.create_task(respond())
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    # Blocks while max_pending requests are in flight, which stops reading from the client
+                    await pending.put(asyncio.create_task(self.evaluate(line)))
+        except ConnectionError as e:
+            logging.warning("Connection lost while reading requests: %s", e)
+        finally:
+            await pending.put(None)
+            await responder
+            writer.close()
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, socket_path: str = None):
+        """Start listening on a Unix socket if socket_path is given, otherwise on host:port."""
+        if socket_path:
+            # Like the daemon, never replace a socket that a running server is listening on
+            remove_stale_socket(socket_path)
+            self.server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+            os.chmod(socket_path, 0o600)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port)
+        logging.info("Calculation server listening on %s.", socket_path or self.server.sockets[0].getsockname())
+        return self.server
+
+    async def close(self):
+        """Stop accepting connections and shut down the worker pool."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+
+async def serve_async(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, socket_path: str = None, **options):
+    """Run a CalculationServer until it is cancelled; options are passed on to CalculationServer."""
+    server = CalculationServer(**options)
+    await server.start(host, port, socket_path)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
@@ -0,0 +1,72 @@
+"""
+Per-session calculation state.
+
+A Session owns a Calculations history, the persisted-row watermarks of the files it was
+saved to, and a Calculator. Calculations and Calculator() act on the current session,
+which is held in a context variable: each thread, and each asyncio task, sees the session
+it entered, and code that never enters one uses DEFAULT_SESSION, i.e. one history per
+process as before.
+
+    with Session() as session:
+        Calculator().compute(AddCommand(Decimal(1), Decimal(2)))
+        Calculations.add_calculation(...)   # recorded in session.history
+
+Threads working in different sessions append to different stores and do not wait for each
+other; within a session, each store has its own lock (see history_store). A new thread
+starts in DEFAULT_SESSION; enter a session in it, or run it with contextvars.copy_context().run
+to inherit the caller's.
+"""
+
+import itertools
+import threading
+from contextvars import ContextVar
+from calculator.history_sqlite import SESSION_ID
+from calculator.history_store import HistoryStore
+
+_numbers = itertools.count(1)
+
+class Session:
+    """The history and Calculator of one session, usable as a context manager that makes it current."""
+
+    def __init__(self, session_id: str = None, window: int = None, spill_dir: str = None):
+        """
+        :param session_id: Identifies the session in SQLite history files (default: unique to this process).
+        :param window: The in-memory window of the session's histories (see HistoryStore.set_window).
+        :param spill_dir: The folder in which spilled history segments are kept.
+        """
+        self.session_id = session_id or f"{SESSION_ID}-{next(_numbers)}"
+        self.window = window
+        self.spill_dir = spill_dir
+        self.history = HistoryStore(window, spill_dir)
+        self.persisted_rows = {}  # History file -> (history generation, number of rows written to it)
+        self.calculator = None  # Created by the first Calculator() call in this session
+        self.calculator_lock = threading.Lock()
+
+    def __enter__(self):
+        _entered.set(_entered.get() + (self,))
+        return self
+
+    def __exit__(self, *exc_info):
+        _entered.set(_entered.get()[:-1])
+
+    def __repr__(self):
+        return f"Session({self.session_id!r}, {len(self.history)} calculations)"
+
+DEFAULT_SESSION = Session(SESSION_ID)
+
+# The sessions entered in the current context, innermost last
+_entered = ContextVar('calculator_sessions', default=())
+
+def current_session() -> Session:
+    """Return the session of the calling thread or task (DEFAULT_SESSION unless one was entered)."""
+    entered = _entered.get()
+    return entered[-1] if entered else DEFAULT_SESSION
+
+class SessionAttribute:
+    """A class attribute that resolves to an attribute of the current session."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        return getattr(current_session(), self.name)
@@ -0,0 +1,109 @@
+"""
+Sharded batch evaluation of large operation files across a process pool.
+
+The input file is split into byte ranges that end on line boundaries. Each range (shard) is
+parsed and evaluated in a worker process with the same code as calculator.batch_mode. The
+per-shard output rows and history columns are then merged back in file order. The output and
+the history are therefore identical to a sequential run_batch of the same file.
+
+Only the shard boundaries are computed in the parent process, so the file is never read
+twice. Workers return their results shard by shard, which bounds memory to a few shards at a
+time rather than the whole file.
+"""
+
+import os
+import csv
+import logging
+from itertools import repeat
+import concurrent.futures
+from calculator.batch_mode import OUTPUT_COLUMNS, evaluate_line, read_operations
+from calculator.calculations import Calculations
+from calculator.numeric import DEFAULT_BACKEND, NumericBackend
+
+# Shards per worker; more shards than workers balances uneven lines across the pool
+SHARDS_PER_WORKER = 4
+
+def shard_ranges(file_name: str, shards: int) -> list:
+    """
+    Split a file into at most `shards` (start, end) byte ranges that each hold whole lines.
+
+    Each nominal boundary is moved forward to the start of the next line.
+    """
+    size = os.path.getsize(file_name)
+    boundaries = [0]
+    with open(file_name, 'rb') as stream:
+        for shard in range(1, shards):
+            offset = max(size * shard // shards, boundaries[-1])
+            if offset >= size:
+                break
+            stream.seek(offset - 1)
+            stream.readline()  # Skip to the end of the line containing byte offset - 1
+            if boundaries[-1] < stream.tell() < size:
+                boundaries.append(stream.tell())
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def _shard_lines(stream, end: int):
+    """Yield decoded lines from a binary stream until the byte offset end."""
+    while stream.tell() < end:
+        line = stream.readline()
+        if not line:
+            break
+        yield line.decode('utf-8')
+
+def evaluate_shard(file_name: str, start: int, end: int, operation_mappings: dict,
+                   backend: NumericBackend = DEFAULT_BACKEND) -> tuple:
+    """
+    Evaluate the lines in bytes [start, end) of a file; runs in a worker process.
+
+    :return: An (output rows, history columns) tuple. The history columns are lists of
+             command classes, value1, value2 and results for the lines that succeeded.
+    """
+    rows = []
+    history = ([], [], [], [])
+    with open(file_name, 'rb') as stream:
+        stream.seek(start)
+        for operation in read_operations(_shard_lines(stream, end), skip_header=start == 0):
+            row, command = evaluate_line(operation_mappings, operation, backend)
+            rows.append(row)
+            if command is not None:
+                for column, value in zip(history, (type(command), command.value1, command.value2, row[3])):
+                    column.append(value)
+    return rows, history
+
+def run_sharded_batch(file_name: str, output, operation_mappings: dict, workers: int = None,
+                      backend: NumericBackend = DEFAULT_BACKEND) -> tuple:
+    """
+    Evaluate the operations in a file across a process pool, like run_batch.
+
+    The results are written to output and the history is extended in file order, exactly as
+    a sequential run_batch would. The history is not saved here.
+
+    :param file_name: The operations file; it must be seekable, so stdin is not supported.
+    :param output: A text stream receiving the CSV results.
+    :param operation_mappings: Operation names mapped to command classes.
+    :param workers: The number of worker processes (default: the number of CPUs).
+    :param backend: The numeric backend operands are parsed and evaluated with in every worker.
+    :return: A (succeeded, failed) tuple of line counts.
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = shard_ranges(file_name, workers * SHARDS_PER_WORKER)
+    logging.info("Evaluating %s in %d shards with %d processes.", file_name, len(ranges), workers)
+
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(OUTPUT_COLUMNS)
+    succeeded = failed = 0
+    # Looked up here because importing ProcessPoolExecutor pulls in multiprocessing
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        starts, ends = zip(*ranges)
+        shard_results = executor.map(
+            evaluate_shard, repeat(file_name), starts, ends, repeat(operation_mappings), repeat(backend)
+        )
+        # executor.map yields in submission order, so shards are merged in file order
+        for rows, history in shard_results:
+            writer.writerows(rows)
+            Calculations.add_results(*history)
+            succeeded += len(history[0])
+            failed += len(rows) - len(history[0])
+    logging.info("Batch finished: %d operations succeeded, %d failed.", succeeded, failed)
+    return succeeded, failed
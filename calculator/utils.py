@@ -3,14 +3,20 @@
 Utility functions for the calculator, such as operation mappings.
 """
 from calculator.commands import AddCommand, SubtractCommand, MultiplyCommand, DivideCommand
+from calculator.plugin_registry import CommandMappings, plugin_registry
+
+CORE_OPERATIONS = {
+    'add': AddCommand,
+    'subtract': SubtractCommand,
+    'multiply': MultiplyCommand,
+    'divide': DivideCommand
+}
 
 def get_operation_mappings():
     """
-    Returns a dictionary mapping operation names to their respective command classes.
+    Returns a mapping of operation names to their respective command classes.
+
+    The core commands come first, followed by the operations of any other plugins found in
+    calculator/plugins/; those plugins are imported only when their command class is looked up.
     """
-    return {
-        'add': AddCommand,
-        'subtract': SubtractCommand,
-        'multiply': MultiplyCommand,
-        'divide': DivideCommand
-    }
+    return CommandMappings(CORE_OPERATIONS, plugin_registry)
@@ -5,32 +5,101 @@ This application provides a REPL interface for basic arithmetic operations and
 manages calculation history with support for plugins and logging.
 """
 import os
+import sys
 import logging
-from decimal import Decimal, InvalidOperation
+import argparse
+from decimal import InvalidOperation
 from dotenv import load_dotenv
 from calculator.calculations import Calculations
-from calculator.commands import AddCommand, SubtractCommand, MultiplyCommand, DivideCommand
+from calculator.calculator import Calculator
+from calculator.commands import Command
+from calculator.expression import compile_expression, is_expression
+from calculator.history_store import describe
+from calculator.batch_mode import run_batch
+from calculator.sharding import run_sharded_batch
+from calculator.utils import get_operation_mappings
+from calculator.metrics import metrics
+from calculator.numeric import get_backend
+from calculator.async_logging import start_queue_logging, stop_queue_logging
+from calculator import analytics, daemon, history_sqlite
 
 # Load environment variables from .env file
 load_dotenv()
 
+def int_from_environment(name: str, minimum: int):
+    """
+    Return the integer value of an environment variable, or None if it is unset or empty.
+
+    :raises ValueError: If the value is not an integer of at least minimum.
+    """
+    value = os.getenv(name)
+    if not value:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        number = None
+    if number is None or number < minimum:
+        raise ValueError(f"{name} must be an integer of at least {minimum}, not {value!r}")
+    return number
+
+def check_environment():
+    """
+    Validate the settings read from the environment by CalculatorApp, so that main can report them.
+
+    :raises ValueError: For the first invalid setting.
+    """
+    int_from_environment("RESULT_CACHE_SIZE", 0)
+    int_from_environment("HISTORY_WINDOW", 1)
+
+def backend_from_environment():
+    """
+    Create the numeric backend chosen with the NUMERIC_BACKEND, DECIMAL_PRECISION and DECIMAL_ROUNDING
+    environment variables (Decimal if unset).
+
+    :raises ValueError: For an unknown backend or rounding mode, or a precision that is not a positive integer.
+    """
+    precision = os.getenv("DECIMAL_PRECISION")
+    try:
+        precision = int(precision) if precision else None
+    except ValueError:
+        raise ValueError(f"DECIMAL_PRECISION must be an integer, not {precision!r}") from None
+    return get_backend(os.getenv("NUMERIC_BACKEND", "decimal"), precision, os.getenv("DECIMAL_ROUNDING"))
+
 class CalculatorApp:
     """Application class for the interactive calculator with history management."""
 
-    def __init__(self):
+    def __init__(self, backend=None):
+        """
+        :param backend: The numeric backend of this session (default: chosen with the NUMERIC_BACKEND,
+                        DECIMAL_PRECISION and DECIMAL_ROUNDING environment variables, Decimal if unset).
+        """
         self.environment = os.getenv("ENVIRONMENT", "development").lower()
         self.setup_logging()
-        self.operation_mappings = {
-            'add': AddCommand,
-            'subtract': SubtractCommand,
-            'multiply': MultiplyCommand,
-            'divide': DivideCommand
-        }
-        logging.info("CalculatorApp initialized in %s environment.", self.environment)
+        self.operation_mappings = get_operation_mappings()
+        self.backend = backend if backend is not None else backend_from_environment()
+        cache_size = int_from_environment("RESULT_CACHE_SIZE", 0)
+        if cache_size is not None:
+            Calculations.result_cache.configure(cache_size)
+        history_window = int_from_environment("HISTORY_WINDOW", 1)
+        if history_window is not None:
+            # Older calculations are spilled to segment files and paged back in when read
+            for history in (Calculations.history, Calculator().history):
+                history.set_window(history_window, os.getenv("HISTORY_SPILL_DIR"))
+        if os.getenv("CALCULATOR_METRICS", "").lower() in ("1", "true", "yes"):
+            metrics.configure(True)
+        logging.info("CalculatorApp initialized in %s environment with %r.", self.environment, self.backend)
 
     def setup_logging(self):
-        """Set up logging configuration based on environment variables."""
+        """
+        Set up logging configuration based on environment variables.
+
+        With LOG_ASYNC=1 (the default in production), records are queued and written by a
+        background thread, so calculations never wait for log I/O.
+        """
+        stop_queue_logging()
         logging.getLogger().handlers = []
+        handlers = []
 
         # Ensure the logs directory exists
         log_dir = 'logs'
@@ -44,16 +113,22 @@ class CalculatorApp:
         file_handler.setLevel(logging.getLevelName(log_level))
         file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         file_handler.setFormatter(file_formatter)
-        logging.getLogger().addHandler(file_handler)
+        handlers.append(file_handler)
 
         # Console handler for development environment
         if self.environment == "development":
             console_handler = logging.StreamHandler()
             console_handler.setLevel(logging.getLevelName(log_level))
             console_handler.setFormatter(file_formatter)
-            logging.getLogger().addHandler(console_handler)
+            handlers.append(console_handler)
 
-        logging.getLogger().setLevel(logging.getLevelName(log_level))
+        default_async = "1" if self.environment == "production" else "0"
+        if os.getenv("LOG_ASYNC", default_async).lower() in ("1", "true", "yes"):
+            start_queue_logging(handlers, logging.getLevelName(log_level))
+        else:
+            for handler in handlers:
+                logging.getLogger().addHandler(handler)
+            logging.getLogger().setLevel(logging.getLevelName(log_level))
         logging.info("Logging configured for %s environment.", self.environment)
 
     def display_menu(self):
@@ -63,29 +138,34 @@ class CalculatorApp:
         print("  subtract: Subtract two numbers")
         print("  multiply: Multiply two numbers")
         print("  divide: Divide two numbers")
+        for operation_name, plugin in self.operation_mappings.plugin_operations().items():
+            print(f"  {operation_name}: {plugin.description}")
+        print("  <expression>: Evaluate an expression, e.g. (3 + 4) * 2 / 7")
         print("  history: View calculation history")
         print("  clear_history: Clear calculation history")
         print("  save_history: Save history to a file")
         print("  load_history: Load history from a file")
+        print("  metrics: Show latency and error metrics")
+        print("  stats: Show result statistics by operation")
         print("  exit: Exit the calculator")
 
     def is_valid_number(self, value):
-        """Checks if the input value is a valid number."""
+        """Checks if the input value is a valid number for the session's numeric backend."""
         try:
-            Decimal(value)
+            self.backend.parse(value)
             return True
         except InvalidOperation:
             return False
 
     def calculate_and_store(self, value1, value2, operation_name):
-        """Performs the calculation, stores it in history, and automatically saves it to CSV."""
+        """Performs the calculation, stores it in history, and automatically appends it to CSV."""
         try:
-            value1_decimal, value2_decimal = map(Decimal, [value1, value2])
+            number1, number2 = map(self.backend.parse, [value1, value2])
             command_class = self.operation_mappings.get(operation_name)
 
             if command_class:
-                command = command_class(value1_decimal, value2_decimal)
-                result = command.execute()
+                command = command_class(number1, number2)
+                result = self.backend.execute(command)
 
                 # Display the result
                 print(f"The result of {operation_name} between {value1} and {value2} is {result}")
@@ -93,8 +173,8 @@ class CalculatorApp:
                 # Store the command in the history
                 Calculations.add_calculation(command)
 
-                # Automatically save the calculation history after each operation
-                Calculations.save_history(file_name='data/calculation_history.csv')
+                # Automatically append the new calculation to the history file after each operation
+                Calculations.flush_history(file_name='data/calculation_history.csv')
 
                 logging.info("Calculation %s with values %s, %s added to history and saved.", operation_name, value1, value2)
             else:
@@ -104,8 +184,13 @@ class CalculatorApp:
             print("Error: Division by zero.")
             logging.error("Attempted division by zero in operation %s with values %s, %s", operation_name, value1, value2)
         except InvalidOperation:
+            if metrics.enabled:
+                metrics.count_error(f"execute.{operation_name}", 'invalid_input')
             print(f"Invalid number input: {value1} or {value2} is not a valid number.")
             logging.error("Invalid input detected for operation %s: %s, %s", operation_name, value1, value2)
+        except ArithmeticError as ae:
+            print(f"An error occurred: arithmetic error ({type(ae).__name__}).")
+            logging.error("%s occurred in operation %s with values %s, %s", type(ae).__name__, operation_name, value1, value2)
         except AttributeError as ae:
             print(f"An error occurred: {ae}")
             logging.error("AttributeError occurred in operation %s with values %s, %s: %s", operation_name, value1, value2, ae)
@@ -119,6 +204,29 @@ class CalculatorApp:
             print(f"TypeError occurred: {te}")
             logging.error("TypeError occurred in operation %s with values %s, %s: %s", operation_name, value1, value2, te)
 
+    def calculate_expression(self, expression):
+        """Evaluates an arithmetic expression, stores its outermost command in history and appends it to CSV."""
+        try:
+            root = compile_expression(expression, self.backend)()
+            if isinstance(root, Command):
+                result = self.backend.execute(root)
+                Calculations.add_calculation(root)
+                Calculations.flush_history(file_name='data/calculation_history.csv')
+            else:
+                result = root
+            print(f"The result of {expression} is {result}")
+            logging.info("Expression %s evaluated to %s.", expression, result)
+        except ArithmeticError as ae:
+            # E.g. decimal.Overflow for "1e999999 * 1e999999"
+            print(f"An error occurred: arithmetic error ({type(ae).__name__}).")
+            logging.error("%s occurred in expression %s", type(ae).__name__, expression)
+        except ValueError as ve:
+            if "Cannot divide by zero" in str(ve):
+                print("An error occurred: Cannot divide by zero.")
+            else:
+                print(f"An error occurred: {ve}")
+            logging.error("ValueError occurred in expression %s: %s", expression, ve)
+
     def prompt_for_numbers(self, operation_name):
         """Prompts the user to input two numbers for the operation, using LBYL to validate inputs."""
         print(f"\nEnter two numbers for {operation_name}:")
@@ -127,6 +235,8 @@ class CalculatorApp:
 
         # LBYL check: Ensure both inputs are valid numbers before proceeding
         if not self.is_valid_number(value1) or not self.is_valid_number(value2):
+            if metrics.enabled:
+                metrics.count_error(f"execute.{operation_name}", 'invalid_input')
             print(f"Invalid input: {value1} or {value2} is not a valid number.")
             logging.error("Invalid input detected: %s, %s", value1, value2)
             return None, None
@@ -156,14 +266,41 @@ class CalculatorApp:
                 self.save_history()
             elif user_input == 'load_history':
                 self.load_history()
+            elif user_input == 'metrics':
+                self.display_metrics()
+            elif user_input == 'stats':
+                self.display_stats()
             elif user_input in self.operation_mappings:
                 value1, value2 = self.prompt_for_numbers(user_input)
                 if value1 and value2:
                     self.calculate_and_store(value1, value2, user_input)
+            elif is_expression(user_input):
+                self.calculate_expression(user_input)
             else:
                 print("Invalid input. Please type 'menu' to see the available commands.")
                 logging.warning("Invalid input received: %s", user_input)
 
+    def display_metrics(self):
+        """Displays the call counts, error counts and latency percentiles recorded so far."""
+        if not metrics.enabled:
+            print("Metrics are disabled. Set CALCULATOR_METRICS=1 or pass --metrics-file to enable them.")
+            return
+        print(metrics.format_report())
+
+    def display_stats(self, file_name=None):
+        """
+        Displays the count, sum, mean, min, max and percentiles of the results of each operation.
+
+        The statistics are computed column-wise over the in-memory history, or over a history
+        file read directly without loading it into the history.
+        """
+        frame = analytics.file_frame(file_name) if file_name else analytics.history_frame()
+        if frame.empty:
+            print("No history available.")
+            return
+        print(analytics.format_summary(analytics.summarize(frame)))
+        logging.info("Displayed statistics of %d calculations.", len(frame))
+
     def clear_history(self):
         """Clears the calculation history."""
         Calculations.clear_history()
@@ -182,25 +319,136 @@ class CalculatorApp:
         print("Calculation history loaded from file.")
         logging.info("Calculation history loaded from file.")
 
+    def run_batch(self, source, output=None, workers=None):
+        """
+        Evaluates the operations in a file (or '-' for stdin) and writes the results to a file or stdout.
+
+        With workers, a file is split into shards that are evaluated in that many processes.
+        The history is appended to the CSV once, after the whole batch has run.
+        """
+        input_stream = sys.stdin if source == '-' else open(source, newline='', encoding='utf-8')  # pylint: disable=consider-using-with
+        output_stream = sys.stdout
+        try:
+            if output:
+                output_stream = open(output, 'w', newline='', encoding='utf-8')  # pylint: disable=consider-using-with
+            if workers and input_stream is not sys.stdin:
+                succeeded, failed = run_sharded_batch(source, output_stream, self.operation_mappings, workers,
+                                                      self.backend)
+            else:
+                succeeded, failed = run_batch(input_stream, output_stream, self.operation_mappings, self.backend)
+        finally:
+            if input_stream is not sys.stdin:
+                input_stream.close()
+            if output_stream is not sys.stdout:
+                output_stream.close()
+        Calculations.flush_history(file_name='data/calculation_history.csv')
+        logging.info("Batch from %s evaluated: %d succeeded, %d failed.", source, succeeded, failed)
+        return succeeded, failed
+
     def display_history(self):
         """Displays the calculation history."""
         history = Calculations.get_history()
         if history:
             for idx, calculation in enumerate(history, 1):
-                if hasattr(calculation, 'execute'):
-                    result = calculation.execute()
-                    operation_name = calculation.__class__.__name__.replace("Command", "").lower()
-                else:
-                    result = calculation.result
-                    operation_name = calculation.operation.__name__.lower()
+                operation_name, result = describe(calculation)
                 print(f"{idx}: {calculation.value1} {operation_name} {calculation.value2} = {result}")
             logging.info("Displayed calculation history.")
         else:
             print("No history available.")
             logging.info("No calculation history available.")
 
-if __name__ == "__main__":
+def main(argv=None):
+    """Parses the command line and starts the REPL, a batch run, the daemon or the asyncio server."""
+    parser = argparse.ArgumentParser(description="Advanced Python calculator.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="evaluate the operations in FILE ('-' for stdin) instead of starting the REPL")
+    parser.add_argument("--output", metavar="FILE", help="write batch results to FILE instead of stdout")
+    parser.add_argument("--daemon", action="store_true",
+                        help="serve calculations over a Unix domain socket for calculator.client")
+    parser.add_argument("--serve", action="store_true",
+                        help="run the asyncio JSON-lines server for many concurrent clients")
+    parser.add_argument("--socket", metavar="PATH",
+                        help=f"Unix socket path for --daemon (default: {daemon.DEFAULT_SOCKET_PATH}) or --serve")
+    parser.add_argument("--port", type=int, help="TCP port on localhost for --serve (default: 8765)")
+    parser.add_argument("--workers", type=int,
+                        help="worker pool size for --serve (default: 4), or evaluate a --batch file in this many processes")
+    parser.add_argument("--stats", metavar="FILE",
+                        help="print result statistics by operation for the history file FILE and exit")
+    parser.add_argument("--metrics-file", metavar="FILE",
+                        help="record latency and error metrics and write them to FILE as JSON on exit")
+    parser.add_argument("--processes", action="store_true", help="use a process pool instead of threads for --serve")
+    parser.add_argument("--numeric", choices=["decimal", "float", "fraction"],
+                        help="numeric backend for the REPL and --batch (default: NUMERIC_BACKEND or decimal)")
+    parser.add_argument("--precision", type=int, help="significant digits of decimal results")
+    parser.add_argument("--rounding", help="decimal rounding mode, e.g. half_up or ROUND_HALF_EVEN")
+    args = parser.parse_args(argv)
+    try:
+        if args.numeric or args.precision is not None or args.rounding:
+            backend = get_backend(args.numeric or "decimal", args.precision, args.rounding)
+        else:
+            backend = backend_from_environment()
+        check_environment()
+    except ValueError as e:
+        parser.error(str(e))
+
     # Ensure the data directory exists
     os.makedirs('data', exist_ok=True)
-    app = CalculatorApp()
+    app = CalculatorApp(backend)
+    if args.metrics_file:
+        metrics.configure(True)
+    try:
+        return run_mode(app, args)
+    finally:
+        if args.metrics_file:
+            metrics.dump(args.metrics_file)
+
+def display_file_stats(app, file_name):
+    """Displays the statistics of a history file and returns the exit status, 1 if it cannot be read."""
+    try:
+        app.display_stats(file_name)
+    except (OSError, ValueError, ImportError, history_sqlite.sqlite3.Error) as e:
+        print(f"Cannot read the history file {file_name}: {e}", file=sys.stderr)
+        logging.error("Cannot read the history file %s: %s", file_name, e)
+        return 1
+    return 0
+
+def run_batch_file(app, args):
+    """Runs a --batch file and returns the exit status, 1 if a row failed or a file cannot be opened."""
+    try:
+        _, failed = app.run_batch(args.batch, args.output, args.workers)
+    except OSError as e:
+        print(f"Cannot run the batch: {e}", file=sys.stderr)
+        logging.error("Cannot run the batch from %s: %s", args.batch, e)
+        return 1
+    return 1 if failed else 0
+
+def run_mode(app, args):
+    """Runs the mode selected on the command line and returns the exit status."""
+    if args.stats:
+        return display_file_stats(app, args.stats)
+    if args.batch:
+        return run_batch_file(app, args)
+    if args.daemon:
+        try:
+            daemon.serve(args.socket or daemon.DEFAULT_SOCKET_PATH)
+        except OSError as e:
+            print(f"Cannot start the calculator daemon: {e}", file=sys.stderr)
+            logging.error("Cannot start the calculator daemon: %s", e)
+            return 1
+        return 0
+    if args.serve:
+        # asyncio alone takes longer to import than the rest of the application
+        import asyncio  # pylint: disable=import-outside-toplevel
+        from calculator.server import DEFAULT_PORT, serve_async  # pylint: disable=import-outside-toplevel
+        try:
+            asyncio.run(serve_async(port=args.port or DEFAULT_PORT, socket_path=args.socket,
+                                    workers=args.workers or 4, use_processes=args.processes))
+        except KeyboardInterrupt:
+            logging.info("Calculation server stopped.")
+        Calculations.flush_history(file_name='data/calculation_history.csv')
+        return 0
     app.interactive_calculator()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
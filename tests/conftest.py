@@ -72,11 +72,11 @@ def pytest_generate_tests(metafunc):
             ]
             metafunc.parametrize("value1,value2,operation_func,expected", modified_parameters)
 
-# Fixture to automatically delete test_calculation_history.csv after tests
+# Fixture to automatically delete test_calculation_history.csv and its row index after tests
 @pytest.fixture(autouse=True)
 def cleanup_test_files():
-    """Remove test_calculation_history.csv if it exists after tests complete."""
+    """Remove test_calculation_history.csv and its row index sidecar if they exist after tests complete."""
     yield  # Run the tests first
-    test_file = 'data/test_calculation_history.csv'
-    if os.path.exists(test_file):
-        os.remove(test_file)
+    for test_file in ('data/test_calculation_history.csv', 'data/test_calculation_history.csv.hashes'):
+        if os.path.exists(test_file):
+            os.remove(test_file)
@@ -0,0 +1,100 @@
+"""
+This module contains tests for the vectorized history analytics.
+It checks the columns built from history stores and files, per-operation summaries and
+rolling statistics.
+"""
+
+from decimal import Decimal
+import math
+import pytest
+from calculator import analytics
+from calculator.calculation import Calculation
+from calculator.calculations import Calculations
+from calculator.commands import AddCommand, DivideCommand, MultiplyCommand
+from calculator.history_store import HistoryStore, command_kind
+from calculator.operations import divide
+
+# Suppress pylint warnings for redefined fixture names
+# pylint: disable=redefined-outer-name
+
+@pytest.fixture
+def history():
+    """Fill the history with adds of 1 to 10, multiplications by 2 of 1 to 5 and a division."""
+    Calculations.clear_history()
+    for value in range(1, 11):
+        Calculations.add_calculation(AddCommand(Decimal(value), Decimal(0)))
+    for value in range(1, 6):
+        Calculations.add_calculation(MultiplyCommand(Decimal(value), Decimal(2)))
+    Calculations.add_calculation(DivideCommand(Decimal(9), Decimal(4)))
+    yield Calculations.history
+    Calculations.clear_history()
+
+def test_history_frame_is_columnar(history):
+    """Test that the frame has a categorical operation and a float result for every row, failures as NaN."""
+    Calculations.add_calculation(Calculation(Decimal(1), Decimal(0), divide))
+    frame = analytics.history_frame()
+    assert list(frame.columns) == ['op', 'result'] and len(frame) == len(history) == 17
+    assert str(frame['op'].dtype) == 'category' and str(frame['result'].dtype) == 'float64'
+    assert list(frame['op'][:2]) == ['add', 'add'] and frame['op'].iloc[-1] == 'divide'
+    assert frame['result'].iloc[-2] == 2.25 and math.isnan(frame['result'].iloc[-1])
+
+def test_summary_by_operation(history):
+    """Test per-operation counts, sums, means, extremes and percentiles, and the overall row."""
+    summary = analytics.summarize(analytics.history_frame(history), percentiles=(0.5, 0.999))
+    assert list(summary.index) == ['add', 'divide', 'multiply', 'all']
+    assert list(summary.columns) == ['count', 'sum', 'mean', 'min', 'max', 'p50', 'p99.9']
+    assert summary.loc['add', ['count', 'sum', 'mean', 'min', 'max', 'p50']].tolist() == [10, 55, 5.5, 1, 10, 5.5]
+    assert summary.loc['multiply', 'sum'] == 30 and summary.loc['divide', 'count'] == 1
+    assert summary.loc['all', ['count', 'sum', 'max']].tolist() == [16, 87.25, 10]
+    assert "p99.9" in analytics.format_summary(summary)
+
+def test_empty_summary():
+    """Test that an empty history gives only an empty overall row."""
+    summary = analytics.summarize(analytics.history_frame(HistoryStore()))
+    assert list(summary.index) == ['all'] and summary.loc['all', 'count'] == 0
+
+def test_rolling_statistics(history):
+    """Test rolling statistics over all rows and over one operation."""
+    frame = analytics.history_frame(history)
+    rolled = analytics.rolling(frame, 3, stats=('mean', 'max'), operation='add')
+    assert rolled['mean'].tolist()[:3] == [1.0, 1.5, 2.0] and rolled['mean'].iloc[-1] == 9.0
+    assert len(analytics.rolling(frame, 4)) == len(history)
+    with pytest.raises(ValueError, match="at least 1"):
+        analytics.rolling(frame, 0)
+
+def test_spilled_lazy_and_uncomputed_results(tmp_path):
+    """Test that segments, lazily loaded text and results not computed yet are all read."""
+    store = HistoryStore(window=4, spill_dir=str(tmp_path))
+    add = command_kind(AddCommand)
+    for value in range(10):
+        store.append_row(add, Decimal(value), Decimal(1))  # Results computed on demand
+    store.append_row(command_kind(DivideCommand), '1', '3', '1/3')  # Lazily loaded Fraction text
+    assert store.spilled and None in next(store.result_columns())[1]
+    frame = analytics.history_frame(store)
+    assert frame['result'][:10].tolist() == [float(value + 1) for value in range(10)]
+    assert frame['result'].iloc[-1] == pytest.approx(1 / 3)
+
+@pytest.mark.parametrize("file_name", ["history.csv", "history.db"])
+def test_file_frame_matches_history(history, tmp_path, file_name):
+    """Test that a saved history file gives the same summary as the history it was saved from."""
+    path = str(tmp_path / file_name)
+    Calculations.flush_history(file_name=path)
+    from_file = analytics.summarize(analytics.file_frame(path, chunksize=4))
+    from_memory = analytics.summarize(analytics.history_frame(history))
+    assert from_file.equals(from_memory)
+
+def test_file_frame_parses_fraction_results(tmp_path):
+    """Test that Fraction results in a file, such as '1/3', are read as history_frame reads them."""
+    path = tmp_path / "history.csv"
+    path.write_text("operation,result\n1 divide 3,1/3\n1 add 1,2\n1 divide 0,\n", encoding="utf-8")
+    frame = analytics.file_frame(str(path))
+    assert frame['result'].tolist()[:2] == [pytest.approx(1 / 3), 2.0] and math.isnan(frame['result'].iloc[2])
+    Calculations.load_history(str(path))
+    assert analytics.history_frame()['result'].tolist()[:2] == frame['result'].tolist()[:2]
+    Calculations.clear_history()
+
+def test_file_frame_missing_file(tmp_path):
+    """Test that a missing file raises FileNotFoundError instead of being created or read as empty."""
+    with pytest.raises(FileNotFoundError):
+        analytics.file_frame(str(tmp_path / "missing.db"))
+    assert not (tmp_path / "missing.db").exists()
@@ -0,0 +1,80 @@
+"""
+This module contains tests for queued asynchronous logging and the debug guards.
+It checks that records are written by the background thread and flushed when logging stops.
+"""
+
+import logging
+import threading
+from decimal import Decimal
+from calculator.async_logging import start_queue_logging, stop_queue_logging
+from calculator.commands import AddCommand
+
+class RecordingHandler(logging.Handler):
+    """Keep the formatted messages and the names of the threads that handled them."""
+
+    def __init__(self, gate=None):
+        super().__init__()
+        self.messages = []
+        self.threads = set()
+        self.gate = gate
+
+    def emit(self, record):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.messages.append(self.format(record))
+        self.threads.add(threading.current_thread().name)
+
+def restore_root(handlers, level):
+    """Stop queued logging and put the root logger back as it was."""
+    stop_queue_logging()
+    logging.getLogger().handlers = handlers
+    logging.getLogger().setLevel(level)
+
+def test_records_are_written_by_the_writer_thread():
+    """Test that logging returns before a blocked handler writes, and stopping flushes the queue."""
+    root = logging.getLogger()
+    saved = (root.handlers[:], root.level)
+    release = threading.Event()
+    handler = RecordingHandler(gate=release)
+    try:
+        start_queue_logging([handler], logging.INFO)
+        logging.info("Result: %s", Decimal("1.5"))
+        logging.debug("Not recorded")
+        assert not handler.messages  # The caller did not wait for the blocked handler
+        release.set()
+        stop_queue_logging()
+        assert handler.messages == ["Result: 1.5"]
+        assert threading.current_thread().name not in handler.threads
+    finally:
+        release.set()
+        restore_root(*saved)
+
+def test_handler_levels_are_respected():
+    """Test that each handler keeps its own level behind the queue."""
+    root = logging.getLogger()
+    saved = (root.handlers[:], root.level)
+    errors_only = RecordingHandler()
+    errors_only.setLevel(logging.ERROR)
+    try:
+        start_queue_logging([errors_only], logging.INFO)
+        logging.info("info")
+        logging.error("error")
+        stop_queue_logging()
+        assert errors_only.messages == ["error"]
+    finally:
+        restore_root(*saved)
+
+def test_execute_skips_debug_records_when_disabled(mocker):
+    """Test that execute does not create debug records unless DEBUG is enabled."""
+    root = logging.getLogger()
+    level = root.level
+    debug = mocker.patch("logging.debug")
+    try:
+        root.setLevel(logging.INFO)
+        AddCommand(Decimal(1), Decimal(2)).execute()
+        debug.assert_not_called()
+        root.setLevel(logging.DEBUG)
+        AddCommand(Decimal(1), Decimal(2)).execute()
+        debug.assert_called_once()
+    finally:
+        root.setLevel(level)
@@ -0,0 +1,75 @@
+"""
+This module contains tests for the NumPy batch evaluation engine.
+It checks the float and Decimal paths against the Command classes and the masking of division by zero.
+"""
+
+from decimal import Decimal
+import numpy as np
+import pytest
+from calculator.batch import encode_operations, evaluate_batch, OPERATION_CODES
+from calculator.calculations import Calculations
+from calculator.commands import DivideCommand
+from calculator.utils import get_operation_mappings
+
+def test_encode_operations_names_and_codes():
+    """Test that operation names and integer codes map to the same codes."""
+    codes = encode_operations(['add', 'Divide', 'multiply', 'add'])
+    assert list(codes) == [0, 3, 2, 0]
+    assert list(encode_operations(np.array([1, 2]))) == [1, 2]
+
+def test_encode_operations_unknown():
+    """Test that an unknown operation name or code raises a ValueError."""
+    with pytest.raises(ValueError, match="Unknown operation: power"):
+        encode_operations(['add', 'power'])
+    with pytest.raises(ValueError, match="Unknown operation code"):
+        encode_operations([7])
+
+def test_evaluate_batch_float():
+    """Test the float64 fast path."""
+    results = evaluate_batch(['add', 'subtract', 'multiply', 'divide'], [1, 10, 4, 9], [2, 4, 5, 3])
+    assert results.dtype == np.float64
+    assert list(results) == [3.0, 6.0, 20.0, 3.0]
+    assert not results.mask.any()
+
+def test_evaluate_batch_exact_matches_commands(value1, value2, operation, expected):
+    """Test that the Decimal path gives exactly the results of the Command classes."""
+    results = Calculations.evaluate_batch([operation], [value1], [value2], exact=True)
+    command = get_operation_mappings()[operation](value1, value2)
+    if isinstance(expected, str):
+        assert results.mask[0]
+    else:
+        assert results[0] == command.execute()
+        assert isinstance(results[0], Decimal)
+
+def test_evaluate_batch_masks_division_by_zero(caplog):
+    """Test that rows dividing by zero are masked and logged like DivideCommand reports them."""
+    results = evaluate_batch(['divide', 'divide', 'add'], ['1', '4', '1'], ['0', '2', '0'], exact=True)
+    assert list(results.mask) == [True, False, False]
+    assert results[1] == Decimal('2')
+    assert any("divide by zero" in record.message for record in caplog.records)
+
+def test_evaluate_batch_integer_division():
+    """Test that the integer division strategy is applied to division rows."""
+    codes = [OPERATION_CODES['divide']] * 2
+    results = evaluate_batch(codes, [Decimal('10'), Decimal('7')], [Decimal('3'), Decimal('0')],
+                             exact=True, strategy=DivideCommand.integer_division)
+    assert results[0] == DivideCommand(Decimal('10'), Decimal('3'), strategy=DivideCommand.integer_division).execute()
+    assert results.mask[1]
+
+@pytest.mark.parametrize("exact", [False, True])
+def test_evaluate_batch_integer_division_truncates(exact):
+    """Test that integer division truncates toward zero on both paths, as Decimal's // does."""
+    results = evaluate_batch(['divide'] * 4, [-7, 7, -7, -6], [2, -2, -2, 2], exact=exact,
+                             strategy=DivideCommand.integer_division)
+    assert [float(result) for result in results] == [-3, -3, 3, -3]
+
+def test_evaluate_batch_rejects_unsupported_strategy():
+    """Test that a strategy the batch engine cannot evaluate column-wise is rejected, not ignored."""
+    for exact in (False, True):
+        with pytest.raises(ValueError, match="Unsupported division strategy"):
+            evaluate_batch(['divide'], [7], [2], exact=exact, strategy=lambda a, b: a + b)
+
+def test_evaluate_batch_length_mismatch():
+    """Test that operands of different lengths are rejected."""
+    with pytest.raises(ValueError, match="same length"):
+        evaluate_batch(['add', 'add'], [1, 2], [3])
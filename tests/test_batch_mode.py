@@ -0,0 +1,67 @@
+"""
+This module contains tests for the non-interactive batch mode.
+It checks input parsing, error reporting and that results are written as CSV.
+"""
+
+import io
+from decimal import Decimal
+from fractions import Fraction
+import pytest
+from calculator.batch_mode import parse_operation_line, read_operations, run_batch
+from calculator.calculations import Calculations
+from calculator.numeric import FractionBackend
+from calculator.utils import get_operation_mappings
+
+@pytest.mark.parametrize("fields, expected", [
+    (["add", "4", "4"], ("add", "4", "4")),
+    ([" Multiply ", " 2.5", "4 "], ("multiply", "2.5", "4")),
+    (["4 Subtract 1"], ("subtract", "4", "1")),
+])
+def test_parse_operation_line(fields, expected):
+    """Test both supported line formats."""
+    assert parse_operation_line(fields) == expected
+
+@pytest.mark.parametrize("fields", [["add", "1"], ["4 add"], ["a", "b", "c", "d"]])
+def test_parse_operation_line_malformed(fields):
+    """Test that lines in neither format are rejected."""
+    with pytest.raises(ValueError, match="Malformed line"):
+        parse_operation_line(fields)
+
+def test_read_operations_skips_header_and_blank_lines():
+    """Test that the header and blank lines are skipped while streaming."""
+    stream = io.StringIO("operation,value1,value2\nadd,1,2\n\n3 divide 4\n")
+    assert list(read_operations(stream)) == [("add", "1", "2"), ("divide", "3", "4")]
+
+def test_run_batch_writes_results_and_errors():
+    """Test that results and per-line errors are written as CSV and successes go to history."""
+    Calculations.clear_history()
+    source = io.StringIO("add,4,4\n3 multiply 5\ndivide,1,0\npower,2,2\nadd,x,1\none two\n")
+    output = io.StringIO()
+    assert run_batch(source, output, get_operation_mappings()) == (2, 4)
+    assert output.getvalue().splitlines() == [
+        "operation,value1,value2,result",
+        "add,4,4,8",
+        "multiply,3,5,15",
+        "divide,1,0,error: Cannot divide by zero.",
+        "power,2,2,error: Unknown operation: power",
+        "add,x,1,error: Invalid number input",
+        ",,,error: Malformed line: one two",
+    ]
+    assert [entry.result for entry in Calculations.get_history()] == [Decimal('8'), Decimal('15')]
+
+def test_run_batch_writes_in_blocks(mocker):
+    """Test that output rows are written in blocks rather than one by one."""
+    mocker.patch("calculator.batch_mode.BLOCK_SIZE", 2)
+    writer = mocker.patch("calculator.batch_mode.csv.writer").return_value
+    run_batch(io.StringIO("add,1,1\n" * 5), io.StringIO(), get_operation_mappings())
+    assert [len(call.args[0]) for call in writer.writerows.call_args_list] == [2, 2, 1]
+    Calculations.clear_history()
+
+def test_run_batch_with_fraction_backend():
+    """Test that a batch parses and evaluates its operands with the chosen numeric backend."""
+    output = io.StringIO()
+    assert run_batch(io.StringIO("divide,1,3\nadd,1/2,1/3\n"), output, get_operation_mappings(),
+                     FractionBackend()) == (2, 0)
+    assert output.getvalue().splitlines()[1:] == ["divide,1,3,1/3", "add,1/2,1/3,5/6"]
+    assert [entry.result for entry in Calculations.get_history()] == [Fraction(1, 3), Fraction(5, 6)]
+    Calculations.clear_history()
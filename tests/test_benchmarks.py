@@ -0,0 +1,47 @@
+"""
+This module contains tests for the benchmark suite.
+It checks the JSON report, the baseline comparison and the command-line exit status.
+"""
+
+import json
+from benchmarks.cases import CASES
+from benchmarks.runner import compare, main, run_suite
+from calculator.calculations import Calculations
+
+def test_run_suite_reports_every_case():
+    """Test that every case runs once per size and reports its timings."""
+    report = run_suite(sizes=[10], repeat=1)
+    sized = [name for name, (_, is_sized, _) in CASES.items() if is_sized]
+    assert set(report['results']) == {f"{name}[10]" if name in sized else name for name in CASES}
+    result = report['results']['persistence.load_history[10]']
+    assert result['group'] == 'persistence' and result['operations'] == 10 and result['repeat'] == 1
+    assert result['per_operation'] == result['median'] / 10
+    assert report['meta']['sizes'] == [10]
+    assert len(Calculations.get_history()) == 0
+
+def test_run_suite_filter():
+    """Test that only the cases matching the filter run."""
+    report = run_suite("command.divide*", repeat=1)
+    assert set(report['results']) == {"command.divide.execute", "command.divide_integer.execute"}
+
+def test_compare():
+    """Test that slowdowns beyond the threshold are regressions and unmatched cases are flagged."""
+    baseline = {'a': {'per_operation': 1.0}, 'b': {'per_operation': 1.0},
+                'c': {'per_operation': 1.0}, 'gone': {'per_operation': 1.0}}
+    results = {'a': {'per_operation': 1.3}, 'b': {'per_operation': 1.05},
+               'c': {'per_operation': 0.5}, 'added': {'per_operation': 1.0}}
+    assert [(row[0], row[4]) for row in compare(results, baseline, threshold=0.2)] == [
+        ('a', 'regression'), ('b', 'ok'), ('c', 'improvement'), ('added', 'new'), ('gone', 'missing')]
+
+def test_main_writes_json_and_detects_regressions(tmp_path, capsys):
+    """Test the JSON output and the exit status of a comparison against a faster baseline."""
+    output = tmp_path / "results.json"
+    assert main(["--filter", "command.add.*", "--repeat", "1", "--output", str(output)]) == 0
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert list(report['results']) == ["command.add.execute"]
+    assert "command.add.execute" in capsys.readouterr().out
+
+    report['results']["command.add.execute"]['per_operation'] /= 1000
+    output.write_text(json.dumps(report), encoding="utf-8")
+    assert main(["--filter", "command.add.*", "--repeat", "1", "--baseline", str(output)]) == 1
+    assert "regression" in capsys.readouterr().out
@@ -6,12 +6,15 @@ retrieving the latest calculation, and managing the calculation history through
 """
 
 import os
+import time
 from decimal import Decimal
+from fractions import Fraction
 from unittest import mock
 import pytest
 import pandas as pd
 from calculator.calculation import Calculation
 from calculator.calculations import Calculations
+from calculator.commands import AddCommand, MultiplyCommand
 from calculator.operations import add
 
 # Test-specific file path to avoid interfering with the main history file
@@ -86,7 +89,8 @@ def test_find_by_nonexistent_operation():
 
 def test_save_history_ioerror(caplog):
     """Test handling of an IOError when saving history by checking logs."""
-    with mock.patch("pandas.DataFrame.to_csv", side_effect=IOError("Mocked IOError for testing")):
+    with mock.patch.object(Calculations, "_write_rows", side_effect=IOError("Mocked IOError for testing")):
+        Calculations.add_calculation(AddCommand(Decimal('1'), Decimal('2')))
         Calculations.save_history(file_name=TEST_HISTORY_FILE_PATH)
     assert any("Error saving calculation history" in record.message for record in caplog.records), \
         "Expected IOError log message not found in caplog"
@@ -104,3 +108,190 @@ def test_load_history_empty_data_error(caplog):
     # Verify that the appropriate error message is logged
     assert any("Error loading calculation history" in record.message for record in caplog.records), \
         "Expected EmptyDataError log message not found in caplog"
+
+@pytest.mark.usefixtures("setup_calculations")
+def test_flush_history_appends_only_new_rows():
+    """Test that flush_history writes only the calculations added since the previous flush."""
+    assert Calculations.flush_history(file_name=TEST_HISTORY_FILE_PATH) == 1
+    assert Calculations.flush_history(file_name=TEST_HISTORY_FILE_PATH) == 0, "Expected nothing new to flush"
+
+    Calculations.add_calculation(Calculation(Decimal('3'), Decimal('4'), add))
+    assert Calculations.flush_history(file_name=TEST_HISTORY_FILE_PATH) == 1
+
+    data = pd.read_csv(TEST_HISTORY_FILE_PATH)
+    assert list(data['operation']) == ['10 add 5', '3 add 4']
+    assert list(data['result']) == [15, 7]
+
+@pytest.mark.usefixtures("setup_calculations")
+def test_flush_history_after_load_skips_loaded_rows():
+    """Test that rows loaded from a file count as already persisted to that file."""
+    Calculations.save_history(file_name=TEST_HISTORY_FILE_PATH)
+    Calculations.load_history(file_name=TEST_HISTORY_FILE_PATH)
+    assert Calculations.flush_history(file_name=TEST_HISTORY_FILE_PATH) == 0
+    assert len(pd.read_csv(TEST_HISTORY_FILE_PATH)) == 1
+
+def test_load_history_resets_other_files_watermarks(tmp_path):
+    """Test that reloading the history makes every row new to the files flushed to before."""
+    flushed, loaded = str(tmp_path / "x.csv"), str(tmp_path / "y.csv")
+    Calculations.clear_history()
+    for value in range(3):
+        Calculations.add_calculation(AddCommand(Decimal(value), Decimal(1)))
+    assert Calculations.flush_history(file_name=flushed) == 3
+    pd.DataFrame([("7 add 1", 8)], columns=['operation', 'result']).to_csv(loaded, index=False)
+    Calculations.load_history(file_name=loaded)
+    for value in range(3):
+        Calculations.add_calculation(MultiplyCommand(Decimal(value), Decimal(2)))
+    assert Calculations.flush_history(file_name=flushed) == 4
+    assert len(pd.read_csv(flushed)) == 7
+
+@pytest.mark.parametrize("file_name", ["history.csv", "history.parquet"])
+def test_save_history_after_store_is_cleared(tmp_path, file_name):
+    """Test that a save after the store itself was cleared writes every new calculation."""
+    path = str(tmp_path / file_name)
+    Calculations.clear_history()
+    for value in range(4):
+        Calculations.add_calculation(AddCommand(Decimal(value), Decimal(1)))
+    Calculations.save_history(file_name=path)
+    Calculations.history.clear()
+    for value in range(4):
+        Calculations.add_calculation(MultiplyCommand(Decimal(value), Decimal(3)))
+    Calculations.save_history(file_name=path)
+    assert len(Calculations.read_history_columns(path)) == 8
+
+@pytest.mark.usefixtures("setup_calculations")
+def test_compact_history_removes_duplicates():
+    """Test that compact_history drops duplicate rows left behind by repeated flushes."""
+    Calculations.flush_history(file_name=TEST_HISTORY_FILE_PATH)
+    Calculations.clear_history()
+    Calculations.add_calculation(Calculation(Decimal('10'), Decimal('5'), add))
+    Calculations.flush_history(file_name=TEST_HISTORY_FILE_PATH)
+    assert len(pd.read_csv(TEST_HISTORY_FILE_PATH)) == 2
+
+    assert Calculations.compact_history(file_name=TEST_HISTORY_FILE_PATH) == 1
+    assert len(pd.read_csv(TEST_HISTORY_FILE_PATH)) == 1
+
+def test_compact_history_missing_file():
+    """Test that compacting a missing file is a no-op."""
+    assert Calculations.compact_history(file_name='data/does_not_exist.csv') == 0
+
+def test_flush_history_ioerror(caplog):
+    """Test handling of an IOError when flushing history by checking logs."""
+    Calculations.clear_history()
+    Calculations.add_calculation(Calculation(Decimal('1'), Decimal('1'), add))
+    with mock.patch("builtins.open", side_effect=IOError("Mocked IOError for testing")):
+        assert Calculations.flush_history(file_name=TEST_HISTORY_FILE_PATH) == 0
+    assert any("Error flushing calculation history" in record.message for record in caplog.records)
+
+def _write_history_file(rows):
+    """Write (operation, result) rows to the test history file."""
+    os.makedirs(os.path.dirname(TEST_HISTORY_FILE_PATH), exist_ok=True)
+    pd.DataFrame(rows, columns=['operation', 'result']).to_csv(TEST_HISTORY_FILE_PATH, index=False)
+
+def test_load_history_in_chunks_reports_progress():
+    """Test that the loader streams the file in chunks and reports progress after each one."""
+    _write_history_file([(f"{i} add 1", i + 1) for i in range(10)])
+    reported = []
+    Calculations.load_history(file_name=TEST_HISTORY_FILE_PATH, chunksize=4, progress=reported.append)
+    assert reported == [4, 8, 10]
+    assert len(Calculations.get_history()) == 10
+    assert Calculations.get_latest().result == Decimal('10')
+
+def test_load_history_keeps_exact_results():
+    """Test that results are read as text so Decimal results are not rounded through floats."""
+    _write_history_file([("0.1 add 0.2", "0.3"), ("1 divide 3", "0.3333333333333333333333333333")])
+    Calculations.load_history(file_name=TEST_HISTORY_FILE_PATH)
+    history = Calculations.get_history()
+    assert history[0].result == Decimal('0.3')
+    assert history[1].result == Decimal('0.3333333333333333333333333333')
+
+def test_load_history_skips_unknown_and_malformed_rows():
+    """Test that rows with an unknown operation or missing operand are skipped."""
+    _write_history_file([("1 power 2", 1), ("3 multiply", 3), ("2 Multiply 3", 6)])
+    Calculations.load_history(file_name=TEST_HISTORY_FILE_PATH)
+    history = Calculations.get_history()
+    assert len(history) == 1
+    assert history[0].operation_name == 'multiply'
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_load_history_skips_malformed_numbers(caplog, lazy):
+    """Test that rows whose operands or result are not numbers are skipped and logged, lazily loaded or not."""
+    _write_history_file([("x add 2", 3), ("1 add 2", 3), ("1 divide 0/0", 1), ("2 multiply 3", "y"), ("2 multiply 3", 6)])
+    Calculations.load_history(file_name=TEST_HISTORY_FILE_PATH, lazy=lazy)
+    assert [entry.result for entry in Calculations.get_history()] == [Decimal('3'), Decimal('6')]
+    assert caplog.text.count("malformed number") == 3
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_load_history_fraction_rows(lazy):
+    """Test that rows written by the fraction backend reload as Fractions only, so they can be recalculated."""
+    _write_history_file([("1/3 divide 2", "1/6"), ("0.5 add 0.25", "0.75")])
+    Calculations.load_history(file_name=TEST_HISTORY_FILE_PATH, lazy=lazy)
+    fraction_row, decimal_row = Calculations.get_history()
+    assert fraction_row.materialize().execute() == fraction_row.result == Fraction(1, 6)
+    assert isinstance(fraction_row.value2, Fraction) and isinstance(decimal_row.value2, Decimal)
+
+def test_load_history_lazy():
+    """Test that lazily loaded rows keep their operands as text until they are accessed."""
+    _write_history_file([("4 subtract 1.5", "2.5")])
+    Calculations.load_history(file_name=TEST_HISTORY_FILE_PATH, lazy=True)
+    assert Calculations.history.view()._columns.values1 == ['4']  # pylint: disable=protected-access
+    entry = Calculations.get_latest()
+    assert entry.value1 == Decimal('4') and entry.value2 == Decimal('1.5') and entry.result == Decimal('2.5')
+    assert Calculations.history.view()._columns.values1 == [Decimal('4')]  # pylint: disable=protected-access
+
+def test_load_history_does_not_log_dataframe(caplog):
+    """Test that the loader logs a row count instead of the whole frame."""
+    _write_history_file([("1 add 1", 2)])
+    with caplog.at_level('INFO'):
+        Calculations.load_history(file_name=TEST_HISTORY_FILE_PATH)
+    assert "(1 rows)" in caplog.text
+    assert "Loaded data from CSV" not in caplog.text
+
+def test_find_by_operation_with_commands():
+    """Test that find_by_operation works for Command objects, not only Calculations."""
+    Calculations.clear_history()
+    Calculations.add_calculation(AddCommand(Decimal('1'), Decimal('2')))
+    Calculations.add_calculation(Calculation(Decimal('3'), Decimal('4'), add))
+    Calculations.add_calculation(MultiplyCommand(Decimal('3'), Decimal('4')))
+    assert [entry.value1 for entry in Calculations.find_by_operation("add")] == [Decimal('1'), Decimal('3')]
+
+def test_find_by_result_and_time_range():
+    """Test the result-range and insertion-time queries."""
+    Calculations.clear_history()
+    start = time.time()
+    Calculations.add_calculation(AddCommand(Decimal('1'), Decimal('2')))
+    Calculations.add_calculation(MultiplyCommand(Decimal('3'), Decimal('4')))
+    assert [entry.result for entry in Calculations.find_by_result_range(Decimal('0'), Decimal('5'))] == [Decimal('3')]
+    assert len(Calculations.find_by_time_range(start, time.time() + 1)) == 2
+    assert not Calculations.find_by_time_range(0, start - 1)
+
+def test_delete_calculation_keeps_indexes_and_watermark():
+    """Test that deleting a calculation updates the queries and the persisted-row watermark."""
+    Calculations.clear_history()
+    Calculations.add_calculation(AddCommand(Decimal('1'), Decimal('2')))
+    Calculations.add_calculation(MultiplyCommand(Decimal('3'), Decimal('4')))
+    Calculations.flush_history(file_name=TEST_HISTORY_FILE_PATH)
+    Calculations.delete_calculation(0)
+    assert not Calculations.find_by_operation("add")
+    assert len(Calculations.find_by_operation("multiply")) == 1
+    Calculations.add_calculation(AddCommand(Decimal('5'), Decimal('5')))
+    assert Calculations.flush_history(file_name=TEST_HISTORY_FILE_PATH) == 1
+
+@pytest.mark.usefixtures("setup_calculations")
+def test_load_history_rebuilds_indexes():
+    """Test that the indexes describe the loaded rows after a load."""
+    Calculations.save_history(file_name=TEST_HISTORY_FILE_PATH)
+    Calculations.add_calculation(MultiplyCommand(Decimal('3'), Decimal('4')))
+    Calculations.load_history(file_name=TEST_HISTORY_FILE_PATH)
+    assert not Calculations.find_by_operation("multiply")
+    assert len(Calculations.find_by_operation("add")) == 1
+
+def test_saving_does_not_execute_again(tmp_path):
+    """Test that a command executed before it is added to the history is not executed again when saved."""
+    Calculations.clear_history()
+    command = MultiplyCommand(Decimal('1.5'), Decimal('4'))
+    command.execute()
+    with mock.patch.object(MultiplyCommand, 'execute', side_effect=AssertionError("executed again")):
+        Calculations.add_calculation(command)
+        Calculations.save_history(str(tmp_path / "history.csv"))
+        assert Calculations.get_latest().result == Decimal('6.0')
+    assert pd.read_csv(tmp_path / "history.csv", dtype=str)['result'].tolist() == ['6.0']
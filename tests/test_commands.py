@@ -3,8 +3,14 @@ This module contains tests for the various command classes in the calculator app
 It verifies the correct behavior of arithmetic operations and error handling.
 """
 
+import decimal
+from decimal import Decimal
+from fractions import Fraction
 import pytest
-from calculator.commands import Command, AddCommand, SubtractCommand, MultiplyCommand, DivideCommand
+from calculator.commands import (
+    Command, AddCommand, SubtractCommand, MultiplyCommand, DivideCommand, PipelineCommand, ProductCommand, SumCommand
+)
+from calculator.calculations import Calculations
 
 def test_command_execute_not_implemented():
     """
@@ -49,3 +55,131 @@ def test_divide_command_by_zero_repr():
     divide_command = DivideCommand(10, 0)
     with pytest.raises(ValueError, match="Cannot divide by zero"):
         divide_command.execute()
+
+def test_result_is_computed_once():
+    """
+    Test that execute, result and repr share one computation cached on the command.
+    """
+    calls = []
+
+    def counting_division(value1, value2):
+        calls.append((value1, value2))
+        return value1 / value2
+
+    divide_command = DivideCommand(9, 3, strategy=counting_division)
+    assert divide_command.execute() == 3
+    assert divide_command.result == 3
+    assert repr(divide_command) == "Divide 9 by 3 = 3.0"
+    assert divide_command.execute() == 3
+    assert len(calls) == 1
+
+def test_operands_are_frozen_once_computed():
+    """
+    Test that the operands of a command cannot change after its result is cached.
+    """
+    add_command = AddCommand(1, 2)
+    add_command.value1 = 5  # Still allowed before the result is computed
+    assert add_command.result == 7
+    with pytest.raises(AttributeError, match="Cannot change value2"):
+        add_command.value2 = 3
+    assert add_command.result == 7
+
+def test_plugin_style_command_result_is_cached():
+    """
+    Test that the result property caches the result of commands without a decorated execute.
+    """
+    class CountingCommand(Command):
+        """A command counting its executions."""
+        executions = 0
+
+        def execute(self):
+            CountingCommand.executions += 1
+            return 42
+
+    command = CountingCommand()
+    assert command.result == 42 and command.result == 42
+    assert CountingCommand.executions == 1
+
+def test_exact_sum_rounds_once():
+    """
+    Test that the default summation is exact and rounded once, unlike a chain of AddCommands.
+    """
+    values = [Decimal('1e30'), Decimal(1), Decimal('-1e30')] * 3
+    chained = Decimal(0)
+    for value in values:
+        chained = AddCommand(chained, value).execute()
+    assert SumCommand(values).execute() == 3 and chained != 3
+    assert SumCommand([Decimal('0.1')] * 10, start=Decimal(5)).execute() == Decimal('6.0')
+    with decimal.localcontext() as context:
+        context.prec = 3
+        assert SumCommand([Decimal('1.001')] * 10).execute() == Decimal('10.0')
+    assert SumCommand([Fraction(1, 3)] * 3).execute() == 1
+    assert SumCommand([0.1] * 10).execute() == 1.0
+    assert SumCommand([]).execute() == 0
+
+def test_sum_strategies():
+    """
+    Test the pairwise and float summation strategies and that the strategy is kept on the command.
+    """
+    values = [Decimal(value) / 7 for value in range(1, 1001)]
+    exact = SumCommand(values).execute()
+    pairwise = SumCommand(values, strategy=SumCommand.pairwise_sum).execute()
+    assert abs(pairwise - exact) < Decimal('1e-20')
+    assert SumCommand(values, strategy=SumCommand.float_sum).execute() == pytest.approx(float(exact))
+    assert SumCommand([Decimal(1)] * 5, strategy=SumCommand.pairwise_sum).execute() == 5
+    assert SumCommand([], start=Decimal(2), strategy=SumCommand.pairwise_sum).execute() == 2
+    assert repr(SumCommand([1, 2, 3])) == "Sum of 3 values = 6"
+
+def test_product_strategies():
+    """
+    Test that products match a chain of MultiplyCommands, and the pairwise and float strategies.
+    """
+    values = [Decimal(value) / 3 for value in range(1, 30)]
+    chained = Decimal(1)
+    for value in values:
+        chained = MultiplyCommand(chained, value).execute()
+    assert ProductCommand(values).execute() == chained
+    assert ProductCommand([Fraction(2, 3)] * 7, strategy=ProductCommand.pairwise_product).execute() == Fraction(2, 3) ** 7
+    assert ProductCommand(values, strategy=ProductCommand.float_product).execute() == pytest.approx(float(chained))
+    assert ProductCommand([], start=Decimal(4), strategy=ProductCommand.pairwise_product).execute() == 4
+    assert repr(ProductCommand([2, 3], start=2)) == "Product of 2 values = 12"
+
+def test_pipeline_command():
+    """
+    Test that a pipeline gives the result of the equivalent chain of binary commands.
+    """
+    steps = [('add', Decimal(3)), ('multiply', Decimal(4)), ('subtract', Decimal(1)), ('divide', Decimal(2))]
+    pipeline = PipelineCommand(Decimal(2), steps)
+    chained = DivideCommand(SubtractCommand(MultiplyCommand(AddCommand(Decimal(2), Decimal(3)).execute(),
+                                                            Decimal(4)).execute(), Decimal(1)).execute(), Decimal(2))
+    assert pipeline.execute() == chained.execute() == Decimal('9.5')
+    assert repr(pipeline) == "Pipeline 2 add 3 multiply 4 subtract 1 divide 2 = 9.5"
+    with pytest.raises(ValueError, match="Cannot divide by zero"):
+        PipelineCommand(Decimal(1), [('divide', Decimal(0))]).execute()
+    with pytest.raises(ValueError, match="Unknown pipeline operation: power"):
+        PipelineCommand(Decimal(1), [('power', Decimal(2))])
+
+def test_fused_commands_are_one_history_entry(tmp_path):
+    """
+    Test that each fused command is recorded as one entry, which survives saving and loading.
+    """
+    Calculations.clear_history()
+    commands = [SumCommand([Decimal(value) for value in range(10_000)]),
+                ProductCommand([Decimal(2)] * 10, strategy=ProductCommand.pairwise_product),
+                PipelineCommand(Decimal(2), [('add', Decimal(3)), ('multiply', Decimal(4))])]
+    for command in commands:
+        command.execute()
+        Calculations.add_calculation(command)
+    assert len(Calculations.history) == 3
+    assert [(entry.operation_name, entry.result) for entry in Calculations.get_history()] == [
+        ('sum', 49_995_000), ('product', 1024), ('pipeline', 20)
+    ]
+    for file_name in ("history.csv", "history.db"):
+        path = str(tmp_path / file_name)
+        Calculations.save_history(path)
+        for lazy in (False, True):
+            Calculations.load_history(path, lazy=lazy)
+            history = Calculations.get_history()
+            assert list(history) == commands
+            assert [entry.materialize().execute() for entry in history] == [49_995_000, 1024, 20]
+    Calculations.clear_history()
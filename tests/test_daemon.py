@@ -0,0 +1,114 @@
+"""
+This module contains tests for the calculator daemon and its thin client.
+"""
+
+import os
+import sys
+import stat
+import socket
+import threading
+import subprocess
+from decimal import Decimal
+import pytest
+from calculator import client, daemon
+from calculator.calculations import Calculations
+from calculator.calculator import Calculator
+
+# Suppress pylint warnings for redefined fixture names
+# pylint: disable=redefined-outer-name
+
+@pytest.fixture
+def socket_path(tmp_path):
+    """Run a daemon on a temporary socket for the duration of a test."""
+    path = str(tmp_path / "calculator.sock")
+    server = daemon.create_server(path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+@pytest.mark.parametrize("request_object, expected", [
+    ({"operation": "add", "value1": "4", "value2": "4"}, {"result": "8"}),
+    ({"operation": "DIVIDE", "value1": 1, "value2": 4}, {"result": "0.25"}),
+    ({"expression": "(3 + 4) * 2 / 7"}, {"result": "2"}),
+    ({"expression": "5"}, {"result": "5"}),
+    ({"operation": "divide", "value1": "1", "value2": "0"}, {"error": "Cannot divide by zero."}),
+    ({"operation": "power", "value1": "1", "value2": "0"}, {"error": "Unknown operation: power"}),
+    ({"operation": "add", "value1": "x", "value2": "1"}, {"error": "Invalid number input"}),
+    ({"operation": "add", "value1": "1"}, {"error": "Malformed request"}),
+    ({"operation": "multiply", "value1": "1e999999", "value2": "1e999999"}, {"error": "Arithmetic error: Overflow"}),
+])
+def test_handle_request(request_object, expected):
+    """Test evaluation of individual requests."""
+    assert daemon.handle_request(request_object) == expected
+
+def test_handle_request_records_history():
+    """Test that requests go through the Calculator singleton and the history."""
+    Calculations.clear_history()
+    before = len(Calculator().history)
+    daemon.handle_request({"operation": "multiply", "value1": "3", "value2": "5"})
+    assert len(Calculator().history) == before + 1
+    assert Calculations.get_latest().result == Decimal("15")
+
+@pytest.mark.parametrize("line", [b"not json\n", b"[1, 2]\n"])
+def test_handle_line_malformed(line):
+    """Test that lines that are not JSON objects get an error response."""
+    assert daemon.handle_line(line) == b'{"error": "Malformed request"}\n'
+
+def test_handle_line_arithmetic_error():
+    """Test that an overflowing request gets an error response instead of dropping the connection."""
+    line = b'{"operation": "multiply", "value1": "1e999999", "value2": "1e999999"}\n'
+    assert daemon.handle_line(line) == b'{"error": "Arithmetic error: Overflow"}\n'
+
+def test_socket_is_private(socket_path):
+    """Test that only the owner of the daemon can use its socket."""
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+def test_create_server_keeps_other_files(socket_path, tmp_path):
+    """Test that a running daemon's socket and files that are not sockets are never removed."""
+    with pytest.raises(FileExistsError, match="already listening"):
+        daemon.create_server(socket_path)
+    assert client.send_request({"expression": "1 + 1"}, socket_path) == {"result": "2"}
+    other = tmp_path / "notes.txt"
+    other.write_text("keep me")
+    with pytest.raises(FileExistsError, match="not a socket"):
+        daemon.create_server(str(other))
+    assert other.read_text() == "keep me"
+
+def test_create_server_replaces_stale_socket(tmp_path):
+    """Test that a socket file left by a daemon that is gone is replaced."""
+    path = str(tmp_path / "stale.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(path)
+    server = daemon.create_server(path)
+    server.server_close()
+
+def test_client_round_trip(socket_path, capsys):
+    """Test that the client gets answers from a running daemon."""
+    assert client.send_request({"operation": "subtract", "value1": "9", "value2": "4"}, socket_path) == {"result": "5"}
+    assert client.main(["2 * 21"], socket_path) == 0
+    assert client.main(["divide", "1", "0"], socket_path) == 1
+    captured = capsys.readouterr()
+    assert captured.out.strip() == "42"
+    assert "Cannot divide by zero" in captured.err
+
+def test_client_usage_and_unreachable_daemon(tmp_path):
+    """Test the client's exit codes for bad arguments and a missing daemon."""
+    assert client.main(["add", "1"]) == 2
+    assert client.main(["1 + 1"], str(tmp_path / "missing.sock")) == 2
+
+def test_client_imports_stay_minimal():
+    """Test that importing the client does not pull in pandas, numpy or the calculator core."""
+    code = "import sys, calculator.client; print(sorted(m for m in ('pandas', 'numpy', 'calculator.calculations') if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
+
+def test_serve_cleans_up_on_interrupt(tmp_path, mocker):
+    """Test that serve removes its socket and flushes the history when interrupted."""
+    path = str(tmp_path / "calculator.sock")
+    mocker.patch("socketserver.BaseServer.serve_forever", side_effect=KeyboardInterrupt)
+    flush = mocker.patch.object(Calculations, "flush_history")
+    daemon.serve(path, history_file=str(tmp_path / "history.csv"))
+    assert not (tmp_path / "calculator.sock").exists()
+    flush.assert_called_once_with(file_name=str(tmp_path / "history.csv"))
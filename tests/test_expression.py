@@ -0,0 +1,98 @@
+"""
+This module contains tests for the expression parser and compiled evaluator.
+It verifies operator precedence, the Command tree produced by the parser, and the expression caches.
+"""
+
+from decimal import Decimal
+from fractions import Fraction
+import pytest
+from calculator.numeric import get_backend
+from calculator.commands import AddCommand, SubtractCommand, MultiplyCommand, DivideCommand
+from calculator.expression import (
+    compile_expression, evaluate_expression, is_expression, parse_expression
+)
+
+@pytest.mark.parametrize("expression, expected", [
+    ("1 + 2", Decimal("3")),
+    ("2 + 3 * 4", Decimal("14")),
+    ("(2 + 3) * 4", Decimal("20")),
+    ("(3 + 4) * 2 / 7", Decimal("2")),
+    ("10 - 4 - 3", Decimal("3")),
+    ("-(2 + 3)", Decimal("-5")),
+    ("-2 * -3", Decimal("6")),
+    ("1.5e2 / .5", Decimal("300")),
+    ("42", Decimal("42")),
+])
+def test_evaluate_expression(expression, expected):
+    """Test that expressions evaluate with the usual precedence and associativity."""
+    assert evaluate_expression(expression) == expected
+
+@pytest.mark.parametrize("backend, expression, expected", [
+    (get_backend("fraction"), "(1 / 3) * 3", Fraction(1)),
+    (get_backend("fraction"), "1 / 3 + 1 / 6", Fraction(1, 2)),
+    (get_backend("fraction"), "-0.25", Fraction(-1, 4)),
+    (get_backend("float"), "(0.1 + 0.2) * 1", 0.30000000000000004),
+    (get_backend("decimal", precision=5), "(1 / 3) * 3", Decimal("0.99999")),
+])
+def test_evaluate_expression_with_backend(backend, expression, expected):
+    """Test that numbers and inner commands of an expression use the given numeric backend."""
+    result = evaluate_expression(expression, backend)
+    assert result == expected and type(result) is type(expected)
+
+def test_parse_expression_builds_command_tree():
+    """Test that the parser produces a tree of the existing Command classes."""
+    tree = parse_expression("(1 + 2) * 3 - 4 / 5")
+    assert tree == (
+        SubtractCommand,
+        (MultiplyCommand, (AddCommand, Decimal("1"), Decimal("2")), Decimal("3")),
+        (DivideCommand, Decimal("4"), Decimal("5")),
+    )
+
+def test_compiled_expression_returns_outermost_command():
+    """Test that the compiled form builds the outermost command with evaluated operands."""
+    command = compile_expression("(1 + 2) * 4")()
+    assert isinstance(command, MultiplyCommand)
+    assert command.value1 == Decimal("3") and command.value2 == Decimal("4")
+
+def test_expression_cache_hits():
+    """Test that repeated expressions are served from the cache without parsing again."""
+    compile_expression.cache_clear()
+    parse_expression.cache_clear()
+    for _ in range(3):
+        evaluate_expression("7 * 6")
+    assert compile_expression.cache_info().hits == 2
+    assert parse_expression.cache_info().misses == 1
+
+@pytest.mark.parametrize("expression", ["", "1 +", "(1 + 2", "1 + 2)", "1 $ 2", "* 3", "1 2"])
+def test_invalid_expressions(expression):
+    """Test that malformed expressions raise a ValueError."""
+    with pytest.raises(ValueError, match="Invalid expression"):
+        evaluate_expression(expression)
+
+@pytest.mark.parametrize("expression, message", [
+    ("(" * 101 + "1" + ")" * 101, "nested more than 100 levels"),
+    ("-" * 101 + "1", "nested more than 100 levels"),
+    (" + ".join(["1"] * 258), "more than 256 nested operations"),
+])
+def test_deeply_nested_expressions(expression, message):
+    """Test that expressions too deep to evaluate raise a ValueError instead of a RecursionError."""
+    with pytest.raises(ValueError, match=message):
+        evaluate_expression(expression)
+    assert evaluate_expression("(" * 100 + "1" + ")" * 100) == 1
+    assert evaluate_expression(" + ".join(["1"] * 257)) == 257
+
+def test_division_by_zero_in_expression():
+    """Test that division by zero inside an expression is reported by DivideCommand."""
+    with pytest.raises(ValueError, match="Cannot divide by zero"):
+        evaluate_expression("1 / (3 - 3)")
+
+@pytest.mark.parametrize("text, expected", [
+    ("(3 + 4) * 2", True),
+    ("-1", True),
+    ("history", False),
+    ("add", False),
+    ("+", False),
+])
+def test_is_expression(text, expected):
+    """Test that REPL input is recognised as an expression only when it contains a number."""
+    assert is_expression(text) == expected
@@ -0,0 +1,81 @@
+"""
+This module contains tests for saving and loading the history in CSV, Parquet and Feather formats.
+"""
+
+from decimal import Decimal
+import pytest
+from calculator.calculations import Calculations
+from calculator.commands import AddCommand, DivideCommand, MultiplyCommand
+from calculator.history_formats import history_format, read_frame
+
+@pytest.fixture
+def history():
+    """Fill the history with commands whose results need exact Decimal storage."""
+    Calculations.clear_history()
+    Calculations.add_calculation(AddCommand(Decimal('0.1'), Decimal('0.2')))
+    Calculations.add_calculation(DivideCommand(Decimal('1'), Decimal('3')))
+    Calculations.add_calculation(MultiplyCommand(Decimal('2.50'), Decimal('4')))
+    yield
+    Calculations.clear_history()
+
+@pytest.mark.parametrize("file_name, expected", [
+    ("history.csv", "csv"),
+    ("history.parquet", "parquet"),
+    ("HISTORY.FEATHER", "feather"),
+    ("history", "csv"),
+])
+def test_history_format(file_name, expected):
+    """Test that the format is selected by file extension."""
+    assert history_format(file_name) == expected
+
+@pytest.mark.usefixtures("history")
+@pytest.mark.parametrize("extension", [".parquet", ".feather"])
+def test_binary_round_trip_is_exact(tmp_path, extension):
+    """Test that binary formats keep separate typed columns and exact Decimal values."""
+    file_name = str(tmp_path / f"history{extension}")
+    Calculations.save_history(file_name=file_name)
+    frame = read_frame(file_name)
+    assert list(frame.columns) == ['op', 'value1', 'value2', 'result']
+    assert list(frame['op']) == ['add', 'divide', 'multiply']
+
+    expected = [(entry.operation_name, entry.value1, entry.value2, entry.result) for entry in Calculations.get_history()]
+    Calculations.load_history(file_name=file_name)
+    loaded = [(entry.operation_name, entry.value1, entry.value2, entry.result) for entry in Calculations.get_history()]
+    assert loaded == expected
+    assert str(loaded[2][1]) == '2.50'
+
+@pytest.mark.usefixtures("history")
+def test_column_projection(tmp_path):
+    """Test that only the requested columns are read from a binary history file."""
+    file_name = str(tmp_path / "history.parquet")
+    Calculations.save_history(file_name=file_name)
+    frame = Calculations.read_history_columns(file_name=file_name, columns=['op', 'result'])
+    assert list(frame.columns) == ['op', 'result']
+    assert frame['result'].iloc[0] == '0.3'
+
+@pytest.mark.usefixtures("history")
+def test_save_binary_deduplicates(tmp_path):
+    """Test that saving twice does not duplicate rows in a binary file."""
+    file_name = str(tmp_path / "history.feather")
+    Calculations.save_history(file_name=file_name)
+    Calculations.save_history(file_name=file_name)
+    assert len(read_frame(file_name)) == 3
+
+@pytest.mark.usefixtures("history")
+def test_flush_binary_appends_new_rows(tmp_path):
+    """Test that flushing to a binary file adds only the new rows."""
+    file_name = str(tmp_path / "history.parquet")
+    assert Calculations.flush_history(file_name=file_name) == 3
+    Calculations.add_calculation(AddCommand(Decimal('1'), Decimal('1')))
+    assert Calculations.flush_history(file_name=file_name) == 1
+    assert list(read_frame(file_name, columns=['result'])['result']) == [
+        '0.3', '0.3333333333333333333333333333', '10.00', '2'
+    ]
+
+def test_load_corrupt_binary_file(tmp_path, caplog):
+    """Test that an unreadable binary file is reported in the logs instead of raising."""
+    file_name = str(tmp_path / "history.parquet")
+    with open(file_name, 'w', encoding='utf-8') as history_file:
+        history_file.write("not parquet")
+    Calculations.load_history(file_name=file_name)
+    assert any("Error loading calculation history" in record.message for record in caplog.records)
@@ -0,0 +1,105 @@
+"""
+This module contains tests for the row hash index of history files.
+It checks the sidecar file, deduplicating saves in O(new rows) and threshold compaction.
+"""
+
+from decimal import Decimal
+import pytest
+from calculator.calculations import Calculations
+from calculator.commands import AddCommand, MultiplyCommand
+from calculator.history_index import SIDECAR_SUFFIX, RowHashIndex, row_hashes
+
+@pytest.fixture(autouse=True)
+def history():
+    """Start each test with an empty history and no cached row indexes."""
+    Calculations.clear_history()
+    Calculations._row_indexes.clear()  # pylint: disable=protected-access
+    yield
+    Calculations.clear_history()
+    Calculations._row_indexes.clear()  # pylint: disable=protected-access
+
+def add_commands(*pairs):
+    """Add an AddCommand to the history for each (value1, value2) pair."""
+    for value1, value2 in pairs:
+        Calculations.add_calculation(AddCommand(Decimal(value1), Decimal(value2)))
+
+def test_row_hashes_are_stable_and_distinct():
+    """Test that hashes are 64-bit, deterministic and depend on every field."""
+    hashes = row_hashes([('1 add 2', '3'), ('1 add 2', '3'), ('1 add 23', ''), ('1 add 2', '4')])
+    assert hashes[0] == hashes[1] and len(set(hashes)) == 3
+    assert all(0 <= row_hash < 2 ** 64 for row_hash in hashes)
+
+def test_sidecar_round_trip_and_staleness(tmp_path):
+    """Test that a saved index loads back, and is rejected once the history file changes."""
+    file_name = tmp_path / "history.csv"
+    file_name.write_text("operation,result\n1 add 2,3\n", encoding="utf-8")
+    index = RowHashIndex(str(file_name))
+    index.rebuild(row_hashes([('1 add 2', '3'), ('1 add 2', '3')]))
+    index.save()
+    index.add(row_hashes([('2 add 2', '4')]))
+    index.save()  # Appends the new hash and rewrites the header only
+
+    loaded = RowHashIndex(str(file_name))
+    assert loaded.load()
+    assert (loaded.rows, loaded.duplicates, list(loaded.hashes)) == (3, 1, list(index.hashes))
+    assert loaded.unseen(row_hashes([('2 add 2', '4'), ('5 add 5', '10'), ('5 add 5', '10')])) == [1]
+
+    with open(file_name, 'a', encoding='utf-8') as history_file:
+        history_file.write("9 add 9,18\n")
+    assert not RowHashIndex(str(file_name)).load()
+
+def test_save_skips_rows_already_in_the_file(tmp_path, mocker):
+    """Test that repeated saves append only new rows and do not read the file back."""
+    file_name = str(tmp_path / "history.csv")
+    add_commands(('1', '2'), ('1', '2'), ('3', '4'))
+    Calculations.save_history(file_name=file_name)
+    read_frame = mocker.patch("calculator.calculations.read_frame")
+    add_commands(('5', '6'))
+    Calculations.save_history(file_name=file_name)
+    Calculations._row_indexes.clear()  # pylint: disable=protected-access
+    Calculations.save_history(file_name=file_name)  # Loads the sidecar instead of the file
+    read_frame.assert_not_called()
+    with open(file_name, encoding="utf-8") as history_file:
+        assert history_file.read().splitlines() == ["operation,result", "1 add 2,3", "3 add 4,7", "5 add 6,11"]
+    assert (tmp_path / f"history.csv{SIDECAR_SUFFIX}").exists()
+
+def test_index_is_rebuilt_after_outside_changes(tmp_path):
+    """Test that rows written without the index are recognized after a rebuild."""
+    file_name = tmp_path / "history.csv"
+    add_commands(('1', '2'))
+    Calculations.save_history(file_name=str(file_name))
+    with open(file_name, 'a', encoding='utf-8') as history_file:
+        history_file.write("3 add 4,7\n")
+    add_commands(('3', '4'))
+    Calculations.save_history(file_name=str(file_name))
+    assert file_name.read_text(encoding="utf-8").splitlines() == ["operation,result", "1 add 2,3", "3 add 4,7"]
+
+def test_flush_keeps_index_in_step_and_save_compacts(tmp_path):
+    """Test that duplicates left by flushes are counted and compacted past the threshold."""
+    file_name = str(tmp_path / "history.csv")
+    add_commands(('1', '2'), ('3', '4'))
+    Calculations.save_history(file_name=file_name)
+    for _ in range(2):
+        Calculations.clear_history()
+        add_commands(('1', '2'))
+        Calculations.flush_history(file_name=file_name)
+    index = Calculations._row_index(file_name)  # pylint: disable=protected-access
+    assert (index.rows, index.duplicates) == (4, 2)
+
+    Calculations.save_history(file_name=file_name)
+    with open(file_name, encoding="utf-8") as history_file:
+        assert history_file.read().splitlines() == ["operation,result", "1 add 2,3", "3 add 4,7"]
+    index = Calculations._row_index(file_name)  # pylint: disable=protected-access
+    assert (index.rows, index.duplicates) == (2, 0)
+
+def test_parquet_file_is_not_rewritten_without_new_rows(tmp_path, mocker):
+    """Test that saving a binary history with nothing new leaves the file alone."""
+    pytest.importorskip("pyarrow")
+    file_name = str(tmp_path / "history.parquet")
+    add_commands(('1', '2'))
+    Calculations.add_calculation(MultiplyCommand(Decimal('2'), Decimal('3')))
+    Calculations.save_history(file_name=file_name)
+    write_frame = mocker.patch("calculator.calculations.write_frame")
+    Calculations.save_history(file_name=file_name)
+    write_frame.assert_not_called()
+    assert list(Calculations.read_history_columns(file_name)['result']) == ['3', '6']
@@ -0,0 +1,104 @@
+"""
+This module contains tests for the SQLite history backend.
+It checks the schema and WAL mode, exact round trips, incremental writes, indexed queries and
+compaction.
+"""
+
+import sqlite3
+import time
+import threading
+from decimal import Decimal
+import pytest
+from calculator import history_sqlite
+from calculator.calculations import Calculations
+from calculator.commands import AddCommand, DivideCommand, MultiplyCommand
+from calculator.history_formats import history_format, is_binary
+
+@pytest.fixture
+def history():
+    """Fill the history with commands whose results need exact Decimal storage."""
+    Calculations.clear_history()
+    for command_class, value1, value2 in ((AddCommand, '0.1', '0.2'), (DivideCommand, '1', '3'),
+                                          (MultiplyCommand, '2.50', '4')):
+        Calculations.add_calculation(command_class(Decimal(value1), Decimal(value2)))
+    yield
+    Calculations.clear_history()
+
+@pytest.mark.parametrize("file_name", ["history.db", "history.sqlite", "HISTORY.SQLITE3"])
+def test_sqlite_format_is_chosen_by_extension(file_name):
+    """Test that SQLite files are recognized and not treated as rewritable binary files."""
+    assert history_format(file_name) == 'sqlite'
+    assert not is_binary(file_name)
+
+def test_schema_indexes_and_wal(tmp_path):
+    """Test that a new database is in WAL mode with its operation and timestamp indexes."""
+    file_name = str(tmp_path / "history.db")
+    history_sqlite.connect(file_name).close()
+    with sqlite3.connect(file_name) as connection:
+        assert connection.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        plan = connection.execute(
+            "EXPLAIN QUERY PLAN " + history_sqlite.query(operation='add', start=0.0)[0], ['add', 0.0]
+        ).fetchall()
+    connection.close()
+    assert {'calculations_operation', 'calculations_created_at'} <= indexes
+    assert any('USING INDEX' in row[-1] for row in plan)
+
+@pytest.mark.usefixtures("history")
+def test_round_trip_is_exact(tmp_path):
+    """Test that saving and loading a database keeps exact Decimal values."""
+    file_name = str(tmp_path / "history.db")
+    Calculations.save_history(file_name=file_name)
+    Calculations.load_history(file_name=file_name)
+    assert [(entry.operation_name, entry.result) for entry in Calculations.get_history()] == [
+        ('add', Decimal('0.3')),
+        ('divide', Decimal('1') / Decimal('3')),
+        ('multiply', Decimal('10.00')),
+    ]
+    assert list(Calculations.read_history_columns(file_name, columns=['op'])['op']) == ['add', 'divide', 'multiply']
+
+@pytest.mark.usefixtures("history")
+def test_flush_appends_only_new_rows(tmp_path):
+    """Test that flushing and saving insert only the calculations the database does not hold yet."""
+    file_name = str(tmp_path / "history.sqlite")
+    assert Calculations.flush_history(file_name=file_name) == 3
+    Calculations.add_calculation(AddCommand(Decimal('5'), Decimal('5')))
+    Calculations.save_history(file_name=file_name)
+    Calculations.save_history(file_name=file_name)
+    assert list(history_sqlite.read_frame(file_name)['result']) == ['0.3', str(Decimal(1) / Decimal(3)), '10.00', '10']
+
+def test_filtered_queries(tmp_path):
+    """Test reading rows by operation, time range and session."""
+    file_name = str(tmp_path / "history.db")
+    history_sqlite.write_rows(file_name, [('add', 1, 2, 3), ('multiply', 2, 3, 6)], [10.0, 20.0], session_id='a')
+    history_sqlite.write_rows(file_name, [('add', 4, 4, 8)], [30.0], session_id='b')
+    assert list(history_sqlite.read_frame(file_name, operation='add')['result']) == ['3', '8']
+    assert list(history_sqlite.read_frame(file_name, start=15.0, end=30.0)['op']) == ['multiply']
+    assert list(history_sqlite.read_frame(file_name, session_id='b')['value1']) == ['4']
+    chunks = list(history_sqlite.read_frame(file_name, columns=['result'], chunksize=2))
+    assert [list(chunk['result']) for chunk in chunks] == [['3', '6'], ['8']]
+    with pytest.raises(ValueError, match="Unknown history columns"):
+        history_sqlite.read_frame(file_name, columns=['operation'])
+
+def test_concurrent_reader_during_writes(tmp_path):
+    """Test that a reader sees committed rows while another thread keeps writing."""
+    file_name = str(tmp_path / "history.db")
+    history_sqlite.write_rows(file_name, [('add', 1, 1, 2)])
+
+    def write():
+        for value in range(20):
+            history_sqlite.write_rows(file_name, [('add', value, 0, value)] * 50)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    counts = [len(history_sqlite.read_frame(file_name, columns=['op'])) for _ in range(20)]
+    writer.join()
+    assert counts == sorted(counts) and all((count - 1) % 50 == 0 for count in counts)
+    assert len(history_sqlite.read_frame(file_name)) == 1001
+
+def test_compact_removes_duplicates(tmp_path):
+    """Test that compaction keeps the first of each repeated calculation."""
+    file_name = str(tmp_path / "history.db")
+    history_sqlite.write_rows(file_name, [('add', 1, 1, 2), ('add', 1, 1, 2), ('subtract', 1, 1, 0)], [time.time()] * 3)
+    assert Calculations.compact_history(file_name=file_name) == 1
+    assert list(history_sqlite.read_frame(file_name)['op']) == ['add', 'subtract']
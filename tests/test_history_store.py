@@ -0,0 +1,228 @@
+"""
+This module contains tests for the columnar history store and its row and range views.
+"""
+
+import gc
+import threading
+from decimal import Decimal
+import pytest
+from calculator.calculation import Calculation
+from calculator.commands import AddCommand, DivideCommand, MultiplyCommand, SubtractCommand
+from calculator.history_store import PAGED_SEGMENTS, HistoryEntry, HistoryStore, command_kind, describe, kind_of
+from calculator.operations import add, multiply
+
+# Suppress pylint warnings for redefined fixture names
+# pylint: disable=redefined-outer-name
+
+@pytest.fixture
+def store():
+    """Return a store holding a Calculation and two Commands."""
+    history = HistoryStore()
+    history.append(Calculation(Decimal('2'), Decimal('3'), multiply))
+    history.append(AddCommand(Decimal('1'), Decimal('2')))
+    history.append(DivideCommand(Decimal('7'), Decimal('2'), strategy=DivideCommand.integer_division))
+    return history
+
+def test_entries_expose_operands_and_results(store):
+    """Test that row views expose the operands, operation name and result of each entry."""
+    assert [(entry.operation_name, entry.result) for entry in store] == [
+        ('multiply', Decimal('6')), ('add', Decimal('3')), ('divide', Decimal('3'))
+    ]
+    assert store[-1].value1 == Decimal('7') and store[-1].value2 == Decimal('2')
+
+def test_entries_use_slots(store):
+    """Test that row views carry no per-instance dictionary."""
+    assert not hasattr(store[0], '__dict__')
+
+def test_kinds_are_interned(store):
+    """Test that each distinct operation kind is stored once."""
+    store.append(AddCommand(Decimal('5'), Decimal('5')))
+    assert len(store) == 4
+    assert len({entry.kind for entry in store}) == 3
+
+def test_results_are_cached(store, mocker):
+    """Test that a result is computed once and then read from the result column."""
+    spy = mocker.spy(AddCommand, 'execute')
+    assert store[1].result == Decimal('3')
+    assert store[1].result == Decimal('3')
+    assert spy.call_count == 1
+
+def test_known_results_are_not_recomputed():
+    """Test that rows appended with a known result never execute the command."""
+    history = HistoryStore()
+    history.append_row(command_kind(SubtractCommand), Decimal('5'), Decimal('1'), Decimal('4'))
+    assert history[0].result == Decimal('4')
+    assert isinstance(history[0].materialize(), SubtractCommand)
+
+def test_view_is_a_read_only_snapshot(store):
+    """Test that views are not affected by later appends or by clearing the store."""
+    view = store.view()
+    store.append(AddCommand(Decimal('9'), Decimal('9')))
+    assert len(view) == 3
+    store.clear()
+    assert len(store) == 0
+    assert view[0].operation_name == 'multiply'
+    assert not hasattr(view, 'append')
+
+def test_view_slicing(store):
+    """Test slicing and indexing of views."""
+    view = store.view()[1:]
+    assert len(view) == 2
+    assert view[0].operation_name == 'add'
+    with pytest.raises(IndexError):
+        _ = view[2]
+    assert [entry.operation_name for entry in store.view()[::2]] == ['multiply', 'divide']
+
+def test_entry_equality(store):
+    """Test that entries compare equal to equivalent entries, Calculations and Commands."""
+    assert store[1] == AddCommand(Decimal('1'), Decimal('2'))
+    assert store[0] == Calculation(Decimal('2'), Decimal('3'), multiply)
+    assert store[0] != store[1]
+    assert store[0] == store.view()[0] and hash(store[0]) == hash(store.view()[0])
+    assert store[0] != "multiply"
+
+def test_materialize_keeps_strategy(store):
+    """Test that materialized commands keep their division strategy."""
+    command = store[2].materialize()
+    assert isinstance(command, DivideCommand)
+    assert command.strategy is DivideCommand.integer_division
+
+def test_kind_of_default_strategy():
+    """Test that the default division strategy is stored as None."""
+    assert kind_of(DivideCommand(1, 2)) == command_kind(DivideCommand)
+    assert kind_of(Calculation(1, 2, add)) == ('add', Calculation, add)
+
+def test_describe(store):
+    """Test describe on entries and on plain calculations and commands."""
+    assert describe(store[0]) == ('multiply', Decimal('6'))
+    assert describe(AddCommand(2, 2)) == ('add', 4)
+    assert describe(Calculation(Decimal('1'), Decimal('1'), add)) == ('add', Decimal('2'))
+    assert isinstance(store[0], HistoryEntry)
+    assert repr(store[0]) == "HistoryEntry(2 multiply 3)"
+
+def test_operation_index(store):
+    """Test that operation lookups use the per-operation index and keep insertion order."""
+    store.append(DivideCommand(Decimal('1'), Decimal('4')))
+    store.append(AddCommand(Decimal('5'), Decimal('5')))
+    assert store.rows_for_operation('add') == [1, 4]
+    assert store.rows_for_operation('divide') == [2, 3]
+    assert not store.rows_for_operation('power')
+
+def test_result_range_index(store):
+    """Test result range lookups, including rows appended after the index was built."""
+    assert store.rows_in_result_range(Decimal('3'), Decimal('6')) == [1, 2, 0]
+    store.append(AddCommand(Decimal('2'), Decimal('2')))
+    store.append(DivideCommand(Decimal('1'), Decimal('0')))  # Has no result and is not indexed
+    assert store.rows_in_result_range(Decimal('3.5'), Decimal('10')) == [3, 0]
+
+def test_time_range_index(store, mocker):
+    """Test insertion-time lookups with bisect."""
+    mocker.patch('calculator.history_store.time.time', return_value=store.timestamp(2) + 10)
+    store.append(AddCommand(Decimal('5'), Decimal('5')))
+    assert store.rows_in_time_range(store.timestamp(3), store.timestamp(3) + 1) == [3]
+    assert store.rows_in_time_range(0, store.timestamp(3)) == [0, 1, 2]
+
+def test_delete_rebuilds_indexes(store):
+    """Test that deleting a row keeps every index consistent and leaves views untouched."""
+    view = store.view()
+    store.rows_in_result_range(0, 100)
+    store.delete(1)
+    assert len(store) == 2 and len(view) == 3
+    assert not store.rows_for_operation('add')
+    assert store.rows_for_operation('divide') == [1]
+    assert store.rows_in_result_range(0, 100) == [1, 0]
+    assert store.timestamp(1) == view._columns.timestamps[2]  # pylint: disable=protected-access
+    with pytest.raises(IndexError):
+        store.delete(5)
+
+def test_clear_resets_indexes(store):
+    """Test that clearing the store empties the indexes."""
+    store.clear()
+    assert not store.rows_for_operation('multiply')
+    assert not store.rows_in_result_range(0, 100)
+    assert not store.rows_in_time_range(0, float('inf'))
+
+def fill(history, count):
+    """Append count commands on the values 0 to count - 1, every third one a MultiplyCommand."""
+    for value in range(count):
+        command_class = MultiplyCommand if value % 3 == 0 else AddCommand
+        history.append(command_class(Decimal(value), Decimal('1')))
+    return history
+
+@pytest.fixture
+def windowed(tmp_path, mocker):
+    """Return a store with a window of 8 rows holding 30 rows, and an unbounded store with the same rows."""
+    clock = iter(list(range(30)) * 2)  # The same insertion times for both stores
+    mocker.patch('calculator.history_store.time.time', side_effect=lambda: float(next(clock)))
+    return fill(HistoryStore(window=8, spill_dir=str(tmp_path)), 30), fill(HistoryStore(), 30)
+
+def test_window_spills_oldest_rows_to_segments(windowed, tmp_path):
+    """Test that only the window stays in memory and the rest is spilled to segment files."""
+    history, _ = windowed
+    assert len(history) == 30 and history.spilled == 22
+    assert len(history.view()[22:]) == 8
+    assert len(list(tmp_path.glob("calculator-history-*/segment-*.pickle"))) == 11
+
+def test_windowed_store_reads_like_an_unbounded_one(windowed):
+    """Test that iteration, indexing and slicing page spilled rows back in transparently."""
+    history, unbounded = windowed
+    assert [(entry.operation_name, entry.value1, entry.result) for entry in history] == \
+        [(entry.operation_name, entry.value1, entry.result) for entry in unbounded]
+    assert history[0] == unbounded[0] and history[-1] == unbounded[-1]
+    assert list(history.view()[5:25]) == list(unbounded.view()[5:25])
+    assert [history.timestamp(row) for row in (0, 21, 22, -1)] == [unbounded.timestamp(row) for row in (0, 21, 22, -1)]
+    assert len(history._paged) <= PAGED_SEGMENTS  # pylint: disable=protected-access
+
+def test_windowed_store_queries(windowed):
+    """Test that operation, result and time queries cover the spilled rows."""
+    history, unbounded = windowed
+    assert history.rows_for_operation('multiply') == unbounded.rows_for_operation('multiply')
+    assert history.rows_in_result_range(Decimal('5'), Decimal('25')) == \
+        unbounded.rows_in_result_range(Decimal('5'), Decimal('25'))
+    assert history.rows_in_time_range(3.0, 27.0) == unbounded.rows_in_time_range(3.0, 27.0)
+    assert [entry.value1 for entry in history.entries([1, 29])] == [Decimal('1'), Decimal('29')]
+
+def test_windowed_store_delete(windowed):
+    """Test deleting spilled and in-memory rows."""
+    history, unbounded = windowed
+    for index in (3, 25, 0):
+        history.delete(index)
+        unbounded.delete(index)
+    assert list(history) == list(unbounded)
+    assert history.rows_for_operation('add') == unbounded.rows_for_operation('add')
+
+def test_bulk_rows_and_clear_release_segments(tmp_path):
+    """Test that bulk appends are spilled as they go and cleared segment files are deleted."""
+    history = HistoryStore(window=100, spill_dir=str(tmp_path))
+    code = history.code_for(command_kind(AddCommand))
+    history.extend_rows([code] * 1000, list(range(1000)), [1] * 1000, [None] * 1000)
+    assert len(history) == 1000 and history.spilled == 900
+    assert history[950].result == 951
+    history.clear()
+    gc.collect()
+    assert not list(tmp_path.glob("calculator-history-*/segment-*.pickle"))
+    with pytest.raises(ValueError, match="at least 1"):
+        history.set_window(0)
+
+def test_concurrent_appends_and_queries(tmp_path):
+    """Test that threads appending to and querying one windowed store lose no rows and keep its indexes whole."""
+    history = HistoryStore(window=64, spill_dir=str(tmp_path))
+    kinds = [command_kind(command_class) for command_class in (AddCommand, MultiplyCommand, SubtractCommand)]
+
+    def work(number):
+        for value in range(400):
+            history.append_row(kinds[value % 3], Decimal(number), Decimal(value))
+            if value % 100 == 0:
+                assert len(history.rows_in_result_range(Decimal(0), Decimal(10_000))) <= len(history)
+
+    threads = [threading.Thread(target=work, args=(number,)) for number in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(history) == 2400
+    assert sorted((entry.value1, entry.value2) for entry in history) == sorted(
+        (Decimal(number), Decimal(value)) for number in range(6) for value in range(400)
+    )
+    assert sorted(history.rows_for_operation('add') + history.rows_for_operation('multiply') +
+                  history.rows_for_operation('subtract')) == list(range(2400))
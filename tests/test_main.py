@@ -3,18 +3,26 @@ This module contains tests for the CalculatorApp class in the main application f
 It tests various functions to verify their expected output.
 """
 
+import io
+import logging
+import json
 from decimal import Decimal
 from unittest.mock import patch
 import pytest
-from main import CalculatorApp
+from main import CalculatorApp, main
 from calculator.calculations import Calculations
+from calculator.calculator import Calculator
+from calculator.metrics import metrics
+from calculator.async_logging import DeferredQueueHandler
 from calculator.commands import AddCommand, SubtractCommand, MultiplyCommand, DivideCommand
+from calculator.numeric import get_backend
 
-# Apply a fixture to mock save_history for all tests
+# Apply a fixture to mock save_history and flush_history for all tests
 @pytest.fixture(autouse=True)
 def mock_save_history():
-    """Fixture to automatically mock save_history to prevent file writes during tests."""
-    with patch.object(Calculations, 'save_history', return_value=None):
+    """Fixture to automatically mock save_history and flush_history to prevent file writes during tests."""
+    with patch.object(Calculations, 'save_history', return_value=None), \
+            patch.object(Calculations, 'flush_history', return_value=0):
         yield
 
 @pytest.mark.parametrize("a_string, b_string, operation_string, expected_string", [
@@ -26,7 +34,8 @@ def mock_save_history():
     ("1", "0", 'divide', "An error occurred: Cannot divide by zero."),
     ("9", "3", 'unknown', "Unknown operation: unknown."),
     ("a", "3", 'add', "Invalid number input: a or 3 is not a valid number."),
-    ("5", "b", 'subtract', "Invalid number input: 5 or b is not a valid number.")
+    ("5", "b", 'subtract', "Invalid number input: 5 or b is not a valid number."),
+    ("1e999999", "1e999999", 'multiply', "An error occurred: arithmetic error (Overflow).")
 ])
 def test_calculate_and_store(a_string, b_string, operation_string, expected_string, capsys):
     """Test the calculate_and_store function with various inputs."""
@@ -46,10 +55,13 @@ def test_display_menu(capsys):
         "  subtract: Subtract two numbers\n"
         "  multiply: Multiply two numbers\n"
         "  divide: Divide two numbers\n"
+        "  <expression>: Evaluate an expression, e.g. (3 + 4) * 2 / 7\n"
         "  history: View calculation history\n"
         "  clear_history: Clear calculation history\n"
         "  save_history: Save history to a file\n"
         "  load_history: Load history from a file\n"
+        "  metrics: Show latency and error metrics\n"
+        "  stats: Show result statistics by operation\n"
         "  exit: Exit the calculator"
     )
     assert captured == expected_menu
@@ -129,3 +141,248 @@ def test_display_history(mocker, capsys):
     assert "10 subtract 2 = 8" in captured
     assert "4 multiply 5 = 20" in captured
     assert "20 divide 4 = 5" in captured
+
+def test_calculate_and_store_flushes_history():
+    """Test that calculate_and_store appends to the history file instead of rewriting it."""
+    app = CalculatorApp()
+    app.calculate_and_store("2", "3", "add")
+    Calculations.flush_history.assert_called_once_with(file_name='data/calculation_history.csv')
+    Calculations.save_history.assert_not_called()
+
+@pytest.mark.parametrize("expression, expected_string", [
+    ("(3 + 4) * 2 / 7", "The result of (3 + 4) * 2 / 7 is 2"),
+    ("-2.5", "The result of -2.5 is -2.5"),
+    ("1 / (2 - 2)", "An error occurred: Cannot divide by zero."),
+    ("2 +", "An error occurred: Invalid expression: unexpected end of '2 +'"),
+    ("1e999999 * 1e999999", "An error occurred: arithmetic error (Overflow)."),
+])
+def test_calculate_expression(expression, expected_string, capsys):
+    """Test evaluating expressions through the application."""
+    app = CalculatorApp()
+    app.calculate_expression(expression)
+    assert capsys.readouterr().out.strip() == expected_string
+
+def test_calculate_expression_nested_too_deeply(capsys):
+    """Test that deeply nested parentheses are reported instead of ending the REPL."""
+    CalculatorApp().calculate_expression("(" * 5000 + "1" + ")" * 5000)
+    assert "nested more than 100 levels deep" in capsys.readouterr().out
+
+def test_calculate_expression_stores_outermost_command():
+    """Test that the outermost command of an expression is stored in history."""
+    Calculations.clear_history()
+    app = CalculatorApp()
+    app.calculate_expression("(1 + 2) * 4")
+    latest = Calculations.get_latest()
+    assert latest == MultiplyCommand(Decimal("3"), Decimal("4"))
+    assert latest.result == Decimal("12")
+
+@pytest.mark.parametrize("backend, expression, expected_string", [
+    (get_backend("fraction"), "1 / 3", "The result of 1 / 3 is 1/3"),
+    (get_backend("fraction"), "(1 / 3) * 3", "The result of (1 / 3) * 3 is 1"),
+    (get_backend("float"), "0.1 + 0.2", "The result of 0.1 + 0.2 is 0.30000000000000004"),
+    (get_backend("decimal", precision=5), "(2 / 3) + 0", "The result of (2 / 3) + 0 is 0.66667"),
+])
+def test_calculate_expression_with_backend(backend, expression, expected_string, capsys):
+    """Test that expressions are evaluated with the session's numeric backend, inner commands included."""
+    CalculatorApp(backend).calculate_expression(expression)
+    assert capsys.readouterr().out.strip() == expected_string
+    Calculations.clear_history()
+
+def test_interactive_calculator_expression(mocker, capsys):
+    """Test that the REPL evaluates expressions typed at the command prompt."""
+    app = CalculatorApp()
+    mocker.patch("builtins.input", side_effect=["2 * (3 + 4)", "exit"])
+    app.interactive_calculator()
+    assert "The result of 2 * (3 + 4) is 14" in capsys.readouterr().out
+
+def test_result_cache_size_from_environment(monkeypatch):
+    """Test that RESULT_CACHE_SIZE enables the shared result cache."""
+    monkeypatch.setenv("RESULT_CACHE_SIZE", "8")
+    try:
+        CalculatorApp()
+        assert Calculations.result_cache.maxsize == 8
+    finally:
+        Calculations.result_cache.configure(0)
+
+def test_numeric_backend_from_environment(monkeypatch, capsys):
+    """Test that NUMERIC_BACKEND and DECIMAL_PRECISION choose the session's numeric backend."""
+    monkeypatch.setenv("NUMERIC_BACKEND", "float")
+    app = CalculatorApp()
+    app.calculate_and_store("0.1", "0.2", "add")
+    assert "is 0.30000000000000004" in capsys.readouterr().out
+    monkeypatch.setenv("NUMERIC_BACKEND", "decimal")
+    monkeypatch.setenv("DECIMAL_PRECISION", "3")
+    CalculatorApp().calculate_and_store("2", "3", "divide")
+    assert "is 0.667" in capsys.readouterr().out
+    Calculations.clear_history()
+
+@pytest.mark.parametrize("variable, value, message", [
+    ("NUMERIC_BACKEND", "bogus", "Unknown numeric backend: bogus"),
+    ("DECIMAL_PRECISION", "ten", "DECIMAL_PRECISION must be an integer, not 'ten'"),
+    ("DECIMAL_PRECISION", "0", "Precision must be at least 1"),
+    ("DECIMAL_ROUNDING", "sideways", "Unknown rounding mode: sideways"),
+    ("RESULT_CACHE_SIZE", "x", "RESULT_CACHE_SIZE must be an integer of at least 0, not 'x'"),
+    ("RESULT_CACHE_SIZE", "-1", "RESULT_CACHE_SIZE must be an integer of at least 0, not '-1'"),
+    ("HISTORY_WINDOW", "abc", "HISTORY_WINDOW must be an integer of at least 1, not 'abc'"),
+    ("HISTORY_WINDOW", "0", "HISTORY_WINDOW must be an integer of at least 1, not '0'"),
+])
+def test_main_validates_environment(monkeypatch, capsys, variable, value, message):
+    """Test that bad settings in the environment are reported like bad command-line options."""
+    monkeypatch.setenv(variable, value)
+    with pytest.raises(SystemExit) as exit_info:
+        main([])
+    assert exit_info.value.code == 2 and message in capsys.readouterr().err
+    with pytest.raises(ValueError, match=message):
+        CalculatorApp()
+
+def test_main_numeric_options(mocker):
+    """Test that --numeric, --precision and --rounding configure the backend, and are validated."""
+    repl = mocker.patch.object(CalculatorApp, "interactive_calculator", autospec=True)
+    assert main(["--numeric", "fraction"]) == 0
+    assert repl.call_args.args[0].backend.name == "fraction"
+    assert main(["--precision", "5", "--rounding", "half_up"]) == 0
+    assert repl.call_args.args[0].backend.decimal_context.prec == 5
+    with pytest.raises(SystemExit):
+        main(["--numeric", "float", "--precision", "5"])
+
+def test_history_window_from_environment(monkeypatch, tmp_path):
+    """Test that HISTORY_WINDOW bounds both histories and spills into HISTORY_SPILL_DIR."""
+    monkeypatch.setenv("HISTORY_WINDOW", "4")
+    monkeypatch.setenv("HISTORY_SPILL_DIR", str(tmp_path))
+    Calculations.clear_history()
+    try:
+        app = CalculatorApp()
+        assert Calculations.history.window == Calculator().history.window == 4
+        for value in range(10):
+            app.calculate_and_store(str(value), "1", "add")
+        assert Calculations.history.spilled == 6
+        assert [entry.result for entry in Calculations.get_history()] == [Decimal(value + 1) for value in range(10)]
+    finally:
+        Calculations.clear_history()
+        for history in (Calculations.history, Calculator().history):
+            history.set_window(None)
+
+def test_run_batch_flushes_history_once(tmp_path):
+    """Test that a batch run writes its results to a file and flushes the history once."""
+    source = tmp_path / "ops.csv"
+    source.write_text("add,1,2\nmultiply,3,4\ndivide,1,0\n", encoding="utf-8")
+    output = tmp_path / "results.csv"
+    app = CalculatorApp()
+    assert app.run_batch(str(source), str(output)) == (2, 1)
+    assert output.read_text(encoding="utf-8").splitlines()[1:3] == ["add,1,2,3", "multiply,3,4,12"]
+    Calculations.flush_history.assert_called_once_with(file_name='data/calculation_history.csv')
+
+def test_main_batch_with_workers(tmp_path, mocker):
+    """Test that --workers evaluates a --batch file in shards across processes."""
+    sharded = mocker.patch("main.run_sharded_batch", return_value=(3, 0))
+    source = tmp_path / "ops.csv"
+    source.write_text("add,1,2\n", encoding="utf-8")
+    assert main(["--batch", str(source), "--workers", "3"]) == 0
+    assert sharded.call_args.args[0] == str(source) and sharded.call_args.args[3] == 3
+
+@pytest.mark.parametrize("source, output", [("missing.csv", None), (".", None), ("ops.csv", "missing/out.csv")])
+def test_main_batch_unreadable_files(tmp_path, capsys, source, output):
+    """Test that a batch file that cannot be read, or an output that cannot be written, exits with status 1."""
+    (tmp_path / "ops.csv").write_text("add,1,2\n", encoding="utf-8")
+    argv = ["--batch", str(tmp_path / source)] + (["--output", str(tmp_path / output)] if output else [])
+    assert main(argv) == 1
+    assert "Cannot run the batch" in capsys.readouterr().err
+
+def test_main_batch_from_stdin(monkeypatch, capsys):
+    """Test that --batch - reads operations from stdin and writes results to stdout."""
+    monkeypatch.setattr("sys.stdin", io.StringIO("5 subtract 2\n"))
+    assert main(["--batch", "-"]) == 0
+    assert "subtract,5,2,3" in capsys.readouterr().out
+
+def test_main_starts_repl(mocker):
+    """Test that main starts the interactive calculator without --batch."""
+    repl = mocker.patch.object(CalculatorApp, "interactive_calculator")
+    assert main([]) == 0
+    repl.assert_called_once()
+
+def test_main_daemon(mocker):
+    """Test that --daemon starts the socket server on the given path."""
+    serve = mocker.patch("calculator.daemon.serve")
+    assert main(["--daemon", "--socket", "/tmp/test-calculator.sock"]) == 0
+    serve.assert_called_once_with("/tmp/test-calculator.sock")
+
+def test_main_serve(mocker):
+    """Test that --serve runs the asyncio server with the requested pool and flushes history afterwards."""
+    serve_async = mocker.patch("calculator.server.serve_async", new=mocker.AsyncMock())
+    assert main(["--serve", "--port", "9999", "--workers", "2", "--processes"]) == 0
+    serve_async.assert_awaited_once_with(port=9999, socket_path=None, workers=2, use_processes=True)
+    Calculations.flush_history.assert_called_once()
+
+def test_display_metrics(capsys):
+    """Test the metrics REPL command with metrics disabled and enabled."""
+    app = CalculatorApp()
+    app.display_metrics()
+    assert "Metrics are disabled" in capsys.readouterr().out
+    metrics.configure(True)
+    try:
+        app.calculate_and_store('1', '2', 'add')
+        app.calculate_and_store('x', '2', 'add')
+        app.display_metrics()
+    finally:
+        metrics.configure(False)
+        metrics.reset()
+    report = capsys.readouterr().out
+    assert "execute.add" in report and "history.add_calculation" in report
+
+def test_main_metrics_file(tmp_path, monkeypatch):
+    """Test that --metrics-file records metrics during a batch run and writes them on exit."""
+    monkeypatch.setattr("sys.stdin", io.StringIO("add,1,2\ndivide,1,0\n"))
+    output = tmp_path / "metrics.json"
+    try:
+        assert main(["--batch", "-", "--metrics-file", str(output)]) == 1
+    finally:
+        metrics.configure(False)
+        metrics.reset()
+    dumped = json.loads(output.read_text(encoding="utf-8"))["metrics"]
+    assert dumped["execute.add"]["count"] == 1
+    assert dumped["execute.divide"]["errors"] == {"divide_by_zero": 1}
+
+def test_setup_logging_async(monkeypatch):
+    """Test that LOG_ASYNC routes the root logger through a queue to the file handler."""
+    monkeypatch.setenv("LOG_ASYNC", "1")
+    try:
+        CalculatorApp()
+        handlers = logging.getLogger().handlers
+        assert len(handlers) == 1 and isinstance(handlers[0], DeferredQueueHandler)
+    finally:
+        monkeypatch.setenv("LOG_ASYNC", "0")
+        CalculatorApp()
+    assert not any(isinstance(handler, DeferredQueueHandler) for handler in logging.getLogger().handlers)
+
+def test_display_stats(mocker, capsys):
+    """Test the stats REPL command on an empty and a filled history."""
+    Calculations.clear_history()
+    mocker.patch("builtins.input", side_effect=["stats", "exit"])
+    CalculatorApp().interactive_calculator()
+    assert "No history available." in capsys.readouterr().out
+    app = CalculatorApp()
+    app.calculate_and_store('1', '2', 'add')
+    app.calculate_and_store('3', '4', 'multiply')
+    capsys.readouterr()
+    app.display_stats()
+    report = capsys.readouterr().out.splitlines()
+    Calculations.clear_history()
+    assert report[0].split() == ['count', 'sum', 'mean', 'min', 'max', 'p50', 'p90', 'p99']
+    assert [line.split()[:3] for line in report[2:]] == [['add', '1', '3'], ['multiply', '1', '12'], ['all', '2', '15']]
+
+def test_main_stats_file(tmp_path, capsys):
+    """Test that --stats reports on a history file without loading it into the history."""
+    history_file = tmp_path / "history.csv"
+    history_file.write_text("operation,result\n1 add 2,3\n2 add 2,4\n6 divide 3,2\n", encoding="utf-8")
+    Calculations.clear_history()
+    assert main(["--stats", str(history_file)]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[:3] for line in lines[2:]] == [['add', '2', '7'], ['divide', '1', '2'], ['all', '3', '9']]
+    assert len(Calculations.history) == 0
+
+@pytest.mark.parametrize("file_name", ["missing.csv", "missing.db"])
+def test_main_stats_missing_file(tmp_path, capsys, file_name):
+    """Test that --stats on a missing file reports the error and exits with status 1."""
+    assert main(["--stats", str(tmp_path / file_name)]) == 1
+    assert "No history file found" in capsys.readouterr().err
+    assert not (tmp_path / file_name).exists()
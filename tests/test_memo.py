@@ -0,0 +1,79 @@
+"""
+This module contains tests for the result memoization layer shared by commands and calculations.
+"""
+
+from decimal import Decimal
+import pytest
+from calculator.calculation import Calculation
+from calculator.calculations import Calculations
+from calculator.calculator import Calculator
+from calculator.commands import AddCommand, DivideCommand, MultiplyCommand
+from calculator.memo import ResultCache, result_cache
+from calculator.operations import add
+
+@pytest.fixture(autouse=True)
+def enabled_cache():
+    """Enable the shared result cache for each test and disable it afterwards."""
+    result_cache.configure(3)
+    result_cache.clear()
+    yield
+    result_cache.configure(0)
+    result_cache.clear()
+
+def test_cache_is_shared():
+    """Test that the Calculator singleton and Calculations use the same cache."""
+    assert Calculator.result_cache is Calculations.result_cache is result_cache
+
+def test_repeated_execute_hits_cache():
+    """Test that executing an equal command again is served from the cache."""
+    assert AddCommand(Decimal('1'), Decimal('2')).execute() == Decimal('3')
+    assert AddCommand(Decimal('1'), Decimal('2')).execute() == Decimal('3')
+    assert result_cache.stats() == {'size': 1, 'maxsize': 3, 'hits': 1, 'misses': 1}
+
+def test_key_includes_operation_strategy_and_exponent():
+    """Test that different operations, strategies and operand exponents do not share results."""
+    assert AddCommand(Decimal('2'), Decimal('2')).execute() == Decimal('4')
+    assert str(AddCommand(Decimal('2.0'), Decimal('2')).execute()) == '4.0'
+    assert MultiplyCommand(Decimal('2'), Decimal('2')).execute() == Decimal('4')
+    assert DivideCommand(Decimal('7'), Decimal('2'), strategy=DivideCommand.integer_division).execute() == Decimal('3')
+    assert DivideCommand(Decimal('7'), Decimal('2')).execute() == Decimal('3.5')
+    assert result_cache.hits == 0
+
+def test_lambdas_do_not_share_results():
+    """Test that different lambdas used as strategies or operations are keyed apart."""
+    assert DivideCommand(Decimal('7'), Decimal('2'), strategy=lambda x, y: x + y).execute() == Decimal('9')
+    assert DivideCommand(Decimal('7'), Decimal('2'), strategy=lambda x, y: x * y).execute() == Decimal('14')
+    assert Calculation(Decimal('7'), Decimal('2'), lambda x, y: x - y).perform() == Decimal('5')
+    assert Calculation(Decimal('7'), Decimal('2'), lambda x, y: x % y).perform() == Decimal('1')
+    assert result_cache.hits == 0
+
+def test_lru_eviction():
+    """Test that the least recently used result is evicted once the cache is full."""
+    for value in range(3):
+        AddCommand(value, 1).execute()
+    AddCommand(0, 1).execute()  # Touch the oldest entry so that (1, 1) becomes the LRU entry
+    AddCommand(5, 1).execute()
+    assert len(result_cache) == 3
+    AddCommand(1, 1).execute()
+    assert result_cache.misses == 5 and result_cache.hits == 1
+
+def test_calculation_perform_is_memoized():
+    """Test that Calculation.perform uses the shared cache too."""
+    Calculation(Decimal('10'), Decimal('5'), add).perform()
+    Calculation(Decimal('10'), Decimal('5'), add).perform()
+    assert result_cache.hits == 1
+
+def test_errors_are_not_cached():
+    """Test that division by zero is raised every time instead of being cached."""
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Cannot divide by zero"):
+            DivideCommand(Decimal('1'), Decimal('0')).execute()
+    assert len(result_cache) == 0
+
+def test_disabled_cache_does_not_record():
+    """Test that a cache with maxsize 0 stores nothing."""
+    cache = ResultCache()
+    assert not cache.enabled
+    result_cache.configure(0)
+    AddCommand(1, 2).execute()
+    assert len(result_cache) == 0 and result_cache.misses == 0
@@ -0,0 +1,89 @@
+"""
+This module contains tests for the opt-in latency and error metrics.
+It checks the histogram buckets, installing and removing the timing wrappers, and the reports.
+"""
+
+import json
+from decimal import Decimal, InvalidOperation
+import pytest
+from calculator.calculations import Calculations
+from calculator.calculator import Calculator
+from calculator.commands import AddCommand, DivideCommand
+from calculator.metrics import LatencyHistogram, bucket_of, error_kind, metrics
+
+# pylint: disable=redefined-outer-name, unused-argument
+
+@pytest.fixture
+def enabled_metrics():
+    """Enable fresh metrics for one test and disable them afterwards."""
+    metrics.reset()
+    metrics.configure(True)
+    yield metrics
+    metrics.configure(False)
+    metrics.reset()
+
+@pytest.mark.parametrize("nanoseconds", [0, 1, 31, 32, 1000, 123_456, 10**9 + 7])
+def test_bucket_of_keeps_significant_bits(nanoseconds):
+    """Test that a bucket's lower bound is within about 3% below the latency."""
+    bucket = bucket_of(nanoseconds)
+    assert bucket <= nanoseconds
+    assert nanoseconds - bucket <= nanoseconds / 16
+    assert bucket_of(bucket) == bucket
+
+def test_histogram_percentiles():
+    """Test counts, extremes and percentiles of a histogram."""
+    histogram = LatencyHistogram()
+    for nanoseconds in range(1, 1001):
+        histogram.record(nanoseconds * 1000)
+    summary = histogram.summary()
+    assert summary['count'] == 1000 and summary['min_seconds'] == 1e-6 and summary['max_seconds'] == 1e-3
+    assert summary['p50_seconds'] == pytest.approx(500e-6, rel=0.04)
+    assert summary['p99_seconds'] == pytest.approx(990e-6, rel=0.04)
+    assert sum(summary['buckets_ns'].values()) == 1000 and len(summary['buckets_ns']) < 200
+
+def test_error_kind():
+    """Test the classification of errors."""
+    assert error_kind(InvalidOperation()) == 'invalid_input'
+    assert error_kind(ValueError("Cannot divide by zero.")) == 'divide_by_zero'
+    assert error_kind(TypeError("x")) == 'TypeError'
+
+def test_disabled_metrics_leave_methods_untouched():
+    """Test that enabling installs wrappers and disabling restores the original methods."""
+    execute = AddCommand.__dict__['execute']
+    save_history = Calculations.__dict__['save_history']
+    metrics.configure(True)
+    try:
+        assert AddCommand.__dict__['execute'] is not execute
+        assert isinstance(Calculations.__dict__['save_history'], classmethod)
+    finally:
+        metrics.configure(False)
+    assert AddCommand.__dict__['execute'] is execute
+    assert Calculations.__dict__['save_history'] is save_history
+
+def test_commands_and_errors_are_recorded(enabled_metrics):
+    """Test call counts, latencies and divide-by-zero errors for commands and history appends."""
+    calc = Calculator()
+    for _ in range(3):
+        command = AddCommand(Decimal(1), Decimal(2))
+        command.execute()
+        calc.add_to_history(command)
+    with pytest.raises(ValueError):
+        DivideCommand(Decimal(1), Decimal(0)).execute()
+    snapshot = enabled_metrics.snapshot()
+    assert snapshot['execute.add']['count'] == 3 and snapshot['execute.add']['p50_seconds'] > 0
+    assert snapshot['execute.divide']['errors'] == {'divide_by_zero': 1}
+    assert snapshot['history.add_to_history']['count'] == 3
+
+def test_persistence_timings_and_dump(enabled_metrics, tmp_path):
+    """Test that persistence calls are timed and the metrics are dumped as JSON."""
+    Calculations.clear_history()
+    Calculations.add_calculation(AddCommand(Decimal(1), Decimal(2)))
+    Calculations.save_history(str(tmp_path / "history.csv"))
+    Calculations.load_history(str(tmp_path / "history.csv"))
+    output = tmp_path / "metrics.json"
+    enabled_metrics.dump(str(output))
+    dumped = json.loads(output.read_text(encoding="utf-8"))
+    assert dumped['enabled'] is True
+    assert dumped['metrics']['persistence.save_history']['count'] == 1
+    assert dumped['metrics']['persistence.load_history']['count'] == 1
+    assert "persistence.save_history" in enabled_metrics.format_report()
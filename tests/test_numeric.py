@@ -0,0 +1,123 @@
+"""
+This module contains tests for the numeric backends.
+It checks parsing, that every command and division strategy works with each backend, and the
+decimal context handling.
+"""
+
+import re
+from decimal import Decimal, InvalidOperation, ROUND_DOWN, ROUND_HALF_UP
+from fractions import Fraction
+import pytest
+from calculator.commands import AddCommand, DivideCommand, MultiplyCommand, SubtractCommand
+from calculator.memo import result_cache
+from calculator.numeric import (
+    STORED_NUMBER_PATTERN, DecimalBackend, FloatBackend, FractionBackend, Operands, get_backend, parse_stored_number, parse_stored_row,
+    rounding_mode
+)
+
+@pytest.mark.parametrize("backend, expected", [
+    (DecimalBackend(), Decimal('0.3')),
+    (FloatBackend(), 0.1 + 0.2),
+    (FractionBackend(), Fraction(3, 10)),
+])
+def test_backends_parse_and_add(backend, expected):
+    """Test that each backend parses operands into its own type and computes in it."""
+    command = AddCommand(backend.parse('0.1'), backend.parse('0.2'))
+    result = backend.execute(command)
+    assert result == expected and type(result) is type(expected)  # pylint: disable=unidiomatic-typecheck
+
+@pytest.mark.parametrize("backend", [DecimalBackend(), FloatBackend(), FractionBackend()])
+def test_commands_and_division_strategies(backend):
+    """Test that all core commands and both division strategies work with every backend."""
+    seven, two = backend.parse('7'), backend.parse('2')
+    assert backend.execute(SubtractCommand(seven, two)) == 5
+    assert backend.execute(MultiplyCommand(seven, two)) == 14
+    assert backend.execute(DivideCommand(seven, two)) == backend.parse('3.5')
+    assert backend.execute(DivideCommand(seven, two, strategy=DivideCommand.integer_division)) == 3
+    for dividend, divisor, quotient in (('-7', '2', -3), ('7', '-2', -3), ('-7', '-2', 3), ('-6', '2', -3)):
+        command = DivideCommand(backend.parse(dividend), backend.parse(divisor), strategy=DivideCommand.integer_division)
+        assert backend.execute(command) == quotient
+    with pytest.raises(ValueError, match="Cannot divide by zero"):
+        backend.execute(DivideCommand(seven, backend.parse('0')))
+
+def test_fraction_division_is_exact():
+    """Test that the Fraction backend keeps thirds exact."""
+    backend = FractionBackend()
+    third = backend.execute(DivideCommand(backend.parse('1'), backend.parse('3')))
+    assert third == Fraction(1, 3) and str(third) == '1/3'
+    assert backend.parse('2/6') == third
+
+@pytest.mark.parametrize("backend", [DecimalBackend(), FloatBackend(), FractionBackend()])
+@pytest.mark.parametrize("text", ["abc", "", "1/0"])
+def test_invalid_input_raises_invalid_operation(backend, text):
+    """Test that every backend reports invalid operands as InvalidOperation."""
+    with pytest.raises(InvalidOperation):
+        backend.parse(text)
+
+def test_decimal_context_precision_and_rounding():
+    """Test that a decimal backend rounds results with its own context only while executing."""
+    backend = DecimalBackend(precision=4, rounding='half_up')
+    assert backend.rounding == ROUND_HALF_UP
+    assert backend.execute(DivideCommand(Decimal('2'), Decimal('3'))) == Decimal('0.6667')
+    truncating = DecimalBackend(precision=4, rounding='ROUND_DOWN')
+    assert truncating.execute(DivideCommand(Decimal('2'), Decimal('3'))) == Decimal('0.6666')
+    # The global context is left untouched
+    assert DivideCommand(Decimal('2'), Decimal('3')).execute() == Decimal(2) / Decimal(3)
+
+def test_result_cache_keys_on_decimal_context():
+    """Test that memoized results computed under different precisions are not shared."""
+    result_cache.configure(8)
+    try:
+        low = DecimalBackend(precision=3).execute(DivideCommand(Decimal('1'), Decimal('3')))
+        high = DecimalBackend(precision=6).execute(DivideCommand(Decimal('1'), Decimal('3')))
+    finally:
+        result_cache.configure(0)
+        result_cache.clear()
+    assert (low, high) == (Decimal('0.333'), Decimal('0.333333'))
+
+def test_get_backend():
+    """Test backend selection by name and its validation."""
+    assert isinstance(get_backend(), DecimalBackend)
+    assert isinstance(get_backend('FLOAT'), FloatBackend)
+    assert isinstance(get_backend('fraction'), FractionBackend)
+    assert get_backend('decimal', 10, 'down').decimal_context.rounding == ROUND_DOWN
+    with pytest.raises(ValueError, match="Unknown numeric backend"):
+        get_backend('complex')
+    with pytest.raises(ValueError, match="only apply to the decimal backend"):
+        get_backend('float', precision=5)
+    with pytest.raises(ValueError, match="Precision must be at least 1"):
+        get_backend('decimal', 0)
+
+@pytest.mark.parametrize("name", ["sideways", "context", "ROUND_"])
+def test_rounding_mode_rejects_unknown_names(name):
+    """Test that only decimal rounding constants are accepted."""
+    with pytest.raises(ValueError, match="Unknown rounding mode"):
+        rounding_mode(name)
+
+def test_parse_stored_number():
+    """Test that history text is read back as a Fraction or a Decimal."""
+    assert parse_stored_number('1/3') == Fraction(1, 3)
+    assert parse_stored_number('0.30000000000000004') == Decimal('0.30000000000000004')
+
+def test_parse_stored_row():
+    """Test that a history row holding a Fraction is read back as Fractions only."""
+    assert parse_stored_row('1/3', '2', '1/6') == (Fraction(1, 3), Fraction(2), Fraction(1, 6))
+    assert parse_stored_row('0.5;add:1/3;', '2') == (Operands([Fraction(1, 2), ('add', Fraction(1, 3))]), Fraction(2))
+    assert all(isinstance(number, Decimal) for number in parse_stored_row('0.1', '2', '0.2'))
+
+def test_stored_number_pattern():
+    """Test that the stored number grammar accepts the text of every number type and rejects other text."""
+    stored = [Decimal('-1.5E+3'), Decimal('0E-7'), Decimal('NaN'), Decimal('-Infinity'), 1e16, -0.25,
+              float('inf'), Fraction(-1, 3), Fraction(4), Operands([Decimal('0.1'), ('add', Fraction(1, 7))]), Operands()]
+    for number in stored:
+        assert re.fullmatch(STORED_NUMBER_PATTERN, str(number)), number
+    for text in ('x', '', '1/0', '0/0', '1 2', '1;x;', 'e5', '1.2.3'):
+        assert not re.fullmatch(STORED_NUMBER_PATTERN, text), text
+
+def test_operands_text_round_trip():
+    """Test that fused command operands, and pipeline steps, survive their history text form."""
+    for operands in (Operands([Decimal('0.1'), Fraction(1, 3), Decimal(-2)]),
+                     Operands([('add', Decimal(3)), ('divide', Fraction(1, 7))]), Operands()):
+        text = str(operands)
+        assert text.endswith(';') and ' ' not in text and ',' not in text
+        assert parse_stored_number(text) == operands
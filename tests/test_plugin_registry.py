@@ -0,0 +1,137 @@
+"""
+This module contains tests for plugin discovery through the cached plugin manifest.
+It checks discovery without imports, manifest reuse and invalidation, and lazy loading.
+"""
+
+import os
+import sys
+import json
+import pytest
+from calculator.calculator import Calculator
+from calculator.commands import AddCommand
+from calculator.plugin_registry import CommandMappings, PluginRegistry, inspect_plugin_source, plugin_registry
+from calculator.utils import get_operation_mappings
+
+# pylint: disable=redefined-outer-name
+
+POWER_PLUGIN = '''"""A plugin providing exponentiation."""
+from calculator.commands import Command
+
+class PowerCommand(Command):
+    """Raise the first value to the power of the second."""
+
+    def __init__(self, value1, value2):
+        self.value1 = value1
+        self.value2 = value2
+
+    def execute(self):
+        return self.value1 ** self.value2
+
+def register():
+    return PowerCommand
+'''
+
+@pytest.fixture
+def plugins_dir(tmp_path, monkeypatch):
+    """Create an importable plugin package holding a power plugin and a helper module."""
+    package = tmp_path / "extra_plugins"
+    package.mkdir()
+    (package / "__init__.py").write_text("", encoding="utf-8")
+    (package / "power_plugin.py").write_text(POWER_PLUGIN, encoding="utf-8")
+    (package / "helpers.py").write_text("VALUE = 1\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield package
+    for module in [name for name in sys.modules if name.startswith("extra_plugins")]:
+        del sys.modules[module]
+
+def make_registry(plugins_dir):
+    """Create a registry for the temporary plugin package."""
+    return PluginRegistry(str(plugins_dir), package="extra_plugins")
+
+def test_inspect_plugin_source():
+    """Test that operation, command class and description are read from the source."""
+    assert inspect_plugin_source("power_plugin", POWER_PLUGIN.encode()) == {
+        "operation": "power", "command": "PowerCommand",
+        "description": "Raise the first value to the power of the second.",
+    }
+    assert inspect_plugin_source("helpers", b"VALUE = 1\n")["operation"] is None
+
+def test_discover_without_importing(plugins_dir):
+    """Test that plugins are discovered and the manifest written without importing them."""
+    registry = make_registry(plugins_dir)
+    plugins = registry.discover()
+    assert list(plugins) == ["power"]
+    assert plugins["power"].module == "power_plugin"
+    assert "extra_plugins.power_plugin" not in sys.modules
+    manifest = json.loads((plugins_dir / ".manifest.json").read_text(encoding="utf-8"))
+    assert set(manifest["plugins"]) == {"helpers", "power_plugin"}
+
+def test_manifest_is_reused(plugins_dir, mocker):
+    """Test that a fresh registry trusts the manifest for unchanged files."""
+    make_registry(plugins_dir).discover()
+    inspect = mocker.patch("calculator.plugin_registry.inspect_plugin_source")
+    write = mocker.patch.object(PluginRegistry, "_write_manifest")
+    assert list(make_registry(plugins_dir).discover()) == ["power"]
+    inspect.assert_not_called()
+    write.assert_not_called()
+
+def test_touched_file_is_not_parsed_again(plugins_dir, mocker):
+    """Test that a new mtime with the same contents only refreshes the manifest entry."""
+    make_registry(plugins_dir).discover()
+    stat = os.stat(plugins_dir / "power_plugin.py")
+    os.utime(plugins_dir / "power_plugin.py", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    inspect = mocker.patch("calculator.plugin_registry.inspect_plugin_source")
+    assert list(make_registry(plugins_dir).discover()) == ["power"]
+    inspect.assert_not_called()
+    manifest = json.loads((plugins_dir / ".manifest.json").read_text(encoding="utf-8"))
+    assert manifest["plugins"]["power_plugin"]["mtime_ns"] == stat.st_mtime_ns + 10**9
+
+def test_changed_and_removed_files_are_rescanned(plugins_dir):
+    """Test that edited plugins are parsed again and deleted plugins disappear."""
+    make_registry(plugins_dir).discover()
+    (plugins_dir / "power_plugin.py").write_text(POWER_PLUGIN.replace("PowerCommand", "ExponentCommand"),
+                                                 encoding="utf-8")
+    assert list(make_registry(plugins_dir).discover()) == ["exponent"]
+    os.remove(plugins_dir / "power_plugin.py")
+    assert not make_registry(plugins_dir).discover()
+
+def test_corrupt_or_unwritable_manifest(plugins_dir, tmp_path):
+    """Test that a corrupt manifest is ignored and an unwritable one only logs a warning."""
+    (plugins_dir / ".manifest.json").write_text("{not json", encoding="utf-8")
+    assert list(make_registry(plugins_dir).discover()) == ["power"]
+    registry = PluginRegistry(str(plugins_dir), package="extra_plugins",
+                              manifest_path=str(tmp_path / "missing" / "manifest.json"))
+    assert list(registry.discover()) == ["power"]
+
+def test_command_class_imports_on_first_use(plugins_dir):
+    """Test that a plugin is imported when its command class is first looked up."""
+    registry = make_registry(plugins_dir)
+    command_class = registry.command_class("power")
+    assert "extra_plugins.power_plugin" in sys.modules
+    assert command_class(2, 10).execute() == 1024
+    assert registry.command_class("power") is command_class
+    with pytest.raises(KeyError):
+        registry.command_class("root")
+
+def test_command_mappings(plugins_dir):
+    """Test that core commands take precedence and extra plugins are listed after them."""
+    mappings = CommandMappings({"add": AddCommand}, make_registry(plugins_dir))
+    assert list(mappings) == ["add", "power"] and len(mappings) == 2
+    assert mappings["add"] is AddCommand
+    assert mappings.get("power")(3, 2).execute() == 9
+    assert mappings.get("root") is None
+    assert list(mappings.plugin_operations()) == ["power"]
+
+def test_bundled_plugins_are_discovered():
+    """Test that the bundled plugins map onto the core operations, which take precedence."""
+    assert set(plugin_registry.discover()) == {"add", "subtract", "multiply", "divide"}
+    mappings = get_operation_mappings()
+    assert list(mappings) == ["add", "subtract", "multiply", "divide"]
+    assert mappings["add"] is AddCommand
+
+def test_calculator_creates_discovered_plugin_command():
+    """Test that the Calculator loads a discovered plugin on first use by operation name."""
+    calc = Calculator()
+    calc.plugins.pop("subtract", None)
+    assert calc.create_command("subtract", 7, 2).execute() == 5
+    assert "subtract" in calc.plugins
@@ -0,0 +1,134 @@
+"""
+This module contains tests for the asyncio calculation server.
+It checks pipelined request handling over TCP and Unix sockets with thread and process pools.
+"""
+
+import json
+import asyncio
+import threading
+from decimal import Decimal
+import pytest
+from calculator.calculations import Calculations
+from calculator.calculator import Calculator
+from calculator.commands import AddCommand
+from calculator import server as server_module
+from calculator.server import CalculationServer
+
+async def _exchange(reader, writer, requests):
+    """Send all requests at once, then read one response per request."""
+    writer.write(b"".join(json.dumps(request).encode() + b"\n" for request in requests))
+    await writer.drain()
+    responses = [json.loads(await reader.readline()) for _ in requests]
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+REQUESTS = [
+    {"operation": "add", "value1": "1", "value2": "2"},
+    {"operation": "divide", "value1": "1", "value2": "0"},
+    {"expression": "(3 + 4) * 2"},
+    {"operation": "power", "value1": "1", "value2": "2"},
+    {"operation": "multiply", "value1": "1.5", "value2": "4"},
+]
+
+EXPECTED = [
+    {"result": "3"},
+    {"error": "Cannot divide by zero."},
+    {"result": "14"},
+    {"error": "Unknown operation: power"},
+    {"result": "6.0"},
+]
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_pipelined_requests_over_tcp(use_processes):
+    """Test that pipelined requests are answered in order by thread and process pools."""
+    async def scenario():
+        server = CalculationServer(workers=2, use_processes=use_processes, max_pending=2)
+        await server.start(port=0)
+        port = server.server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            return await _exchange(reader, writer, REQUESTS)
+        finally:
+            await server.close()
+
+    Calculations.clear_history()
+    assert asyncio.run(scenario()) == EXPECTED
+    assert [entry.result for entry in Calculations.get_history()] == [Decimal("3"), Decimal("14"), Decimal("6.0")]
+
+def test_concurrent_clients_over_unix_socket(tmp_path):
+    """Test many concurrent clients on a Unix socket, all recorded in the history."""
+    socket_path = str(tmp_path / "server.sock")
+
+    async def client(number):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        request = {"operation": "add", "value1": str(number), "value2": "1"}
+        return await _exchange(reader, writer, [request] * 3)
+
+    async def scenario():
+        server = CalculationServer(workers=4)
+        await server.start(socket_path=socket_path)
+        try:
+            return await asyncio.gather(*(client(number) for number in range(50)))
+        finally:
+            await server.close()
+
+    Calculations.clear_history()
+    results = asyncio.run(scenario())
+    assert results[7] == [{"result": "8"}] * 3
+    assert len(Calculations.get_history()) == 150
+
+def test_failed_requests_keep_the_connection(mocker):
+    """Test that arithmetic and unexpected errors are answered and later requests still are."""
+    real_evaluate = server_module.evaluate_request
+
+    def evaluate(request):
+        if request.get('value1') == 'crash':
+            raise RuntimeError("worker crashed")
+        return real_evaluate(request)
+
+    mocker.patch.object(server_module, 'evaluate_request', side_effect=evaluate)
+
+    async def scenario():
+        server = CalculationServer(workers=1, max_pending=1)
+        await server.start(port=0)
+        port = server.server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            return await _exchange(reader, writer, [
+                {"operation": "multiply", "value1": "1e999999", "value2": "1e999999"},
+                {"operation": "add", "value1": "crash", "value2": "1"},
+                *REQUESTS,
+            ])
+        finally:
+            await server.close()
+
+    responses = asyncio.run(scenario())
+    assert responses[:2] == [{"error": "Arithmetic error: Overflow"}, {"error": "Internal error"}]
+    assert responses[2:] == EXPECTED
+
+def test_malformed_lines():
+    """Test that lines which are not JSON objects get an error response."""
+    server = CalculationServer(workers=1)
+    try:
+        assert asyncio.run(server.evaluate(b"not json")) == {"error": "Malformed request"}
+        assert asyncio.run(server.evaluate(b"[1]")) == {"error": "Malformed request"}
+        assert asyncio.run(server.evaluate(b'{"operation": "add"}')) == {"error": "Malformed request"}
+    finally:
+        asyncio.run(server.close())
+
+def test_calculator_history_is_thread_safe():
+    """Test that concurrent appends to the Calculator singleton's history are not lost."""
+    calc = Calculator()
+    before = len(calc.history)
+
+    def append_many():
+        for _ in range(1000):
+            calc.add_to_history(AddCommand(1, 1))
+
+    threads = [threading.Thread(target=append_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calc.history) == before + 4000
@@ -0,0 +1,120 @@
+"""
+This module contains tests for per-session calculation state.
+It checks that sessions keep separate histories and Calculators, and that threads and asyncio
+tasks in different sessions, or in the same one, record their calculations concurrently.
+"""
+
+import asyncio
+import threading
+from decimal import Decimal
+from calculator import history_sqlite
+from calculator.calculations import Calculations
+from calculator.calculator import Calculator
+from calculator.commands import AddCommand, MultiplyCommand
+from calculator.session import DEFAULT_SESSION, Session, current_session
+
+def run_threads(target, count):
+    """Run target(number) in count threads started together and wait for all of them."""
+    barrier = threading.Barrier(count)
+
+    def run(number):
+        barrier.wait()
+        target(number)
+
+    threads = [threading.Thread(target=run, args=(number,)) for number in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_sessions_keep_separate_histories():
+    """Test that a session gets its own history and Calculator, and leaving it restores the default."""
+    Calculations.clear_history()
+    default_calculator = Calculator()
+    with Session(window=10) as session:
+        assert current_session() is session
+        Calculations.add_calculation(AddCommand(Decimal('1'), Decimal('2')))
+        Calculator().compute(MultiplyCommand(Decimal('2'), Decimal('3')))
+        assert Calculator() is Calculator() is session.calculator
+        assert Calculator() is not default_calculator
+        assert Calculator().history.window == Calculations.history.window == 10
+        assert [entry.result for entry in Calculations.get_history()] == [Decimal('3')]
+        with Session() as inner:
+            assert current_session() is inner and len(Calculations.history) == 0
+        assert current_session() is session
+    assert current_session() is DEFAULT_SESSION
+    assert len(Calculations.history) == 0 and len(session.history) == 1
+    assert session.session_id != DEFAULT_SESSION.session_id == history_sqlite.SESSION_ID
+
+def test_threads_in_separate_sessions():
+    """Test that threads computing in their own sessions each record exactly their calculations."""
+    sessions = [Session() for _ in range(8)]
+
+    def compute(number):
+        with sessions[number]:
+            calculator = Calculator()
+            for value in range(500):
+                command = AddCommand(Decimal(number), Decimal(value))
+                calculator.compute(command)
+                Calculations.add_calculation(command)
+
+    run_threads(compute, len(sessions))
+    for number, session in enumerate(sessions):
+        for history in (session.history, session.calculator.history):
+            assert [entry.value1 for entry in history] == [Decimal(number)] * 500
+            assert [entry.value2 for entry in history] == [Decimal(value) for value in range(500)]
+
+def test_concurrent_flushes_in_one_session(tmp_path):
+    """Test that threads appending and flushing in one session write every row exactly once."""
+    file_name = str(tmp_path / "history.db")
+    session = Session()
+
+    def work(number):
+        with session:
+            for value in range(300):
+                Calculations.add_calculation(AddCommand(Decimal(number), Decimal(value)))
+                if value % 50 == 0:
+                    Calculations.flush_history(file_name)
+
+    run_threads(work, 6)
+    with session:
+        Calculations.flush_history(file_name)
+        assert len(Calculations.history) == 1800
+        assert len(Calculations.history.rows_for_operation('add')) == 1800
+    frame = history_sqlite.read_frame(file_name, session_id=session.session_id)
+    assert sorted(zip(frame['value1'], frame['value2'])) == sorted(
+        (str(number), str(value)) for number in range(6) for value in range(300)
+    )
+
+def test_sessions_flush_to_one_database(tmp_path):
+    """Test that rows flushed by different sessions to one database are tagged with their session."""
+    file_name = str(tmp_path / "history.db")
+    sessions = [Session(f"worker-{number}") for number in range(4)]
+
+    def work(number):
+        with sessions[number]:
+            for value in range(100):
+                Calculations.add_calculation(AddCommand(Decimal(number), Decimal(value)))
+            Calculations.flush_history(file_name)
+
+    run_threads(work, len(sessions))
+    for number in range(4):
+        frame = history_sqlite.read_frame(file_name, session_id=f"worker-{number}")
+        assert list(frame['value1']) == [str(number)] * 100
+
+def test_asyncio_tasks_in_separate_sessions():
+    """Test that the current session is local to each asyncio task."""
+
+    async def task(number):
+        with Session() as session:
+            for value in range(3):
+                Calculations.add_calculation(AddCommand(Decimal(number), Decimal(value)))
+                await asyncio.sleep(0)
+            return session, [entry.value1 for entry in Calculations.get_history()]
+
+    async def main():
+        return await asyncio.gather(*(task(number) for number in range(5)))
+
+    for number, (session, values) in enumerate(asyncio.run(main())):
+        assert values == [Decimal(number)] * 3 and len(session.history) == 3
+    assert current_session() is DEFAULT_SESSION
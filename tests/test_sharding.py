@@ -0,0 +1,65 @@
+"""
+This module contains tests for sharded batch evaluation across a process pool.
+It checks shard boundaries and that sharded runs match sequential runs exactly.
+"""
+
+import io
+import random
+import pytest
+from calculator.batch_mode import run_batch
+from calculator.calculations import Calculations
+from calculator.sharding import run_sharded_batch, shard_ranges
+from calculator.utils import get_operation_mappings
+
+# pylint: disable=redefined-outer-name
+
+@pytest.fixture
+def operations_file(tmp_path):
+    """Write an operations file mixing both line formats, errors and blank lines."""
+    rng = random.Random(12)
+    lines = ["operation,value1,value2"]
+    for number in range(2000):
+        operation = rng.choice(["add", "subtract", "multiply", "divide", "power"])
+        value1, value2 = f"{rng.uniform(-1e6, 1e6):.6f}", str(rng.randint(0, 9))
+        lines.append(f"{value1} {operation} {value2}" if number % 3 else f"{operation},{value1},{value2}")
+        if number % 97 == 0:
+            lines.append("")
+        if number % 101 == 0:
+            lines.append("not a line")
+    path = tmp_path / "operations.csv"
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return path
+
+def test_shard_ranges_cover_whole_lines(operations_file):
+    """Test that shards are contiguous, cover the file and start at line boundaries."""
+    data = operations_file.read_bytes()
+    ranges = shard_ranges(str(operations_file), 7)
+    assert len(ranges) == 7
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start and data[start - 1:start] == b"\n"
+
+def test_shard_ranges_more_shards_than_lines(tmp_path):
+    """Test that a tiny file gets at most one shard per line."""
+    path = tmp_path / "small.csv"
+    path.write_text("add,1,2\nadd,3,4\n", encoding='utf-8')
+    assert shard_ranges(str(path), 16) == [(0, 8), (8, 16)]
+    empty = tmp_path / "empty.csv"
+    empty.write_text("", encoding='utf-8')
+    assert shard_ranges(str(empty), 4) == [(0, 0)]
+
+def test_sharded_batch_matches_sequential(operations_file):
+    """Test that output, counts and history are identical to a sequential run."""
+    Calculations.clear_history()
+    sequential = io.StringIO()
+    with open(operations_file, newline='', encoding='utf-8') as source:
+        expected_counts = run_batch(source, sequential, get_operation_mappings())
+    expected_history = [(entry.operation_name, entry.value1, entry.value2, entry.result)
+                        for entry in Calculations.get_history()]
+
+    Calculations.clear_history()
+    sharded = io.StringIO()
+    assert run_sharded_batch(str(operations_file), sharded, get_operation_mappings(), workers=3) == expected_counts
+    assert sharded.getvalue() == sequential.getvalue()
+    assert [(entry.operation_name, entry.value1, entry.value2, entry.result)
+            for entry in Calculations.get_history()] == expected_history
@@ -0,0 +1,62 @@
+"""
+This module contains startup-time regression tests.
+It checks that importing main and the calculator package does not load pandas or numpy, and
+that the import stays within a time budget.
+"""
+
+import os
+import sys
+import json
+import subprocess
+import calculator
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing pandas alone takes several hundred milliseconds; main without it takes tens
+IMPORT_BUDGET_SECONDS = 0.25
+
+HEAVY_MODULES = ('pandas', 'numpy', 'asyncio', 'multiprocessing', 'sqlite3')
+
+def run_python(code: str, *options) -> str:
+    """Run code in a fresh interpreter from the project root and return its stdout."""
+    completed = subprocess.run([sys.executable, *options, "-c", code], cwd=PROJECT_ROOT,
+                               capture_output=True, text=True, check=True)
+    return completed.stdout
+
+def loaded_after(statement: str) -> list:
+    """Return which of HEAVY_MODULES are loaded after running statement in a fresh interpreter."""
+    code = f"import sys\n{statement}\nimport json; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    return json.loads(run_python(code).splitlines()[-1])
+
+def import_seconds(module: str) -> float:
+    """Return the cumulative import time of a module reported by python -X importtime."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    for line in reversed(stderr.splitlines()):
+        _, cumulative, name = line.split('|')
+        if name.strip() == module:
+            return int(cumulative) / 1e6
+    raise AssertionError(f"{module} not found in the import time report")
+
+def test_main_does_not_import_heavy_modules():
+    """Test that importing main loads none of the heavy dependencies."""
+    assert not loaded_after("import main")
+
+def test_calculator_modules_do_not_import_heavy_modules():
+    """Test that importing every calculator module except the servers loads no heavy dependency."""
+    modules = sorted(name for name in os.listdir(os.path.dirname(calculator.__file__))
+                     if name.endswith('.py') and name not in ('__init__.py', 'server.py'))
+    statement = "\n".join(f"import calculator.{name[:-3]}" for name in modules)
+    assert not loaded_after(statement)
+
+def test_persistence_loads_pandas_on_first_use(tmp_path):
+    """Test that appending to a CSV history needs no pandas, and loading it imports pandas."""
+    file_name = json.dumps(str(tmp_path / "history.csv"))
+    save = ("from calculator.calculations import Calculations\nfrom calculator.commands import AddCommand\n"
+            f"Calculations.add_calculation(AddCommand(1, 2))\nCalculations.save_history({file_name})")
+    assert not loaded_after(save)
+    assert loaded_after(f"{save}\nCalculations.load_history({file_name})") == ['pandas', 'numpy']
+
+def test_import_time_budget():
+    """Test that importing main stays within the startup budget."""
+    assert import_seconds("main") < IMPORT_BUDGET_SECONDS